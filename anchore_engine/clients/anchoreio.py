@@ -3,7 +3,10 @@ import copy
 import json
 import urllib.parse
 import abc
+import random
+import time
 import requests
+import requests.adapters
 
 import anchore_engine.configuration.localconfig
 from anchore_engine.subsys import logger
@@ -22,6 +25,57 @@ class InvalidCredentialsError(Exception):
             'Invalid credential for user {} for url: {}'.format(username, target))
 
 
+def new_http_session(pool_maxsize=4):
+    """
+    Returns a requests session whose connection pool keeps connections alive across requests to the same host and that accepts
+    compressed responses, which requests transparently decodes.
+
+    :param pool_maxsize: max number of connections kept per host
+    :return: requests.Session
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+    return session
+
+
+def retry_delay(attempt, response=None, backoff_sec=1.0, max_backoff_sec=30.0):
+    """
+    Returns the seconds to wait before retrying a failed request: an exponential backoff with jitter, or the server's Retry-After if
+    it asks for longer, capped at max_backoff_sec.
+
+    :param attempt: number of the attempt that failed, starting at 1
+    :param response: the failed attempt's response, if there was one
+    :param backoff_sec: delay after the first attempt, doubled for each further attempt
+    :param max_backoff_sec:
+    :return: float seconds
+    """
+    delay = min(max_backoff_sec, backoff_sec * (2 ** (attempt - 1)))
+    delay = delay / 2 + random.uniform(0, delay / 2)
+
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), max_backoff_sec))
+
+    return delay
+
+
+def response_sizes(response):
+    """
+    :param response: requests.Response with its content read
+    :return: tuple of (decoded content bytes, bytes received over the wire, which are fewer for compressed responses)
+    """
+    content_bytes = len(response.content)
+    try:
+        wire_bytes = response.raw.tell() or content_bytes
+    except Exception:
+        wire_bytes = content_bytes
+    return content_bytes, wire_bytes
+
+
 class IAuthenticatedHTTPClientBase(abc.ABC):
     @abc.abstractmethod
     def execute_request(self, method, url, connect_timeout=None, read_timeout=None, retries=None):
@@ -43,6 +97,9 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
         'max_retries': 3,
         'conn_timeout': 3,
         'read_timeout': 60,
+        'retry_backoff_sec': 1.0,
+        'max_retry_backoff_sec': 30.0,
+        'pool_maxsize': 4,
         'client_info_url': None,
         'token_url': None,
         'client_info': {},
@@ -79,6 +136,8 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
         if retries:
             self.auth_config['max_retries'] = retries
 
+        self.session = new_http_session(self.auth_config['pool_maxsize'])
+
         try:
             self.user_info = self._get_current_user_info()
         except requests.HTTPError as e:
@@ -97,7 +156,7 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
         user_url = '{}/{}'.format(self.auth_config['client_info_url'], self.auth_config['username'])
         user_timeout = 60
         retries = 3
-        result = requests.get(user_url, headers={'x-anchore-password': self.auth_config['password']})
+        result = self.session.get(user_url, headers={'x-anchore-password': self.auth_config['password']})
         if result.status_code == 200:
             user_data = result.json()
         else:
@@ -142,7 +201,7 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
 
             headers = {'x-anchore-password': password}
             try:
-                r = requests.get(url, headers=headers, timeout=timeout_tuple)
+                r = self.session.get(url, headers=headers, timeout=timeout_tuple)
             except:
                 # print "request timed out"
                 ret['text'] = json.dumps(
@@ -174,7 +233,7 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
                 'cache-control': "no-cache",
             }
             try:
-                r = requests.post(token_url, headers=headers, data=payload, timeout=timeout_tuple)
+                r = self.session.post(token_url, headers=headers, data=payload, timeout=timeout_tuple)
             except:
                 # print "request timed out"
                 ret['text'] = json.dumps(
@@ -198,7 +257,7 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
                 'cache-control': "no-cache",
             }
             try:
-                r = requests.post(token_url, headers=headers, data=payload, timeout=timeout_tuple)
+                r = self.session.post(token_url, headers=headers, data=payload, timeout=timeout_tuple)
             except:
                 # print "request timed out"
                 ret['text'] = json.dumps(
@@ -261,6 +320,7 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
 
         while not success and count < retries:
             count += 1
+            r = None
             logger.debug("get attempt " + str(count) + " of " + str(retries))
             try:
                 rc, record = self._auth_refresh(forcerefresh=False)
@@ -274,7 +334,7 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
                     headers = {"Authorization": "Bearer " + accessToken, "Cache-Control": "no-cache"}
 
                     logger.debug("making authenticated request to url: " + str(url))
-                    r = method(url, headers=headers, timeout=(conn_timeout, read_timeout))
+                    r = _session_method(self.session, method)(url, headers=headers, timeout=(conn_timeout, read_timeout))
                     logger.debug("\tresponse status_code: " + str(r.status_code))
                     if r.status_code == 401:
                         logger.debug(
@@ -298,6 +358,7 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
 
                     ret['status_code'] = r.status_code
                     ret['text'] = r.text
+                    ret['content_bytes'], ret['wire_bytes'] = response_sizes(r)
 
             except requests.exceptions.ConnectTimeout as err:
                 logger.debug("attempt failed: " + str(err))
@@ -314,6 +375,9 @@ class Oauth2AuthenticatedClient(IAuthenticatedHTTPClientBase):
                 logger.debug("attempt failed: " + str(err))
                 ret['text'] = "server error: " + str(err)
 
+            if not success and count < retries:
+                time.sleep(retry_delay(count, response=r, backoff_sec=self.auth_config['retry_backoff_sec'], max_backoff_sec=self.auth_config['max_retry_backoff_sec']))
+
         return ret
 
     def authenticated_get(self, url, connect_timeout=None, read_timeout=None, retries=None):
@@ -328,7 +392,10 @@ class HTTPBasicAuthClient(IAuthenticatedHTTPClientBase):
     client_config = {
         'max_retries': 3,
         'conn_timeout': 3,
-        'read_timeout': 60
+        'read_timeout': 60,
+        'retry_backoff_sec': 1.0,
+        'max_retry_backoff_sec': 30.0,
+        'pool_maxsize': 4
     }
 
     def __init__(self, username, password, connect_timeout=None, read_timeout=None, retries=None):
@@ -344,6 +411,8 @@ class HTTPBasicAuthClient(IAuthenticatedHTTPClientBase):
         if retries:
             self.auth_config['max_retries'] = retries
 
+        self.session = new_http_session(self.auth_config['pool_maxsize'])
+
     @property
     def user(self):
         return self._user
@@ -394,6 +463,7 @@ class HTTPBasicAuthClient(IAuthenticatedHTTPClientBase):
 
         while not success and count < retries:
             count += 1
+            r = None
             logger.debug("get attempt " + str(count) + " of " + str(retries))
             try:
                 if False:
@@ -401,7 +471,7 @@ class HTTPBasicAuthClient(IAuthenticatedHTTPClientBase):
                 else:
                     auth = (self.user, self.password)
                     logger.debug("making authenticated request (user=" + str(self.user) + ") to url: " + str(url))
-                    r = method(url, auth=auth, timeout=(conn_timeout, read_timeout))
+                    r = _session_method(self.session, method)(url, auth=auth, timeout=(conn_timeout, read_timeout))
                     logger.debug("\tresponse status_code: " + str(r.status_code))
                     if r.status_code == 401:
                         logger.debug(
@@ -415,6 +485,7 @@ class HTTPBasicAuthClient(IAuthenticatedHTTPClientBase):
 
                     ret['status_code'] = r.status_code
                     ret['text'] = r.text
+                    ret['content_bytes'], ret['wire_bytes'] = response_sizes(r)
 
             except requests.exceptions.ConnectTimeout as err:
                 logger.debug("attempt failed: " + str(err))
@@ -432,9 +503,19 @@ class HTTPBasicAuthClient(IAuthenticatedHTTPClientBase):
                 logger.debug("attempt failed: " + str(err))
                 ret['text'] = "server error: " + str(err)
 
+            if not success and count < retries:
+                time.sleep(retry_delay(count, response=r, backoff_sec=self.auth_config['retry_backoff_sec'], max_backoff_sec=self.auth_config['max_retry_backoff_sec']))
+
         return (ret)
 
 
+def _session_method(session, method):
+    """
+    Returns the session's equivalent of a requests module method (e.g. requests.get -> session.get) so requests use its connection pool
+    """
+    return getattr(session, getattr(method, '__name__', ''), method)
+
+
 def get_anchoreio_client(user, pw):
     global anchoreio_clients
 
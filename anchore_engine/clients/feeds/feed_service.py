@@ -4,7 +4,9 @@ import requests
 import requests.exceptions
 import json
 import datetime
+import time
 
+import anchore_engine.subsys.metrics
 from anchore_engine.clients.anchoreio import Oauth2AuthenticatedClient, HTTPBasicAuthClient, InsufficientAccessTierError, InvalidCredentialsError
 from anchore_engine.configuration import localconfig
 from anchore_engine.subsys import logger
@@ -143,8 +145,10 @@ class FeedClient(IFeedClient):
 
         logger.debug("data group url: " + str(url))
         try:
+            timer = time.time()
             record = self.http_client.execute_request(requests.get, url)
             if record['success']:
+                self._record_page_metrics(feed, group, time.time() - timer, record)
                 data = json.loads(record['text'])
                 if 'data' in data:
                     group_data = data['data']
@@ -161,6 +165,16 @@ class FeedClient(IFeedClient):
             logger.debug('Error executing feed listing: {}'.format(e))
             raise e
 
+    @staticmethod
+    def _record_page_metrics(feed, group, elapsed, record):
+        content_bytes = record.get('content_bytes', len(record['text']))
+        wire_bytes = record.get('wire_bytes', content_bytes)
+        logger.debug('Fetched page of {}/{} in {:.3f} sec, {} bytes ({} bytes transferred)'.format(feed, group, elapsed, content_bytes, wire_bytes))
+
+        anchore_engine.subsys.metrics.histogram_observe('anchore_feed_page_fetch_seconds', elapsed, feed=feed, group=group)
+        anchore_engine.subsys.metrics.counter_inc('anchore_feed_page_bytes_total', content_bytes, feed=feed, group=group)
+        anchore_engine.subsys.metrics.counter_inc('anchore_feed_page_wire_bytes_total', wire_bytes, feed=feed, group=group)
+
 
 def get_client(feeds_url=None, token_url=None, client_url=None, user=tuple(), conn_timeout=None, read_timeout=None):
     """
@@ -271,6 +271,35 @@ def anchy_post(url, raw=False, **kwargs):
     return(ret)
 
 
+def anchy_post_ndjson(url, **kwargs):
+    """
+    POST and return a generator of the json objects in the newline-delimited json response, parsed as they are received
+
+    """
+    r = requests.post(url, stream=True, **kwargs)
+    logger.debug('POST url={} httpcode={}'.format(url, r.status_code))
+    if r.status_code != 200:
+        rawdata = r.content
+        try:
+            jsondata = json.loads(str(rawdata, 'utf-8'))
+        except:
+            jsondata = {}
+        r.close()
+        e = Exception("failed post url="+str(url))
+        e.__dict__.update({'httpcode':r.status_code, 'anchore_error_raw':str(rawdata), 'anchore_error_json':jsondata})
+        raise e
+
+    def results():
+        try:
+            for line in r.iter_lines():
+                if line:
+                    yield json.loads(str(line, 'utf-8'))
+        finally:
+            r.close()
+
+    return(results())
+
+
 def anchy_put(url, raw=False, **kwargs):
     ret = True
 
@@ -1,6 +1,6 @@
 import json
 from anchore_engine.clients.services.internal import InternalServiceClient
-from anchore_engine.clients.services.http import anchy_get, anchy_post, anchy_delete
+from anchore_engine.clients.services.http import anchy_get, anchy_post, anchy_post_ndjson, anchy_delete
 
 
 class PolicyEngineClient(InternalServiceClient):
@@ -26,9 +26,24 @@ class PolicyEngineClient(InternalServiceClient):
     def check_user_image_inline(self, user_id, image_id, tag, policy_bundle):
         return self.call_api(anchy_post, 'users/{user_id}/images/{image_id}/check_inline', path_params={'user_id': user_id, 'image_id': image_id}, query_params={'tag': tag}, body=json.dumps(policy_bundle))
 
+    def check_user_images_inline(self, user_id, images, policy_bundle):
+        """
+        Evaluate the bundle against many images in one request
+
+        :param user_id:
+        :param images: list of (image_id, tag) tuples
+        :param policy_bundle: the bundle json
+        :return: generator of result dicts in the order of images, each with image_id, tag, status and either evaluation or error
+        """
+        body = {'bundle': policy_bundle, 'images': [{'image_id': image_id, 'tag': tag} for image_id, tag in images]}
+        return self.call_api(anchy_post_ndjson, 'users/{user_id}/evaluations', path_params={'user_id': user_id}, body=json.dumps(body))
+
     def get_image_vulnerabilities(self, user_id, image_id, force_refresh=False, vendor_only=None):
         return self.call_api(anchy_get, 'users/{user_id}/images/{image_id}/vulnerabilities', path_params={'user_id': user_id, 'image_id': image_id}, query_params={'force_refresh': force_refresh, 'vendor_only': vendor_only})
 
+    def list_image_vulnerability_summaries(self, user_id, image_ids=None):
+        return self.call_api(anchy_get, 'users/{user_id}/vulnerability_summaries', path_params={'user_id': user_id}, query_params={'image_id': ','.join(image_ids) if image_ids else None})
+
     def query_vulnerabilities(self, vuln_id=None, affected_package=None, affected_package_version=None):
         return self.call_api(anchy_get, 'query/vulnerabilities',
                              query_params={'id': vuln_id, 'affected_package': affected_package,
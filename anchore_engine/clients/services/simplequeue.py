@@ -97,7 +97,7 @@ def run_target_with_queue_ttl(user_auth, queue, visibility_timeout, target, max_
 
             if autorefresh:
                 # Run the task thread and monitor it, refreshing the task lease as needed
-                while task.isAlive():
+                while task.is_alive():
                     # If we're halfway to the timeout, refresh to have a safe buffer
                     if time.time() - t > (visibility_timeout / 2):
                         # refresh the lease
@@ -169,7 +169,7 @@ def run_target_with_lease(user_auth, lease_id, target, ttl=60, client_id=None, a
 
             if autorefresh:
                 # Run the task thread and monitor it, refreshing the task lease as needed
-                while handler_thread.isAlive():
+                while handler_thread.is_alive():
                     # If we're halfway to the timeout, refresh to have a safe buffer
                     if time.time() - t > (ttl / 2):
                         # refresh the lease
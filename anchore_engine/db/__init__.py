@@ -33,6 +33,8 @@ from .entities.policy_engine import ImageNpm
 #from .entities.policy_engine import ImageJava
 from .entities.policy_engine import ImageCpe
 from .entities.policy_engine import ImagePackageVulnerability
+from .entities.policy_engine import ImageCpeVulnerability
+from .entities.policy_engine import ImageVulnerabilitySummary
 #from .entities.policy_engine import ImageJavaVulnerability
 from .entities.policy_engine import FeedMetadata
 from .entities.policy_engine import FeedGroupMetadata
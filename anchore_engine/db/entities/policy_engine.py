@@ -2,11 +2,13 @@ import datetime
 import hashlib
 import json
 import re
+import threading
+import time
 import zlib
 from collections import namedtuple
 
 from sqlalchemy import Column, BigInteger, Integer, LargeBinary, Float, Boolean, String, ForeignKey, Enum, \
-    ForeignKeyConstraint, DateTime, types, Text, Index, JSON, or_, and_
+    ForeignKeyConstraint, DateTime, types, Text, Index, JSON, or_, and_, select, join, func
 from sqlalchemy.orm import relationship
 
 from anchore_engine.utils import ensure_str, ensure_bytes
@@ -159,6 +161,7 @@ class Vulnerability(Base):
     metadata_json = Column(StringJSON, nullable=True)
     cvss2_vectors = Column(String(256), nullable=True)
     cvss2_score = Column(Float, nullable=True)
+    content_digest = Column(String(digest_length), nullable=True)  # Digest of the normalized feed record this was mapped from
     created_at = Column(DateTime, default=datetime.datetime.utcnow)  # TODO: make these server-side
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     vulnerable_in = relationship('VulnerableArtifact', back_populates='parent', cascade='all, delete-orphan')
@@ -302,6 +305,7 @@ class FixedArtifact(Base):
     parent = relationship('Vulnerability', back_populates='fixed_in')
     vendor_no_advisory = Column(Boolean, default=False)
     fix_metadata = Column(StringJSON, nullable=True)
+    version_key = Column(LargeBinary, nullable=True) # Byte-comparable form of epochless_version, see anchore_engine.util.packages.package_version_key()
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
@@ -324,7 +328,10 @@ class FixedArtifact(Base):
         if not isinstance(fix_obj, FixedArtifact):
             raise TypeError('Expected a FixedArtifact type, got: {}'.format(type(fix_obj)))
 
-        dist = DistroNamespace.for_obj(package_obj)
+        if isinstance(package_obj, ImagePackage):
+            dist = package_obj.distro_namespace_meta
+        else:
+            dist = DistroNamespace.for_obj(package_obj)
         flavor = dist.flavor
         log.spew('Package: {}, Fix: {}, Flavor: {}'.format(package_obj.name, fix_obj.name, flavor))
 
@@ -475,6 +482,7 @@ class ImagePackage(Base):
     like_distro = Column(String(distro_length))
 
     fullversion = Column(String(pkg_version_length))
+    version_key = Column(LargeBinary, nullable=True) # Byte-comparable form of fullversion for os packages, see anchore_engine.util.packages.package_version_key()
     release = Column(String(pkg_version_length), default='')
     origin = Column(String(512), default='N/A')
     src_pkg = Column(String(pkg_name_length + pkg_version_length), default='N/A')
@@ -506,6 +514,15 @@ class ImagePackage(Base):
             self._distro_namespace = DistroNamespace.for_obj(self)
         return self._distro_namespace
 
+    @distro_namespace_meta.setter
+    def distro_namespace_meta(self, value):
+        """
+        Allows callers that have already resolved the namespace for a set of packages sharing a distro to set it directly and skip the lookup
+
+        :param value: a DistroNamespace object
+        """
+        self._distro_namespace = value
+
     @property
     def distro_namespace(self):
         if self.distro_name and self.distro_version:
@@ -528,6 +545,36 @@ class ImagePackage(Base):
                 props[key] = value
         return props
 
+    def semver_match_key(self):
+        """
+        Returns the key, version and namespace like-pattern used to match a non-os package against semver fix records.
+
+        :return: tuple of (pkgkey, pkgversion, likematch), all None if the package is not matched against semver records
+        """
+        pkgkey = pkgversion = likematch = None
+
+        #TODO better handling of the non-os pkg_type <-> namespace_name mapping, maybe use the above existing distro mechanism?
+        if self.pkg_type in ['java', 'maven']:
+            # search for maven hits
+            if self.metadata_json:
+                pombuf = self.metadata_json.get('pom.properties', "")
+                if pombuf:
+                    pomprops = self.get_pom_properties()
+                    pkgkey = "{}:{}".format(pomprops.get('groupId'), pomprops.get('artifactId'))
+                    pkgversion = pomprops.get('version', None)
+                    likematch = '%java%'
+        elif self.pkg_type in ['ruby', 'gem', 'npm', 'js', 'python']:
+            pkgkey = self.name
+            pkgversion = self.version
+            if self.pkg_type in ['ruby', 'gem']:
+                likematch = '%ruby%'
+            elif self.pkg_type in ['npm', 'js']:
+                likematch = '%js%'
+            elif self.pkg_type in ['python']:
+                likematch = '%python%'
+
+        return pkgkey, pkgversion, likematch
+
     def vulnerabilities_for_package(self):
         """
         Given an ImagePackage object, return the vulnerabilities that it matches.
@@ -539,33 +586,12 @@ class ImagePackage(Base):
         log.debug('Finding vulnerabilities for package: {} - {}'.format(package_obj.name, package_obj.version))
 
         matches = []
-        dist = DistroNamespace(package_obj.distro_name, package_obj.distro_version, package_obj.like_distro)
+        dist = package_obj.distro_namespace_meta
 
         db = get_thread_scoped_session()
-        namespace_name_to_use = dist.namespace_name
 
         nslang = package_obj.pkg_type
-        pkgkey = pkgversion = None
-        #TODO better handling of the non-os pkg_type <-> namespace_name mapping, maybe use the above existing distro mechanism?
-        likematch = None
-        if package_obj.pkg_type in ['java', 'maven']:
-            # search for maven hits
-            if package_obj.metadata_json:
-                pombuf = package_obj.metadata_json.get('pom.properties', "")
-                if pombuf:
-                    pomprops = package_obj.get_pom_properties()
-                    pkgkey = "{}:{}".format(pomprops.get('groupId'), pomprops.get('artifactId'))
-                    pkgversion = pomprops.get('version', None)
-                    likematch = '%java%'
-        elif package_obj.pkg_type in ['ruby', 'gem', 'npm', 'js', 'python']:
-            pkgkey = package_obj.name
-            pkgversion = package_obj.version
-            if package_obj.pkg_type in ['ruby', 'gem']:
-                likematch = '%ruby%'
-            elif package_obj.pkg_type in ['npm', 'js']:
-                likematch = '%js%'
-            elif package_obj.pkg_type in ['python']:
-                likematch = '%python%'
+        pkgkey, pkgversion, likematch = package_obj.semver_match_key()
 
         if pkgkey and pkgversion and likematch:
             candidates = db.query(FixedArtifact).filter(FixedArtifact.name == pkgkey).filter(FixedArtifact.version_format == 'semver').filter(FixedArtifact.namespace_name.like(likematch))
@@ -573,16 +599,7 @@ class ImagePackage(Base):
                 if (candidate.vulnerability_id not in [x.vulnerability_id for x in matches]) and (semver_compare_versions(candidate.version, pkgversion, language=nslang)):
                     matches.append(candidate)
 
-        # All options are the same, no need to loop
-        if len(set(dist.like_namespace_names)) > 1:
-            # Look for exact match first
-            if not db.query(FeedGroupMetadata).filter(FeedGroupMetadata.name == dist.namespace_name).first():
-                # Check all options for distro/flavor mappings, stop at first with records present
-                for namespace_name in dist.like_namespace_names:
-                    record_count = db.query(Vulnerability).filter(Vulnerability.namespace_name == namespace_name).count()
-                    if record_count > 0:
-                        namespace_name_to_use = namespace_name
-                        break
+        namespace_name_to_use = dist.vulnerability_namespace_name()
 
         fix_candidates, vulnerable_candidates = package_obj.candidates_for_package(namespace_name_to_use)
 
@@ -897,6 +914,8 @@ class Image(Base):
     npms = relationship('ImageNpm', back_populates='image', lazy='dynamic', cascade=['all','delete', 'delete-orphan'])
 
     cpes = relationship('ImageCpe', back_populates='image', lazy='dynamic', cascade=['all','delete', 'delete-orphan'])
+    cpe_vulnerabilities = relationship('ImageCpeVulnerability', back_populates='image', lazy='dynamic', cascade=['all','delete', 'delete-orphan'])
+    vulnerability_summary = relationship('ImageVulnerabilitySummary', back_populates='image', uselist=False, cascade=['all','delete', 'delete-orphan'])
     analysis_artifacts = relationship('AnalysisArtifact', back_populates='image', lazy='dynamic', cascade=['all','delete', 'delete-orphan'])
 
     @property
@@ -1042,6 +1061,145 @@ class ImagePackageVulnerability(Base):
         return hash((self.pkg_user_id, self.pkg_image_id, self.pkg_name, self.pkg_version, self.pkg_type, self.pkg_arch, self.vulnerability_id, self.pkg_path))
 
 
+class ImageCpeVulnerability(Base):
+    """
+    A persisted match between an image cpe and a cpe vulnerability, with the vulnerability columns needed for reporting copied in so that
+    an image's matches can be read without joining the feed data.
+
+    """
+
+    __tablename__ = 'image_cpe_vulnerabilities'
+
+    image_user_id = Column(String(user_id_length), primary_key=True)
+    image_id = Column(String(image_id_length), primary_key=True)
+    pkg_type = Column(String(pkg_type_length), primary_key=True)
+    pkg_path = Column(String(file_path_length), primary_key=True)
+    cpetype = Column(String(pkg_name_length), primary_key=True)
+    vendor = Column(String(pkg_name_length), primary_key=True)
+    name = Column(String(pkg_name_length), primary_key=True)
+    version = Column(String(pkg_version_length), primary_key=True)
+    update = Column(String(pkg_version_length), primary_key=True)
+    meta = Column(String(pkg_name_length), primary_key=True)
+
+    feed_name = Column(String(feed_name_length), primary_key=True)
+    vulnerability_namespace_name = Column(String(namespace_length), primary_key=True)
+    vulnerability_id = Column(String(vuln_id_length), primary_key=True)
+    severity = Column(Enum('Unknown', 'Negligible', 'Low', 'Medium', 'High', 'Critical', name='vulnerability_severities'), nullable=False, primary_key=True)
+    link = Column(String(link_length), nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    image = relationship('Image', back_populates='cpe_vulnerabilities')
+
+    __table_args__ = (
+        ForeignKeyConstraint(columns=[image_id, image_user_id],
+                             refcolumns=['images.id', 'images.user_id']),
+        Index('ix_image_cpe_vulnerabilities_vulnerability', vulnerability_namespace_name, vulnerability_id),
+        {}
+    )
+
+    def __repr__(self):
+        return '<{} user_id={}, img_id={}, name={}, version={}, vuln_id={}, vuln_namespace={}>'.format(self.__class__, self.image_user_id, self.image_id, self.name, self.version, self.vulnerability_id, self.vulnerability_namespace_name)
+
+    def fixed_in(self):
+        return(None)
+
+    def get_cpestring(self):
+        return ':'.join(['cpe', self.cpetype, self.vendor, self.name, self.version, self.update, self.meta])
+
+    @classmethod
+    def insert_matches(cls, db, *criteria):
+        """
+        Match image cpes to cpe vulnerabilities by name and version and insert the results with a single INSERT ... SELECT. Cpe vulnerabilities
+        differing only in the vulnerability's cpe fields yield the same match, so they are grouped into one row.
+
+        :param db: session or connection to execute with
+        :param criteria: filter expressions on ImageCpe and CpeVulnerability columns selecting the matches to insert
+        :return: number of rows inserted
+        """
+        image_columns = [ImageCpe.image_user_id, ImageCpe.image_id, ImageCpe.pkg_type, ImageCpe.pkg_path, ImageCpe.cpetype, ImageCpe.vendor,
+                         ImageCpe.name, ImageCpe.version, ImageCpe.update, ImageCpe.meta]
+        vulnerability_columns = [CpeVulnerability.feed_name, CpeVulnerability.namespace_name, CpeVulnerability.vulnerability_id, CpeVulnerability.severity]
+
+        matches = select(image_columns + vulnerability_columns + [func.max(CpeVulnerability.link)])\
+            .select_from(join(ImageCpe, CpeVulnerability, and_(ImageCpe.name == CpeVulnerability.name, ImageCpe.version == CpeVulnerability.version)))\
+            .group_by(*(image_columns + vulnerability_columns))
+        if criteria:
+            matches = matches.where(and_(*criteria))
+
+        names = [x.key for x in image_columns] + ['feed_name', 'vulnerability_namespace_name', 'vulnerability_id', 'severity', 'link']
+        return db.execute(cls.__table__.insert().from_select(names, matches)).rowcount
+
+
+class ImageVulnerabilitySummary(Base):
+    """
+    Counts of an image's package vulnerability matches, maintained along with the matches (see vulnerability_summary) so that
+    summaries of many images can be read without loading the matches themselves.
+
+    """
+
+    __tablename__ = 'image_vulnerability_summaries'
+
+    # Severity value -> name of the column counting the matches of that severity
+    severity_columns = {
+        'Critical': 'critical_count',
+        'High': 'high_count',
+        'Medium': 'medium_count',
+        'Low': 'low_count',
+        'Negligible': 'negligible_count',
+        'Unknown': 'unknown_count'
+    }
+
+    image_user_id = Column(String(user_id_length), primary_key=True)
+    image_id = Column(String(image_id_length), primary_key=True)
+    total_count = Column(Integer, default=0, nullable=False)
+    critical_count = Column(Integer, default=0, nullable=False)
+    high_count = Column(Integer, default=0, nullable=False)
+    medium_count = Column(Integer, default=0, nullable=False)
+    low_count = Column(Integer, default=0, nullable=False)
+    negligible_count = Column(Integer, default=0, nullable=False)
+    unknown_count = Column(Integer, default=0, nullable=False)
+    fixable_count = Column(Integer, default=0, nullable=False)  # Matches with a fix version available
+    vendor_no_advisory_count = Column(Integer, default=0, nullable=False)  # Matches the vendor won't fix
+    last_updated = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    image = relationship('Image', back_populates='vulnerability_summary')
+
+    __table_args__ = (
+        ForeignKeyConstraint(columns=[image_id, image_user_id],
+                             refcolumns=['images.id', 'images.user_id']),
+        {}
+    )
+
+    def __repr__(self):
+        return '<{} user_id={}, img_id={}, total={}, fixable={}>'.format(self.__class__, self.image_user_id, self.image_id, self.total_count, self.fixable_count)
+
+    def set_counts(self, vulnerabilities):
+        """
+        Recompute the counts from the image's matches. The vulnerability of each match is read, so it should be loaded with the match.
+
+        :param vulnerabilities: list of the image's ImagePackageVulnerability objects
+        """
+        counts = {x: 0 for x in self.severity_columns.values()}
+        fixable = 0
+        no_advisory = 0
+
+        for vuln in vulnerabilities:
+            column = self.severity_columns.get(vuln.vulnerability.severity, 'unknown_count')
+            counts[column] += 1
+            if vuln.fixed_in():
+                fixable += 1
+            if vuln.fix_has_no_advisory():
+                no_advisory += 1
+
+        for column, count in counts.items():
+            setattr(self, column, count)
+
+        self.total_count = len(vulnerabilities)
+        self.fixable_count = fixable
+        self.vendor_no_advisory_count = no_advisory
+        self.last_updated = datetime.datetime.utcnow()
+
+
 class IDistroMapper(object):
     """
     Interface for a distro mapper object
@@ -1112,10 +1270,9 @@ class VersionPreservingDistroMapper(IDistroMapper):
         if found_mapping:
             return found_mapping.flavor
         else:
-            db = get_thread_scoped_session()
             candidates = like_distro.split(',') if like_distro else []
             for c in candidates:
-                mapping = db.query(DistroMapping).get(c)
+                mapping = DistroMapping.cache.get(c)
                 if mapping:
                     return mapping.flavor
             return None
@@ -1147,6 +1304,103 @@ class VersionPreservingDistroMapper(IDistroMapper):
         return [distro_version]
 
 
+DistroMappingRecord = namedtuple('DistroMappingRecord', ['from_distro', 'to_distro', 'flavor'])
+
+
+class DistroMappingCache(object):
+    """
+    Process-level, versioned copy of the distro_mappings table so namespace resolution does not need a query per lookup.
+
+    The table is small and rarely changes, so it is loaded whole and reloaded when invalidated (on local changes) or when
+    the ttl expires (to pick up changes made by other processes). The version is incremented on each reload that changes the
+    contents, so derived results can be cached against it.
+
+    """
+
+    DEFAULT_TTL_SEC = 60
+
+    def __init__(self, ttl_sec=DEFAULT_TTL_SEC, loader=None):
+        """
+        :param ttl_sec: max age in seconds of the loaded data before it is reloaded
+        :param loader: function returning the list of DistroMappingRecords to cache, defaults to a query of the distro_mappings table
+        """
+        self.ttl_sec = ttl_sec
+        self.version = 0
+        self._loader = loader if loader else DistroMappingCache._load_from_db
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._records = None
+        self._by_from = {}
+        self._by_to = {}
+        self._distros_for = {}
+
+    @staticmethod
+    def _load_from_db():
+        db = get_thread_scoped_session()
+        return [DistroMappingRecord(from_distro=x.from_distro, to_distro=x.to_distro, flavor=x.flavor) for x in db.query(DistroMapping)]
+
+    def _refresh(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_sec:
+            return
+
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_sec:
+                return
+
+            records = sorted(self._loader())
+            if records != self._records:
+                by_to = {}
+                for r in records:
+                    by_to.setdefault(r.to_distro, []).append(r)
+
+                self._by_from = {r.from_distro: r for r in records}
+                self._by_to = by_to
+                self._distros_for = {}
+                self._records = records
+                self.version += 1
+                log.debug('Loaded {} distro mappings, cache version {}'.format(len(records), self.version))
+
+            self._loaded_at = time.monotonic()
+
+    def get(self, from_distro):
+        """
+        :param from_distro:
+        :return: the DistroMappingRecord for the distro or None
+        """
+        self._refresh()
+        return self._by_from.get(from_distro)
+
+    def mapped_to(self, to_distro):
+        """
+        :param to_distro:
+        :return: list of DistroMappingRecords that map to the given distro
+        """
+        self._refresh()
+        return list(self._by_to.get(to_distro, []))
+
+    def distros_for(self, distro, version, like_distro, mapper_cls):
+        """
+        Memoized mapping of a distro, version, and like_distro to the list of DistroTuples, valid until the mappings change.
+
+        """
+        self._refresh()
+        key = (distro, version, like_distro, mapper_cls)
+        found = self._distros_for.get(key)
+        if found is None:
+            found = mapper_cls(distro, version, like_distro, self._by_from.get(distro)).mapping
+            with self._lock:
+                self._distros_for[key] = found
+
+        return list(found)
+
+    def invalidate(self):
+        """
+        Force a reload on next use. Call after changing the distro_mappings table.
+        """
+        with self._lock:
+            self._loaded_at = None
+
+
 class DistroMapping(Base):
     """
     A mapping entry between a distro with known cve feed and other similar distros.
@@ -1155,6 +1409,9 @@ class DistroMapping(Base):
     __tablename__ = 'distro_mappings'
     __distro_mapper_cls__ = VersionPreservingDistroMapper
 
+    # Shared read cache of the table contents, invalidate() it after making changes
+    cache = DistroMappingCache()
+
     from_distro = Column(String(distro_length), primary_key=True) # The distro to be checked
     to_distro = Column(String(distro_length)) # The distro to use instead of the pk distro to do cve checks
     flavor = Column(String(distro_length)) # The distro flavor to use (e.g. RHEL, or DEB)
@@ -1170,10 +1427,7 @@ class DistroMapping(Base):
         :param obj:
         :return: list of DistroTuples for most-to-least exact match
         """
-        db = get_thread_scoped_session()
-        found = db.query(DistroMapping).get(distro)
-        mapper = cls.__distro_mapper_cls__(distro, version, like_distro, found)
-        return mapper.mapping
+        return cls.cache.distros_for(distro, version, like_distro, cls.__distro_mapper_cls__)
 
     @classmethod
     def distros_mapped_to(cls, distro, version):
@@ -1184,13 +1438,54 @@ class DistroMapping(Base):
         :param version:
         :return:
         """
-        db = get_thread_scoped_session()
-        name_matches = db.query(DistroMapping).filter(DistroMapping.to_distro == distro).all()
-        return [DistroTuple(distro=mapping.from_distro, version=version, flavor=mapping.flavor) for mapping in name_matches]
+        return [DistroTuple(distro=mapping.from_distro, version=version, flavor=mapping.flavor) for mapping in cls.cache.mapped_to(distro)]
 
     def __str__(self):
         return '<DistroMapping>from={} to={}, flavor={}'.format(self.from_distro, self.to_distro, self.flavor)
 
+class VulnerabilityNamespaceCache(object):
+    """
+    Cache of resolved vulnerability namespace names for DistroNamespace.vulnerability_namespace_name(). The resolution depends
+    only on the distro mappings and the feed group data, so entries stay valid until a feed group sync commits. Syncs in this process
+    invalidate() it directly, validate() covers syncs by other processes when group timestamps are available, and entries older than
+    the ttl are re-resolved otherwise.
+
+    """
+
+    DEFAULT_TTL_SEC = 300
+
+    def __init__(self, ttl_sec=DEFAULT_TTL_SEC):
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._group_stamps = None
+
+    def lookup(self, key):
+        found = self._entries.get(key)
+        if found is not None and time.monotonic() - found[0] < self.ttl_sec:
+            return found[1]
+        return None
+
+    def cache_it(self, key, namespace_name):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), namespace_name)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = {}
+
+    def validate(self, group_stamps):
+        """
+        Invalidate if the feed group sync timestamps differ from those seen on the previous call
+
+        :param group_stamps: dict mapping feed group name -> last_sync datetime
+        """
+        with self._lock:
+            if self._group_stamps is not None and self._group_stamps != group_stamps:
+                self._entries = {}
+            self._group_stamps = dict(group_stamps)
+
+
 class DistroNamespace(object):
     """
     A helper object for holding and converting distro names and namespaces between image and vulnerability records.
@@ -1201,6 +1496,9 @@ class DistroNamespace(object):
 
     """
 
+    # Shared across instances, invalidate() it when feed group data changes
+    vulnerability_namespaces = VulnerabilityNamespaceCache()
+
     @classmethod
     def for_obj(cls, obj):
         if hasattr(obj, 'distro_name') and hasattr(obj, 'distro_version'):
@@ -1218,6 +1516,37 @@ class DistroNamespace(object):
         self.like_namespace_names = [DistroNamespace.as_namespace_name(x.distro, x.version) for x in self.mapping]
 
 
+    def vulnerability_namespace_name(self):
+        """
+        Returns the namespace name to use for vulnerability matching. This is the exact namespace name unless the distro has
+        several like-namespaces and no feed group of its own, in which case the first like-namespace with vulnerability records is used.
+
+        :return: str namespace name
+        """
+        namespace_name_to_use = self.namespace_name
+
+        # All options are the same, no need to loop
+        if len(set(self.like_namespace_names)) > 1:
+            key = (self.name, self.version, self.like_distro, DistroMapping.cache.version)
+            found = DistroNamespace.vulnerability_namespaces.lookup(key)
+            if found is not None:
+                return found
+
+            db = get_thread_scoped_session()
+
+            # Look for exact match first
+            if not db.query(FeedGroupMetadata).filter(FeedGroupMetadata.name == self.namespace_name).first():
+                # Check all options for distro/flavor mappings, stop at first with records present
+                for namespace_name in self.like_namespace_names:
+                    record_count = db.query(Vulnerability).filter(Vulnerability.namespace_name == namespace_name).count()
+                    if record_count > 0:
+                        namespace_name_to_use = namespace_name
+                        break
+
+            DistroNamespace.vulnerability_namespaces.cache_it(key, namespace_name_to_use)
+
+        return namespace_name_to_use
+
     @staticmethod
     def as_namespace_name(name, version):
         """
@@ -689,6 +689,112 @@ def policy_engine_packages_upgrade_007_008():
             except Exception as err:
                 raise err
 
+def version_key_upgrade_008_009():
+    """
+    Add the byte-comparable version_key columns to fixed artifacts and image packages and compute them for existing rows.
+    Rows left with a null key (e.g. apk versions) are still matched with the full version comparison.
+
+    """
+    from anchore_engine.db import session_scope, FixedArtifact, ImagePackage, DistroNamespace
+    from anchore_engine.common import os_package_types
+    from anchore_engine.util.packages import package_version_key, version_key_flavors
+    from sqlalchemy import LargeBinary
+
+    engine = anchore_engine.db.entities.common.get_engine()
+
+    for table_name in ['feed_data_vulnerabilities_fixed_artifacts', 'image_packages']:
+        column = Column('version_key', LargeBinary, nullable=True)
+        try:
+            cn = column.compile(dialect=engine.dialect)
+            ct = column.type.compile(engine.dialect)
+            engine.execute('ALTER TABLE %s ADD COLUMN IF NOT EXISTS %s %s' % (table_name, cn, ct))
+        except Exception as e:
+            raise Exception('failed to perform DB upgrade on {} adding column {} - exception: {}'.format(table_name, column.name, str(e)))
+
+    # One transaction per namespace to bound the session size
+    with session_scope() as dbsession:
+        namespaces = [x[0] for x in dbsession.query(FixedArtifact.namespace_name).distinct()]
+
+    for namespace_name in namespaces:
+        log.err("computing fix version keys for namespace ({})".format(namespace_name))
+        with session_scope() as dbsession:
+            for fix in dbsession.query(FixedArtifact).filter(FixedArtifact.namespace_name == namespace_name, FixedArtifact.version_format.in_(list(version_key_flavors.keys()))):
+                fix.version_key = package_version_key(version_key_flavors.get(fix.version_format), fix.name, fix.epochless_version)
+
+    with session_scope() as dbsession:
+        distros = dbsession.query(ImagePackage.distro_name, ImagePackage.distro_version, ImagePackage.like_distro).filter(ImagePackage.pkg_type.in_(os_package_types)).distinct().all()
+
+    for distro_name, distro_version, like_distro in distros:
+        log.err("computing package version keys for distro ({}:{})".format(distro_name, distro_version))
+        with session_scope() as dbsession:
+            flavor = DistroNamespace(distro_name, distro_version, like_distro).flavor
+            for pkg in dbsession.query(ImagePackage).filter(ImagePackage.distro_name == distro_name, ImagePackage.distro_version == distro_version, ImagePackage.like_distro == like_distro, ImagePackage.pkg_type.in_(os_package_types)):
+                pkg.version_key = package_version_key(flavor, pkg.name, pkg.fullversion)
+
+
+def db_upgrade_008_009():
+    version_key_upgrade_008_009()
+
+def vulnerability_digest_upgrade_009_010():
+    """
+    Add the content_digest column to vulnerability records. Existing rows are left null, so each is merged as changed the next time the feed
+    sends it, which stores its digest.
+
+    """
+    engine = anchore_engine.db.entities.common.get_engine()
+
+    column = Column('content_digest', String(64 + 10), nullable=True)
+    try:
+        cn = column.compile(dialect=engine.dialect)
+        ct = column.type.compile(engine.dialect)
+        engine.execute('ALTER TABLE %s ADD COLUMN IF NOT EXISTS %s %s' % ('feed_data_vulnerabilities', cn, ct))
+    except Exception as e:
+        raise Exception('failed to perform DB upgrade on {} adding column {} - exception: {}'.format('feed_data_vulnerabilities', column.name, str(e)))
+
+def db_upgrade_009_010():
+    vulnerability_digest_upgrade_009_010()
+
+def image_cpe_vulnerabilities_upgrade_010_011():
+    """
+    Populate the image_cpe_vulnerabilities table, created empty by the table creation step of the upgrade, with the cpe matches of the
+    images already loaded. One transaction per user to bound the size of each insert.
+
+    """
+    from anchore_engine.db import session_scope, ImageCpe, ImageCpeVulnerability
+
+    with session_scope() as dbsession:
+        user_ids = [x[0] for x in dbsession.query(ImageCpe.image_user_id).distinct()]
+
+    for user_id in user_ids:
+        log.err("computing image cpe vulnerability matches for user ({})".format(user_id))
+        with session_scope() as dbsession:
+            dbsession.query(ImageCpeVulnerability).filter(ImageCpeVulnerability.image_user_id == user_id).delete(synchronize_session=False)
+            ImageCpeVulnerability.insert_matches(dbsession, ImageCpe.image_user_id == user_id)
+
+def db_upgrade_010_011():
+    image_cpe_vulnerabilities_upgrade_010_011()
+
+def image_vulnerability_summaries_upgrade_011_012():
+    """
+    Populate the image_vulnerability_summaries table, created empty by the table creation step of the upgrade, with the summaries of
+    the images already loaded. One transaction per user.
+
+    """
+    from anchore_engine.db import session_scope, Image
+    from anchore_engine.services.policy_engine.engine.vulnerability_summary import update_vulnerability_summaries
+
+    with session_scope() as dbsession:
+        user_ids = [x[0] for x in dbsession.query(Image.user_id).distinct()]
+
+    for user_id in user_ids:
+        log.err("computing image vulnerability summaries for user ({})".format(user_id))
+        with session_scope() as dbsession:
+            image_keys = [(user_id, x[0]) for x in dbsession.query(Image.id).filter(Image.user_id == user_id)]
+            update_vulnerability_summaries(dbsession, image_keys)
+
+def db_upgrade_011_012():
+    image_vulnerability_summaries_upgrade_011_012()
+
 # Global upgrade definitions. For a given version these will be executed in order of definition here
 # If multiple functions are defined for a version pair, they will be executed in order.
 # If any function raises and exception, the upgrade is failed and halted.
@@ -699,5 +805,9 @@ upgrade_functions = (
     (('0.0.4', '0.0.5'), [ db_upgrade_004_005 ]),
     (('0.0.5', '0.0.6'), [ db_upgrade_005_006 ]),
     (('0.0.6', '0.0.7'), [ db_upgrade_006_007 ]),
-    (('0.0.7', '0.0.8'), [ db_upgrade_007_008 ])
+    (('0.0.7', '0.0.8'), [ db_upgrade_007_008 ]),
+    (('0.0.8', '0.0.9'), [ db_upgrade_008_009 ]),
+    (('0.0.9', '0.0.10'), [ db_upgrade_009_010 ]),
+    (('0.0.10', '0.0.11'), [ db_upgrade_010_011 ]),
+    (('0.0.11', '0.0.12'), [ db_upgrade_011_012 ])
 )
@@ -681,6 +681,7 @@ def handle_policyeval(*args, **kwargs):
                         if dbfilter not in policy_sub_tags:
                             policy_sub_tags.append(dbfilter)
 
+            evaluations = []
             for dbfilter in policy_sub_tags:
                 with db.session_scope() as dbsession:
                     image_records = db_catalog_image.get_byimagefilter(userId, 'docker', dbfilter=dbfilter,
@@ -693,13 +694,20 @@ def handle_policyeval(*args, **kwargs):
                         # TODO - checks to avoid performing eval if nothing has changed
                         doperform = True
                         if doperform:
-                            logger.debug("calling policy eval perform: " + str(fulltag) + " : " + str(imageDigest))
-                            with db.session_scope() as dbsession:
-                                try:
-                                    rc = catalog_impl.perform_policy_evaluation(userId, imageDigest, dbsession,
-                                                                                evaltag=fulltag)
-                                except Exception as err:
-                                    logger.warn("policy evaluation failed - exception: " + str(err))
+                            logger.debug("queueing policy eval perform: " + str(fulltag) + " : " + str(imageDigest))
+                            evaluations.append((imageDigest, fulltag))
+
+            # evaluate all of the user's subscribed tags against the active policy in one policy engine request
+            if evaluations:
+                logger.debug("calling policy eval perform for " + str(len(evaluations)) + " images")
+                try:
+                    # each evaluation is recorded in its own transaction, as when they were performed one by one
+                    results = catalog_impl.perform_policy_evaluations(userId, evaluations, session_scope=db.session_scope)
+                    for (imageDigest, fulltag), result in results.items():
+                        if isinstance(result, Exception):
+                            logger.warn("policy evaluation failed for " + str(fulltag) + " : " + str(imageDigest) + " - exception: " + str(result))
+                except Exception as err:
+                    logger.warn("policy evaluation failed - exception: " + str(err))
 
     except Exception as err:
         logger.warn("failure in policy eval / vuln scan handler - exception: " + str(err))
@@ -1,3 +1,4 @@
+import contextlib
 import json
 import hashlib
 import time
@@ -1302,118 +1303,165 @@ def perform_vulnerability_scan(userId, imageDigest, dbsession, scantag=None, for
     return(True)
 
 def perform_policy_evaluation(userId, imageDigest, dbsession, evaltag=None, policyId=None, interactive=False, newest_only=False):
+    if not evaltag:
+        raise Exception("could not gather/prepare all necessary inputs for policy evaluation - exception: must supply an evaltag")
+
+    result = perform_policy_evaluations(userId, [(imageDigest, evaltag)], dbsession, policyId=policyId, interactive=interactive)[(imageDigest, evaltag)]
+    if isinstance(result, Exception):
+        raise result
+
+    return(result)
+
+def perform_policy_evaluations(userId, evaluations, dbsession=None, policyId=None, interactive=False, session_scope=None):
+    """
+    Evaluate the policy against many images and tags with a single policy engine request, storing the results and queueing
+    notifications of changes as for a single evaluation.
+
+    :param userId:
+    :param evaluations: list of (imageDigest, evaltag) tuples
+    :param dbsession: session for all reads and writes, in the caller's transaction
+    :param policyId: the policy to evaluate, the active policy if not set
+    :param interactive: if True, the evaluations are not stored
+    :param session_scope: instead of dbsession, a function returning a new session context, e.g. db.session_scope. The inputs are
+    read in one session and each result is recorded in its own, so a failure recording one result does not affect the others
+    and no transaction is held open while the results are streamed from the policy engine
+    :return: dict mapping each (imageDigest, evaltag) to its eval record, or the Exception if its evaluation failed
+    """
     ret = {}
-    # prepare inputs
-    try:
-        # mgr = manager_factory.for_session(dbsession)
-        # system_user_auth = mgr.get_system_credentials()
-        # system_userId = system_user_auth[0]
-        # system_password = system_user_auth[1]
-        #
-        # localconfig = anchore_engine.configuration.localconfig.get_config()
-        # verify = localconfig['internal_ssl_verify']
 
-        image_record = db_catalog_image.get(imageDigest, userId, session=dbsession)
+    if session_scope is None:
+        @contextlib.contextmanager
+        def session_scope():
+            yield dbsession
 
-        annotations = {}
+    client = internal_client_for(PolicyEngineClient, userId)
+
+    images = {}
+    with session_scope() as session:
+        # prepare inputs
         try:
-            if image_record.get('annotations', '{}'):
-                annotations = json.loads(image_record.get('annotations', '{}'))
+            if not policyId:
+                policy_record = db_policybundle.get_active_policy(userId, session=session)
+                policyId = policy_record['policyId']
+
+            policy_bundle = archive_sys.get_document(userId, 'policy_bundles', policyId)
         except Exception as err:
-            logger.warn("could not marshal annotations from json - exception: " + str(err))
+            raise Exception("could not gather/prepare all necessary inputs for policy evaluation - exception: " + str(err))
 
-        if not policyId:
-            policy_record = db_policybundle.get_active_policy(userId, session=dbsession)
-            policyId = policy_record['policyId']
+        for imageDigest in set(digest for digest, _ in evaluations):
+            try:
+                image_record = db_catalog_image.get(imageDigest, userId, session=session)
 
-        policy_bundle = archive_sys.get_document(userId, 'policy_bundles', policyId)
-            
-        if not evaltag:
-            raise Exception("must supply an evaltag")
+                annotations = {}
+                try:
+                    if image_record.get('annotations', '{}'):
+                        annotations = json.loads(image_record.get('annotations', '{}'))
+                except Exception as err:
+                    logger.warn("could not marshal annotations from json - exception: " + str(err))
 
-    except Exception as err:
-        raise Exception("could not gather/prepare all necessary inputs for policy evaluation - exception: " + str(err))
+                imageId = None
+                for image_detail in image_record['image_detail']:
+                    try:
+                        imageId = image_detail['imageId']
+                        break
+                    except:
+                        pass
+            except Exception as err:
+                err = Exception("could not gather/prepare all necessary inputs for policy evaluation - exception: " + str(err))
+                for key in evaluations:
+                    if key[0] == imageDigest:
+                        ret[key] = err
+                continue
 
-    client = internal_client_for(PolicyEngineClient, userId)
+            # do the image load, just in case it was missed in analyze...
+            try:
+                logger.debug('Reloading image: {}, user: {} digest: {}'.format(imageId, userId, imageDigest))
+                resp = policy_engine_image_load(client, userId, imageId, imageDigest)
+            except Exception as err:
+                logger.warn("failed to load image data into policy engine: " + str(err))
 
-    imageId = None
-    for image_detail in image_record['image_detail']:
-        try:
-            imageId = image_detail['imageId']
-            break
-        except:
-            pass
+            images[imageDigest] = (imageId, annotations)
 
+    to_evaluate = [(imageDigest, fulltag) for imageDigest, fulltag in evaluations if imageDigest in images]
+    if not to_evaluate:
+        return(ret)
 
-    # do the image load, just in case it was missed in analyze...
-    try:
-        logger.debug('Reloading image: {}, user: {} digest: {}'.format(imageId, userId, imageDigest))
-        resp = policy_engine_image_load(client, userId, imageId, imageDigest)
-    except Exception as err:
-        logger.warn("failed to load image data into policy engine: " + str(err))
+    logger.debug("calling policy_engine: " + str(userId) + " : " + str(len(to_evaluate)) + " evaluations")
+    results = client.check_user_images_inline(user_id=userId, images=[(images[imageDigest][0], fulltag) for imageDigest, fulltag in to_evaluate], policy_bundle=policy_bundle)
 
-    tagset = [evaltag]
-    for fulltag in tagset:
-        logger.debug("calling policy_engine: " + str(userId) + " : " + str(imageId) + " : " + str(fulltag))
+    # results are returned in request order
+    for (imageDigest, fulltag), result in zip(to_evaluate, results):
+        if result.get('status') != 200:
+            err = Exception("failed policy evaluation of image " + str(imageDigest) + " with tag " + str(fulltag) + " - " + str(result.get('error')))
+            err.__dict__.update({'httpcode': result.get('status')})
+            ret[(imageDigest, fulltag)] = err
+            continue
 
         try:
-            curr_evaluation_result = client.check_user_image_inline(user_id=userId, image_id=imageId, tag=fulltag, policy_bundle=policy_bundle)
+            with session_scope() as session:
+                ret[(imageDigest, fulltag)] = record_policy_evaluation(userId, policyId, imageDigest, fulltag, result['evaluation'], images[imageDigest][1], session, interactive=interactive)
         except Exception as err:
-            raise err
-        curr_final_action = curr_evaluation_result.get('final_action', '').upper()
-        
-        # set up the newest evaluation
-        evalId = hashlib.md5(':'.join([policyId, userId, imageDigest, fulltag, str(curr_final_action)]).encode('utf8')).hexdigest()
-        curr_evaluation_record = anchore_engine.common.helpers.make_eval_record(userId, evalId, policyId, imageDigest, fulltag, curr_final_action, "policy_evaluations/" + evalId)
+            logger.warn("failed to record policy evaluation of image " + str(imageDigest) + " with tag " + str(fulltag) + " - exception: " + str(err))
+            ret[(imageDigest, fulltag)] = err
 
-        if interactive:
-            logger.debug("interactive eval requested, skipping eval archive store and notification check")
-        else:
-            # store the newest evaluation
-            logger.debug("non-interactive eval requested, performing eval archive store")
-
-            # get last image evaluation
-            last_evaluation_record = db_policyeval.tsget_latest(userId, imageDigest, fulltag, session=dbsession)
-            last_evaluation_result = {}
-            last_final_action = None
-            if last_evaluation_record:
-                try:
-                    last_evaluation_result = archive_sys.get_document(userId, 'policy_evaluations', last_evaluation_record['evalId'])
-                    last_final_action = last_evaluation_result['final_action'].upper()
-                except:
-                    logger.warn("no last eval record - skipping")
+    for key in to_evaluate:
+        if key not in ret:
+            ret[key] = Exception("no policy evaluation result returned for image " + str(key[0]) + " with tag " + str(key[1]))
 
-            archive_sys.put_document(userId, 'policy_evaluations', evalId, curr_evaluation_result)
-            db_policyeval.tsadd(policyId, userId, imageDigest, fulltag, curr_final_action, curr_evaluation_record, session=dbsession)
+    return(ret)
 
-            # compare last with newest evaluation
-            doqueue = False
-            if last_evaluation_result and curr_evaluation_result:
-                if last_final_action != curr_final_action:
-                    logger.debug("detected difference in policy eval results (current vs last)")
-                    doqueue = True
-                else:
-                    logger.debug("no difference in policy evaluation")
+def record_policy_evaluation(userId, policyId, imageDigest, fulltag, curr_evaluation_result, annotations, dbsession, interactive=False):
+    curr_final_action = curr_evaluation_result.get('final_action', '').upper()
 
-            # if different, set up a policy eval notification update
-            if doqueue:            
-                try:
-                    logger.debug("queueing policy eval notification")
-                    npayload = {
-                        'last_eval': last_evaluation_result,
-                        'curr_eval': curr_evaluation_result,
-                        }
-                    if annotations:
-                        npayload['annotations'] = annotations
-
-                    rc = notifications.queue_notification(userId, fulltag, 'policy_eval', npayload)
-                except Exception as err:
-                    logger.warn("failed to enqueue notification - exception: " + str(err))
+    # set up the newest evaluation
+    evalId = hashlib.md5(':'.join([policyId, userId, imageDigest, fulltag, str(curr_final_action)]).encode('utf8')).hexdigest()
+    curr_evaluation_record = anchore_engine.common.helpers.make_eval_record(userId, evalId, policyId, imageDigest, fulltag, curr_final_action, "policy_evaluations/" + evalId)
 
-        # done
+    if interactive:
+        logger.debug("interactive eval requested, skipping eval archive store and notification check")
+    else:
+        # store the newest evaluation
+        logger.debug("non-interactive eval requested, performing eval archive store")
 
-    ret = curr_evaluation_record        
-    return(ret)
+        # get last image evaluation
+        last_evaluation_record = db_policyeval.tsget_latest(userId, imageDigest, fulltag, session=dbsession)
+        last_evaluation_result = {}
+        last_final_action = None
+        if last_evaluation_record:
+            try:
+                last_evaluation_result = archive_sys.get_document(userId, 'policy_evaluations', last_evaluation_record['evalId'])
+                last_final_action = last_evaluation_result['final_action'].upper()
+            except:
+                logger.warn("no last eval record - skipping")
+
+        archive_sys.put_document(userId, 'policy_evaluations', evalId, curr_evaluation_result)
+        db_policyeval.tsadd(policyId, userId, imageDigest, fulltag, curr_final_action, curr_evaluation_record, session=dbsession)
+
+        # compare last with newest evaluation
+        doqueue = False
+        if last_evaluation_result and curr_evaluation_result:
+            if last_final_action != curr_final_action:
+                logger.debug("detected difference in policy eval results (current vs last)")
+                doqueue = True
+            else:
+                logger.debug("no difference in policy evaluation")
+
+        # if different, set up a policy eval notification update
+        if doqueue:
+            try:
+                logger.debug("queueing policy eval notification")
+                npayload = {
+                    'last_eval': last_evaluation_result,
+                    'curr_eval': curr_evaluation_result,
+                    }
+                if annotations:
+                    npayload['annotations'] = annotations
+
+                rc = notifications.queue_notification(userId, fulltag, 'policy_eval', npayload)
+            except Exception as err:
+                logger.warn("failed to enqueue notification - exception: " + str(err))
+
+    return(curr_evaluation_record)
 
 def add_or_update_image(dbsession, userId, imageId, tags=[], digests=[], anchore_data=None, dockerfile=None, dockerfile_mode=None, manifest=None, annotations={}):
     ret = []
@@ -66,7 +66,7 @@ def process_preflight():
         logger.info("Engine is configured to skip data feed syncs - skipping feed sync client check")
         skip_credential_validate = True
 
-    preflight_check_functions = [_init_db_content]
+    preflight_check_functions = [_init_db_content, _init_version_compare_cache]
     if not skip_credential_validate:
         preflight_check_functions.append(_check_feed_client_credentials)
 
@@ -107,6 +107,8 @@ def _init_distro_mappings():
                     logger.info('Adding missing mapping: {}'.format(i))
                     dbsession.add(i)
 
+        DistroMapping.cache.invalidate()
+
         logger.info('Distro mapping initialization complete')
     except Exception as err:
         raise Exception("unable to initialize default distro mappings - exception: " + str(err))
@@ -114,6 +116,24 @@ def _init_distro_mappings():
     return True
 
 
+def _init_version_compare_cache():
+    """
+    Size the memoization caches of the package version comparators from the config.
+
+    Config: services.policy_engine.vulnerabilities.version_compare_cache_size (entries per comparator, 0 to disable)
+
+    :return:
+    """
+    from anchore_engine.util import memoize
+
+    config = localconfig.get_config()
+    max_size = int(config.get('services', {}).get('policy_engine', {}).get('vulnerabilities', {}).get('version_compare_cache_size', memoize.DEFAULT_MAX_SIZE))
+    logger.info('Setting version comparison cache size to {} entries per comparator'.format(max_size))
+    memoize.resize_all(max_size, group=memoize.VERSION_COMPARE_GROUP)
+
+    return True
+
+
 def _init_db_content():
     """
     Initialize the policy engine db with any data necessary at startup.
@@ -54,6 +54,7 @@ def add_distro_mapping(distro_mapping):
         new_mapping.flavor = dist_map.flavor
         db.add(new_mapping)
         db.commit()
+        DbDistroMapping.cache.invalidate()
     except IntegrityError as e:
         log.warn('Insertion of existing mapping name')
         db.rollback()
@@ -82,6 +83,7 @@ def delete_distro_mapping(from_distro):
             pass
             # no-op
         db.commit()
+        DbDistroMapping.cache.invalidate()
     except Exception as e:
         log.exception('Error deleting distro mapping for: {}'.format(from_distro))
         db.rollback()
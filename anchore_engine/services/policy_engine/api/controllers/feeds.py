@@ -6,6 +6,7 @@ from werkzeug.exceptions import HTTPException, abort
 from anchore_engine.services.policy_engine.engine.tasks import FeedsUpdateTask, FeedsFlushTask
 from anchore_engine.subsys import logger as log
 from anchore_engine.services.policy_engine.engine.feeds import DataFeeds
+from anchore_engine.services.policy_engine.engine.sync_status import get_sync_status
 from anchore_engine.services.policy_engine.api.models import FeedMetadata, FeedGroupMetadata, FeedMetadataListing
 from anchore_engine.apis.authorization import get_authorizer, Permission
 
@@ -71,4 +72,19 @@ def sync_feeds(sync=True, force_flush=False):
             log.exception('Error executing feed update task')
             abort(Response(status=500, response=json.dumps({'error': 'feed sync failure', 'details': 'Failure syncing feed: {}'.format(e.message if hasattr(e, 'message') else e)}), mimetype='application/json'))
 
-    return jsonify(['{}/{}'.format(x[0], x[1]) for x in result]), 200
\ No newline at end of file
+    return jsonify(['{}/{}'.format(x[0], x[1]) for x in result]), 200
+
+
+@authorizer.requires([Permission(domain='system', action='*', target='*')])
+def get_feed_sync_status():
+    """
+    GET /feeds/sync/status
+
+    :return: progress of the current or most recent feed sync run by this service instance
+    """
+
+    try:
+        return jsonify(get_sync_status().status()), 200
+    except Exception as e:
+        log.exception('Error getting feed sync status')
+        abort(Response(status=500, response=json.dumps({'error': 'feed sync status failure', 'details': str(e)}), mimetype='application/json'))
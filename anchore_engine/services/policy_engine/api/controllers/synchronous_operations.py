@@ -26,13 +26,17 @@ from anchore_engine.services.policy_engine.api.models import Image as ImageMsg,
 from anchore_engine.services.policy_engine.api.models import ImageVulnerabilityListing, ImageIngressRequest, ImageIngressResponse, LegacyVulnerabilityReport, \
     GateSpec, TriggerParamSpec, TriggerSpec
 from anchore_engine.services.policy_engine.api.models import PolicyEvaluation, PolicyEvaluationProblem
-from anchore_engine.db import Image, ImageCpe, CpeVulnerability, get_thread_scoped_session as get_session, ImagePackageVulnerability, CatalogImageDocker, ImageCpe,CpeVulnerability, Vulnerability, ImagePackage, NvdMetadata, db_catalog_image
-from anchore_engine.services.policy_engine.engine.policy.bundles import build_bundle, build_empty_error_execution
+from anchore_engine.db import Image, ImageCpe, CpeVulnerability, get_thread_scoped_session as get_session, ImagePackageVulnerability, CatalogImageDocker, ImageCpe,CpeVulnerability, Vulnerability, ImagePackage, NvdMetadata, db_catalog_image, ImageCpeVulnerability, \
+    ImageVulnerabilitySummary
+from anchore_engine.services.policy_engine.engine.policy.bundles import build_bundle, build_cached_bundle, build_empty_error_execution
 from anchore_engine.services.policy_engine.engine.policy.exceptions import InitializationError
 from anchore_engine.services.policy_engine.engine.policy.gate import ExecutionContext, Gate
 from anchore_engine.services.policy_engine.engine.tasks import ImageLoadTask
+from anchore_engine.services.policy_engine.engine.batch_evaluation import BatchEvaluator
 from anchore_engine.services.policy_engine.engine.vulnerabilities import have_vulnerabilities_for
 from anchore_engine.services.policy_engine.engine.vulnerabilities import rescan_image
+from anchore_engine.services.policy_engine.engine.vulnerability_report import load_image_vulnerabilities, legacy_report_rows, legacy_report
+from anchore_engine.services.policy_engine.engine import report_cache
 from anchore_engine.db import DistroNamespace
 from anchore_engine.subsys import logger as log
 from anchore_engine.apis.authorization import get_authorizer, Permission
@@ -45,8 +49,6 @@ authorizer = get_authorizer()
 import anchore_engine.subsys.metrics
 from anchore_engine.subsys.metrics import flask_metrics
 
-TABLE_STYLE_HEADER_LIST = ['CVE_ID', 'Severity', '*Total_Affected', 'Vulnerable_Package', 'Fix_Available', 'Fix_Images', 'Rebuild_Images', 'URL', 'Package_Type', 'Feed', 'Feed_Group', 'Package_Name', 'Package_Version', 'CVES']
-
 # Toggle of lock usage, primarily for testing and debugging usage
 feed_sync_locking_enabled = True
 
@@ -134,6 +136,43 @@ def list_user_images(user_id):
 
     return imgs
 
+@authorizer.requires([Permission(domain='system', action='*', target='*')])
+def list_image_vulnerability_summaries(user_id, image_id=None):
+    """
+    Return the vulnerability summaries of the user's images, read from the maintained summary table with a single query.
+
+    :param user_id: str user identifier
+    :param image_id: optional list of image ids to limit the listing to
+    :return: list of summary dicts
+    """
+    db = get_session()
+    try:
+        qry = db.query(ImageVulnerabilitySummary).filter(ImageVulnerabilitySummary.image_user_id == user_id)
+        if image_id:
+            qry = qry.filter(ImageVulnerabilitySummary.image_id.in_(image_id))
+
+        return [{
+            'user_id': summary.image_user_id,
+            'image_id': summary.image_id,
+            'total': summary.total_count,
+            'critical': summary.critical_count,
+            'high': summary.high_count,
+            'medium': summary.medium_count,
+            'low': summary.low_count,
+            'negligible': summary.negligible_count,
+            'unknown': summary.unknown_count,
+            'fixable': summary.fixable_count,
+            'not_fixable': summary.total_count - summary.fixable_count,
+            'vendor_no_advisory': summary.vendor_no_advisory_count,
+            'last_updated': summary.last_updated.isoformat() if summary.last_updated else None
+        } for summary in qry]
+    except Exception:
+        log.exception('Error listing vulnerability summaries for user {}'.format(user_id))
+        abort(500)
+    finally:
+        db.close()
+
+
 @flask_metrics.do_not_track()
 @authorizer.requires([Permission(domain='system', action='*', target='*')])
 def delete_image(user_id, image_id):
@@ -155,6 +194,7 @@ def delete_image(user_id, image_id):
             #    db.delete(pkg_vuln)
             db.delete(img)
             db.commit()
+            report_cache.get_report_cache().invalidate_image(user_id, image_id)
         else:
             db.rollback()
 
@@ -196,6 +236,78 @@ def problem_from_exception(eval_exception, severity=None):
     return prob
 
 
+def _compile_bundle(user_id, bundle, tag):
+    """
+    Get the executable bundle for the tag, compiling it if not cached
+
+    :param user_id:
+    :param bundle: bundle json
+    :param tag: the tag to evaluate
+    :return: tuple of (ExecutableBundle, list of initialization problems)
+    """
+    problems = []
+    executable_bundle = None
+    try:
+        # Allow deprecated gates here to support upgrade cases from old policy bundles.
+        executable_bundle = build_cached_bundle(user_id, bundle, for_tag=tag, allow_deprecated=True)
+        if executable_bundle.init_errors:
+            problems = executable_bundle.init_errors
+    except InitializationError as e:
+        log.exception('Bundle construction and initialization returned errors')
+        problems = e.causes
+
+    return executable_bundle, problems
+
+
+def _execute_bundle(db, img_obj, tag, executable_bundle, problems):
+    """
+    Execute the bundle against the image, or build a failed evaluation with details on the problems if the bundle could not be compiled.
+    Exceptions from the execution are raised.
+
+    :return: BundleExecution
+    """
+    if not problems:
+        return executable_bundle.execute(img_obj, tag, ExecutionContext(db_session=db, configuration={}))
+
+    # Construct a failure eval with details on the errors and mappings to send to client
+    eval_result = build_empty_error_execution(img_obj, tag, executable_bundle, errors=problems, warnings=[])
+    if executable_bundle and executable_bundle.mapping and len(executable_bundle.mapping.mapping_rules) == 1:
+        eval_result.executed_mapping = executable_bundle.mapping.mapping_rules[0]
+
+    return eval_result
+
+
+def _evaluation_response(user_id, image_id, tag, bundle, eval_result, timer):
+    """
+    Render the PolicyEvaluation response of an execution and record its evaluation time
+
+    :return: dict
+    """
+    resp = PolicyEvaluation()
+    resp.user_id = user_id
+    resp.image_id = image_id
+    resp.tag = tag
+    resp.bundle = bundle
+    resp.matched_mapping_rule = eval_result.executed_mapping.json() if eval_result.executed_mapping else False
+    resp.last_modified = int(time.time())
+    resp.final_action = eval_result.bundle_decision.final_decision.name
+    resp.final_action_reason = eval_result.bundle_decision.reason
+    resp.matched_whitelisted_images_rule = eval_result.bundle_decision.whitelisted_image.json() if eval_result.bundle_decision.whitelisted_image else False
+    resp.matched_blacklisted_images_rule = eval_result.bundle_decision.blacklisted_image.json() if eval_result.bundle_decision.blacklisted_image else False
+    resp.result = eval_result.as_table_json()
+    resp.created_at = int(time.time())
+    resp.evaluation_problems = [problem_from_exception(i) for i in eval_result.errors]
+    resp.evaluation_problems += [problem_from_exception(i) for i in eval_result.warnings]
+    if resp.evaluation_problems:
+        for i in resp.evaluation_problems:
+            log.warn('Returning evaluation response for image {}/{} w/tag {} and bundle {} that contains error: {}'.format(user_id, image_id, tag, bundle['id'], json.dumps(i.to_dict())))
+        anchore_engine.subsys.metrics.histogram_observe('anchore_policy_evaluation_time_seconds', time.time() - timer, status="fail")
+    else:
+        anchore_engine.subsys.metrics.histogram_observe('anchore_policy_evaluation_time_seconds', time.time() - timer, status="success")
+
+    return resp.to_dict()
+
+
 @flask_metrics.do_not_track()
 @authorizer.requires([Permission(domain='system', action='*', target='*')])
 def check_user_image_inline(user_id, image_id, tag, bundle):
@@ -227,54 +339,15 @@ def check_user_image_inline(user_id, image_id, tag, bundle):
             abort(Response(response='Image not found', status=404))
 
         # Build bundle exec.
-        problems = []
-        executable_bundle = None
-        try:
-            # Allow deprecated gates here to support upgrade cases from old policy bundles.
-            executable_bundle = build_bundle(bundle, for_tag=tag, allow_deprecated=True)
-            if executable_bundle.init_errors:
-                problems = executable_bundle.init_errors
-        except InitializationError as e:
-            log.exception('Bundle construction and initialization returned errors')
-            problems = e.causes
+        executable_bundle, problems = _compile_bundle(user_id, bundle, tag)
 
-        eval_result = None
-        if not problems:
-            # Execute bundle
-            try:
-                eval_result = executable_bundle.execute(img_obj, tag, ExecutionContext(db_session=db, configuration={}))
-            except Exception as e:
-                log.exception('Error executing policy bundle {} against image {} w/tag {}: {}'.format(bundle['id'], image_id, tag, e.message))
-                abort(Response(response='Cannot execute given policy against the image due to errors executing the policy bundle: {}'.format(e.message), status=500))
-        else:
-            # Construct a failure eval with details on the errors and mappings to send to client
-            eval_result = build_empty_error_execution(img_obj, tag, executable_bundle, errors=problems, warnings=[])
-            if executable_bundle and executable_bundle.mapping and len(executable_bundle.mapping.mapping_rules) == 1:
-                eval_result.executed_mapping = executable_bundle.mapping.mapping_rules[0]
-
-        resp = PolicyEvaluation()
-        resp.user_id = user_id
-        resp.image_id = image_id
-        resp.tag = tag
-        resp.bundle = bundle
-        resp.matched_mapping_rule = eval_result.executed_mapping.json() if eval_result.executed_mapping else False
-        resp.last_modified = int(time.time())
-        resp.final_action = eval_result.bundle_decision.final_decision.name
-        resp.final_action_reason = eval_result.bundle_decision.reason
-        resp.matched_whitelisted_images_rule = eval_result.bundle_decision.whitelisted_image.json() if eval_result.bundle_decision.whitelisted_image else False
-        resp.matched_blacklisted_images_rule = eval_result.bundle_decision.blacklisted_image.json() if eval_result.bundle_decision.blacklisted_image else False
-        resp.result = eval_result.as_table_json()
-        resp.created_at = int(time.time())
-        resp.evaluation_problems = [problem_from_exception(i) for i in eval_result.errors]
-        resp.evaluation_problems += [problem_from_exception(i) for i in eval_result.warnings]
-        if resp.evaluation_problems:
-            for i in resp.evaluation_problems:
-                log.warn('Returning evaluation response for image {}/{} w/tag {} and bundle {} that contains error: {}'.format(user_id, image_id, tag, bundle['id'], json.dumps(i.to_dict())))
-            anchore_engine.subsys.metrics.histogram_observe('anchore_policy_evaluation_time_seconds', time.time() - timer, status="fail")
-        else:
-            anchore_engine.subsys.metrics.histogram_observe('anchore_policy_evaluation_time_seconds', time.time() - timer, status="success")
+        try:
+            eval_result = _execute_bundle(db, img_obj, tag, executable_bundle, problems)
+        except Exception as e:
+            log.exception('Error executing policy bundle {} against image {} w/tag {}: {}'.format(bundle['id'], image_id, tag, e.message))
+            abort(Response(response='Cannot execute given policy against the image due to errors executing the policy bundle: {}'.format(e.message), status=500))
 
-        return resp.to_dict()
+        return _evaluation_response(user_id, image_id, tag, bundle, eval_result, timer)
 
     except HTTPException as e:
         db.rollback()
@@ -288,6 +361,69 @@ def check_user_image_inline(user_id, image_id, tag, bundle):
         db.close()
 
 
+@flask_metrics.do_not_track()
+@authorizer.requires([Permission(domain='system', action='*', target='*')])
+def check_user_images_inline(user_id, request):
+    """
+    Execute policy evaluations of many images against the bundle in the request body. The bundle is compiled once per mapping rule and
+    the images are evaluated by a pool of workers. Results are streamed back as newline-delimited json in the order of the request's
+    images, one object per image with its image_id, tag, http-like status and either the evaluation or an error message.
+
+    :param user_id:
+    :param request: dict with 'bundle' and 'images', a list of {'image_id': ..., 'tag': ...} dicts
+    :return: streaming application/x-ndjson response
+    """
+
+    bundle = request.get('bundle')
+    if not bundle:
+        abort(Response(response='No bundle found in request', status=400))
+
+    # set tag value to a value that only matches wildcards if not given
+    images = [(x.get('image_id'), x.get('tag') or '*/*:*') for x in request.get('images', [])]
+
+    # Compile up front, in the request thread, so workers only execute shared compiled bundles
+    compiled = {}
+    for tag in set(tag for _, tag in images):
+        try:
+            compiled[tag] = _compile_bundle(user_id, bundle, tag)
+        except Exception as e:
+            log.exception('Failed compiling bundle {} for tag {}'.format(bundle.get('id'), tag))
+            compiled[tag] = e
+
+    def evaluate(item):
+        image_id, tag = item
+        result = {'image_id': image_id, 'tag': tag}
+        timer = time.time()
+        db = get_session()
+        try:
+            if isinstance(compiled[tag], Exception):
+                raise compiled[tag]
+
+            img_obj = db.query(Image).get((image_id, user_id))
+            if not img_obj:
+                log.info('Request for evaluation of image that cannot be found: user_id = {}, image_id = {}'.format(user_id, image_id))
+                result.update({'status': 404, 'error': 'Image not found'})
+                return result
+
+            executable_bundle, problems = compiled[tag]
+            eval_result = _execute_bundle(db, img_obj, tag, executable_bundle, problems)
+            result.update({'status': 200, 'evaluation': _evaluation_response(user_id, image_id, tag, bundle, eval_result, timer)})
+        except Exception as e:
+            db.rollback()
+            log.exception('Error executing policy bundle {} against image {} w/tag {}: {}'.format(bundle.get('id'), image_id, tag, e))
+            result.update({'status': 500, 'error': 'Cannot execute given policy against the image due to errors executing the policy bundle: {}'.format(e)})
+        finally:
+            db.close()
+
+        return result
+
+    def generate():
+        for result in BatchEvaluator.from_config().evaluate(images, evaluate):
+            yield json.dumps(result) + '\n'
+
+    return Response(generate(), status=200, mimetype='application/x-ndjson')
+
+
 @flask_metrics.do_not_track()
 @authorizer.requires([Permission(domain='system', action='*', target='*')])
 def get_image_vulnerabilities(user_id, image_id, force_refresh=False, vendor_only=True):
@@ -327,7 +463,7 @@ def get_image_vulnerabilities(user_id, image_id, force_refresh=False, vendor_onl
     :param image_id: image id to evaluate
     :param force_refresh: if true, flush and recompute vulnerabilities rather than returning current values
     :param vendor_only: if true, filter out the vulnerabilities that vendors will explicitly not address
-    :return:
+    :return: the listing with its ETag header, or an empty 304 response if the If-None-Match header has the current ETag
     """
 
     # Has image?
@@ -350,8 +486,22 @@ def get_image_vulnerabilities(user_id, image_id, force_refresh=False, vendor_onl
 
                 db = get_session()
                 db.refresh(img)
-            
-            vulns = img.vulnerabilities()
+
+            # Read the version before the data, so a report is never cached under a newer version than its data
+            cache = report_cache.get_report_cache()
+            cache_key = report_cache.ReportKey(user_id=user_id, image_id=image_id, vendor_only=vendor_only)
+            version = report_cache.report_version(db, img)
+            etag = report_cache.report_etag(cache_key, version)
+
+            if report_cache.etag_matches(connexion.request.headers.get('If-None-Match'), etag):
+                return None, 304, {'ETag': etag}
+
+            cached = cache.lookup(cache_key, version)
+            report_cache.record_metrics(hit=cached is not None)
+            if cached is not None:
+                return cached.report, 200, {'ETag': cached.etag}
+
+            vulns = load_image_vulnerabilities(db, user_id, image_id)
 
         # Has vulnerabilities?
         warns = []
@@ -361,81 +511,36 @@ def get_image_vulnerabilities(user_id, image_id, force_refresh=False, vendor_onl
             if not have_vulnerabilities_for(ns):
                 warns = ['No vulnerability data available for image distro: {}'.format(ns.namespace_name)]
 
-
-        rows = []
-        for vuln in vulns:
-            # Skip the vulnerability if the vendor_only flag is set to True and the issue won't be addressed by the vendor
-            if vendor_only and vuln.fix_has_no_advisory():
-                continue
-
-            cves = ''
-            if vuln.vulnerability.additional_metadata:
-                cves = ' '.join(vuln.vulnerability.additional_metadata.get('cves', []))
-
-            rows.append([
-                vuln.vulnerability_id,
-                vuln.vulnerability.severity,
-                1,
-                vuln.pkg_name + '-' + vuln.package.fullversion,
-                str(vuln.fixed_in()),
-                vuln.pkg_image_id,
-                'None', # Always empty this for now
-                vuln.vulnerability.link,
-                vuln.pkg_type,
-                'vulnerabilities',
-                vuln.vulnerability.namespace_name,
-                vuln.pkg_name,
-                vuln.package.fullversion,
-                cves,
-                ]
-            )
-
-        vuln_listing = {
-            'multi': {
-                'url_column_index': 7,
-                'result': {
-                    'header': TABLE_STYLE_HEADER_LIST,
-                    'rowcount': len(rows),
-                    'colcount': len(TABLE_STYLE_HEADER_LIST),
-                    'rows': rows
-                },
-                'warns': warns
-            }
-        }
+        vuln_listing = legacy_report(legacy_report_rows(vulns, vendor_only=vendor_only), warns)
 
         cpe_vuln_listing = []
         try:
-            all_cpe_matches = db.query(ImageCpe,CpeVulnerability).filter(ImageCpe.image_id==image_id).filter(ImageCpe.name==CpeVulnerability.name).filter(ImageCpe.version==CpeVulnerability.version)
-            if not all_cpe_matches:
-                all_cpe_matches = []
-
-            cpe_hashes = {}
-            for image_cpe, vulnerability_cpe in all_cpe_matches:
-                cpe_vuln_el = {
-                    'vulnerability_id': vulnerability_cpe.vulnerability_id,
-                    'severity': vulnerability_cpe.severity,
-                    'link': vulnerability_cpe.link,
-                    'pkg_type': image_cpe.pkg_type,
-                    'pkg_path': image_cpe.pkg_path,
-                    'name': image_cpe.name,
-                    'version': image_cpe.version,
-                    'cpe': image_cpe.get_cpestring(),
-                    'feed_name': vulnerability_cpe.feed_name,
-                    'feed_namespace': vulnerability_cpe.namespace_name,
-                }
-                cpe_hash = hashlib.sha256(utils.ensure_bytes(json.dumps(cpe_vuln_el))).hexdigest()
-                if not cpe_hashes.get(cpe_hash, False):
-                    cpe_vuln_listing.append(cpe_vuln_el)
-                    cpe_hashes[cpe_hash] = True
+            # Matches are computed and deduplicated when the image is loaded and kept up to date by the nvd feed syncs
+            all_cpe_matches = db.query(ImageCpeVulnerability).filter(ImageCpeVulnerability.image_user_id == user_id, ImageCpeVulnerability.image_id == image_id)
+
+            for cpe_match in all_cpe_matches:
+                cpe_vuln_listing.append({
+                    'vulnerability_id': cpe_match.vulnerability_id,
+                    'severity': cpe_match.severity,
+                    'link': cpe_match.link,
+                    'pkg_type': cpe_match.pkg_type,
+                    'pkg_path': cpe_match.pkg_path,
+                    'name': cpe_match.name,
+                    'version': cpe_match.version,
+                    'cpe': cpe_match.get_cpestring(),
+                    'feed_name': cpe_match.feed_name,
+                    'feed_namespace': cpe_match.vulnerability_namespace_name,
+                })
         except Exception as err:
             log.warn("could not fetch CPE matches - exception: " + str(err))
 
 
 
         report = LegacyVulnerabilityReport.from_dict(vuln_listing)
-        resp = ImageVulnerabilityListing(user_id=user_id, image_id=image_id, legacy_report=report, cpe_report=cpe_vuln_listing)
+        resp = ImageVulnerabilityListing(user_id=user_id, image_id=image_id, legacy_report=report, cpe_report=cpe_vuln_listing).to_dict()
+        cache.cache_it(cache_key, version, etag, resp)
 
-        return resp.to_dict()
+        return resp, 200, {'ETag': etag}
     except HTTPException:
         db.rollback()
         raise
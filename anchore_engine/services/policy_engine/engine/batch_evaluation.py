@@ -0,0 +1,83 @@
+"""
+Parallel policy evaluations of many images against one bundle.
+
+Admission and reporting flows evaluate a single bundle against many (image, tag) pairs. The bundle is compiled once per mapping rule
+by the caller, see build_cached_bundle(), and the evaluations are handed to a pool of worker threads. Each worker evaluates with its
+own thread-scoped db session. Results are yielded in request order as soon as they are available so they can be streamed back,
+with a bounded number of evaluations in flight.
+
+"""
+import collections
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import anchore_engine.subsys.metrics
+from anchore_engine.configuration import localconfig
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+
+log = get_logger()
+
+DEFAULT_WORKERS = 4
+
+
+class BatchEvaluator(object):
+    """
+    Runs an evaluation function over a list of items with a pool of worker threads.
+
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = max(int(workers), 1)
+
+    @classmethod
+    def from_config(cls):
+        """
+        Build an evaluator using the service config.
+
+        Config: services.policy_engine.policy_evaluation_workers
+
+        :return: BatchEvaluator
+        """
+        try:
+            config = localconfig.get_config().get('services', {}).get('policy_engine', {})
+            return BatchEvaluator(workers=config.get('policy_evaluation_workers', DEFAULT_WORKERS))
+        except Exception as e:
+            log.warn('Could not read policy evaluation workers config, using default {}. Error: {}'.format(DEFAULT_WORKERS, e))
+            return BatchEvaluator()
+
+    def evaluate(self, items, evaluate_fn):
+        """
+        Generator of evaluate_fn(item) for each item, in the order of the items. evaluate_fn runs in a worker thread and must handle
+        its own errors and db session. Closing the generator early cancels the evaluations not yet started.
+
+        :param items: list of inputs to evaluate_fn
+        :param evaluate_fn: function of one item returning its result
+        :return: generator of results
+        """
+        start_time = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = collections.deque()
+        count = 0
+
+        try:
+            # Keep at most a couple of evaluations per worker ahead of the one being returned so results held in memory are bounded
+            pending = iter(items)
+            for item in itertools.islice(pending, self.workers * 2):
+                futures.append(executor.submit(evaluate_fn, item))
+
+            while futures:
+                result = futures.popleft().result()
+                for item in itertools.islice(pending, 1):
+                    futures.append(executor.submit(evaluate_fn, item))
+
+                count += 1
+                yield result
+        finally:
+            for f in futures:
+                f.cancel()
+            executor.shutdown(wait=False)
+
+            elapsed = time.time() - start_time
+            anchore_engine.subsys.metrics.histogram_observe('anchore_policy_batch_evaluation_time_seconds', elapsed)
+            log.debug('Returned {} policy evaluations in {:.2f} sec with {} workers'.format(count, elapsed, self.workers))
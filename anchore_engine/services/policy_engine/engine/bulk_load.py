@@ -0,0 +1,245 @@
+"""
+Bulk loading of mapped feed records, for the initial sync of feed groups into empty tables.
+
+Adding each mapped ORM object to the session makes the unit of work track and flush every record and child record
+individually. The BulkLoader instead flattens the mapped objects, including their cascaded child collections such as
+Vulnerability.fixed_in or NvdMetadata.vulnerable_cpes, into per-table rows and writes them in batches with a Core
+executemany insert, or with COPY FROM STDIN on PostgreSQL. Rows are written in table dependency order so foreign keys
+are satisfied, and within the session's transaction so the caller still controls commit and rollback.
+
+Only inserts are done, so this is only suitable for loading data that is known not to exist yet.
+
+"""
+import contextlib
+import datetime
+import io
+import time
+
+from sqlalchemy import LargeBinary, inspect
+from sqlalchemy.orm.interfaces import ONETOMANY
+
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+
+log = get_logger()
+
+DEFAULT_BATCH_SIZE = 5000
+
+# PostgreSQL DB-API drivers that can stream COPY FROM STDIN data, see BulkLoader._copy()
+COPY_DRIVERS = ['pg8000', 'psycopg2']
+
+
+class BulkLoader(object):
+    """
+    Buffers rows of mapped objects per table and writes them in batches.
+
+    """
+
+    def __init__(self, db, batch_size=DEFAULT_BATCH_SIZE, use_copy=True):
+        """
+        :param db: the db session whose connection and transaction to use
+        :param batch_size: number of buffered rows at which all buffers are written
+        :param use_copy: use COPY FROM STDIN when the session is bound to PostgreSQL with a supported driver, executemany inserts otherwise
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.dialect = db.get_bind().dialect
+        self.use_copy = use_copy and self.dialect.name == 'postgresql' and self.dialect.driver in COPY_DRIVERS
+        self.row_counts = {}
+        self.write_time = 0.0
+        self._buffers = {}
+        self._buffered = 0
+
+    def add(self, obj):
+        """
+        Buffer the rows for the object and its child collections, writing all buffers if the batch size is reached.
+
+        :param obj: a transient mapped object
+        """
+        self._add_rows(obj, None)
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def add_all(self, objs):
+        for obj in objs:
+            self.add(obj)
+
+    def add_row(self, table, row):
+        """
+        Buffer a row that is already in table form, writing all buffers if the batch size is reached.
+
+        :param table: Table object
+        :param row: dict of column key -> value
+        """
+        self._buffers.setdefault(table, []).append(row)
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered rows, parent tables first.
+
+        """
+        if not self._buffered:
+            return
+
+        timer = time.time()
+        for table in Base.metadata.sorted_tables:
+            rows = self._buffers.pop(table, None)
+            if not rows:
+                continue
+
+            if self.use_copy:
+                self._copy(table, rows)
+            else:
+                self.db.execute(table.insert(), rows)
+
+            self.row_counts[table.name] = self.row_counts.get(table.name, 0) + len(rows)
+
+        self._buffered = 0
+        self.write_time += time.time() - timer
+
+    def total_rows(self):
+        return sum(self.row_counts.values())
+
+    def _add_rows(self, obj, parent_values):
+        state = inspect(obj)
+        mapper = state.mapper
+        table = mapper.local_table
+
+        row = {}
+        for attr in mapper.column_attrs:
+            column = attr.columns[0]
+            if attr.key in state.dict:
+                row[column.key] = state.dict[attr.key]
+            else:
+                row[column.key] = _column_default(column)
+
+        # Foreign key values are set from the parent as the ORM would on flush
+        if parent_values:
+            row.update(parent_values)
+
+        self._buffers.setdefault(table, []).append(row)
+        self._buffered += 1
+
+        for relationship in mapper.relationships:
+            if relationship.direction is not ONETOMANY or 'save-update' not in relationship.cascade:
+                continue
+
+            children = state.dict.get(relationship.key)
+            if not children:
+                continue
+
+            child_values = {remote.key: row[local.key] for local, remote in relationship.local_remote_pairs}
+            for child in children:
+                self._add_rows(child, child_values)
+
+    def _copy(self, table, rows):
+        """
+        Write rows with COPY FROM STDIN in text format, on the session's connection so it is part of the transaction. The data
+        is sent as utf-8 bytes, which both pg8000 (stream parameter of execute) and psycopg2 (copy_expert) accept.
+
+        Values are converted with the column types' bind processors as for an insert, except binary values. Those processors
+        wrap the bytes in driver objects for parameter binding (e.g. psycopg2.Binary), so the bytes are kept and encoded as
+        bytea hex by _copy_text() instead.
+
+        """
+        columns = list(table.columns)
+        processors = [None if isinstance(column.type, LargeBinary) else column.type.bind_processor(self.dialect) for column in columns]
+
+        buf = io.BytesIO()
+        for row in rows:
+            values = []
+            for column, processor in zip(columns, processors):
+                value = row.get(column.key)
+                if processor is not None and value is not None:
+                    value = processor(value)
+                values.append(_copy_text(value))
+            buf.write('\t'.join(values).encode('utf-8'))
+            buf.write(b'\n')
+        buf.seek(0)
+
+        statement = 'COPY {} ({}) FROM STDIN'.format(self.dialect.identifier_preparer.format_table(table), ', '.join([self.dialect.identifier_preparer.quote(c.name) for c in columns]))
+        cursor = self.db.connection().connection.cursor()
+        try:
+            if self.dialect.driver == 'pg8000':
+                cursor.execute(statement, stream=buf)
+            else:
+                cursor.copy_expert(statement, buf)
+        finally:
+            cursor.close()
+
+
+def _column_default(column):
+    """
+    Value the ORM would insert for a column not set on the object, for client-side scalar or callable defaults.
+
+    """
+    default = column.default
+    if default is None:
+        return None
+    if default.is_scalar:
+        return default.arg
+    if default.is_callable:
+        return default.arg(None)
+    return None
+
+
+def _copy_text(value):
+    """
+    Encode a value for the COPY text format.
+
+    """
+    if value is None:
+        return '\\N'
+
+    if isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        value = '\\x' + bytes(value).hex()
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        value = value.isoformat()
+    elif not isinstance(value, str):
+        value = str(value)
+
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+@contextlib.contextmanager
+def deferred_indexes(db, tables):
+    """
+    Drop the secondary indexes of the given tables for the duration of the context and rebuild them after, which is faster
+    than maintaining them row by row during a large load. The drops and rebuilds are committed separately from the load.
+
+    :param db: the db session to use
+    :param tables: list of Table objects
+    """
+    indexes = [index for table in tables for index in table.indexes]
+    dropped = []
+    try:
+        for index in indexes:
+            log.info('Dropping index {} for bulk load'.format(index.name))
+            index.drop(bind=db.connection())
+            dropped.append(index)
+        db.commit()
+    except Exception as e:
+        log.exception('Could not drop indexes for bulk load, loading with indexes in place')
+        db.rollback()
+        dropped = []
+
+    try:
+        yield
+    finally:
+        if dropped:
+            timer = time.time()
+            try:
+                for index in dropped:
+                    log.info('Rebuilding index {} after bulk load'.format(index.name))
+                    index.create(bind=db.connection())
+                db.commit()
+                log.info('Rebuilt {} indexes in {} sec'.format(len(dropped), time.time() - timer))
+            except Exception as e:
+                log.exception('Failed rebuilding indexes after bulk load')
+                db.rollback()
+                raise
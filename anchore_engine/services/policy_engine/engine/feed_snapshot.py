@@ -0,0 +1,275 @@
+"""
+Offline snapshots of the synced feed data, to bootstrap a new policy engine db without fetching and mapping the feeds over the network.
+
+A snapshot is a single uncompressed tar file containing:
+
+    manifest.json: format and db schema versions, the feed and group metadata including each group's last_sync, and the list of chunks
+    <table name>/<chunk number>.jsonl.gz: gzip-compressed JSON lines, one row per line as a list of values in the manifest's column order
+
+Rows are exported per table with a streaming query, and imported with the BulkLoader in table dependency order within a single transaction.
+The imported groups keep the last_sync of the exporting db, so the next feed sync is an incremental one from that point.
+
+"""
+import base64
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import tarfile
+import time
+
+import dateutil.parser
+from sqlalchemy import DateTime, LargeBinary
+
+from anchore_engine import version
+from anchore_engine.db import FeedMetadata, FeedGroupMetadata, GenericFeedDataRecord, GemMetadata, NpmMetadata, Vulnerability, \
+    FixedArtifact, VulnerableArtifact, NvdMetadata, CpeVulnerability
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.bulk_load import BulkLoader
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+
+log = get_logger()
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_CHUNK_ROWS = 10000
+
+# Tables holding feed data, the feed and group metadata are in the manifest itself
+feed_data_entities = [GenericFeedDataRecord, GemMetadata, NpmMetadata, Vulnerability, FixedArtifact, VulnerableArtifact, NvdMetadata, CpeVulnerability]
+
+
+def feed_data_tables():
+    """
+    :return: list of the feed data Table objects, parent tables first
+    """
+    names = {x.__tablename__ for x in feed_data_entities}
+    return [x for x in Base.metadata.sorted_tables if x.name in names]
+
+
+def export_snapshot(db, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write the feed metadata and all feed data in the db to a snapshot file.
+
+    :param db: db session
+    :param path: file path to write the snapshot to
+    :param chunk_rows: max number of rows per chunk file
+    :return: the manifest dict
+    """
+    timer = time.time()
+    manifest = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'db_version': version.db_version,
+        'created_at': datetime.datetime.utcnow().isoformat(),
+        'feeds': [_feed_json(x) for x in db.query(FeedMetadata).order_by(FeedMetadata.name)],
+        'tables': []
+    }
+
+    with tarfile.open(path, 'w') as archive:
+        for table in feed_data_tables():
+            columns = list(table.columns)
+            table_entry = {'name': table.name, 'columns': [x.name for x in columns], 'row_count': 0, 'chunks': []}
+
+            qry = table.select().order_by(*table.primary_key.columns).execution_options(stream_results=True)
+            rows = []
+            for row in db.execute(qry):
+                rows.append([_encode_value(column, row[column]) for column in columns])
+                if len(rows) >= chunk_rows:
+                    table_entry['chunks'].append(_write_chunk(archive, table.name, len(table_entry['chunks']), rows))
+                    table_entry['row_count'] += len(rows)
+                    rows = []
+
+            if rows:
+                table_entry['chunks'].append(_write_chunk(archive, table.name, len(table_entry['chunks']), rows))
+                table_entry['row_count'] += len(rows)
+
+            log.info('Exported {} rows from table {} in {} chunks'.format(table_entry['row_count'], table.name, len(table_entry['chunks'])))
+            manifest['tables'].append(table_entry)
+
+        _add_file(archive, MANIFEST_NAME, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    log.info('Exported feed snapshot to {} in {} sec'.format(path, time.time() - timer))
+    return manifest
+
+
+def read_manifest(path):
+    """
+    Read and validate the manifest of a snapshot file.
+
+    :param path:
+    :return: the manifest dict
+    """
+    with tarfile.open(path, 'r') as archive:
+        manifest = _read_manifest(archive)
+    return manifest
+
+
+def import_snapshot(db, path, batch_size=None, use_copy=True):
+    """
+    Load a snapshot into the db and set the feed and group metadata from it, including the groups' last_sync, in a single transaction.
+    The snapshot can only be loaded into a db that has no synced data for any of its groups.
+
+    :param db: db session
+    :param path: snapshot file path
+    :param batch_size: BulkLoader batch size, None for its default
+    :param use_copy: use COPY FROM STDIN where supported
+    :return: the manifest dict
+    """
+    timer = time.time()
+    with tarfile.open(path, 'r') as archive:
+        manifest = _read_manifest(archive)
+
+        synced = [(x.feed_name, x.name) for x in db.query(FeedGroupMetadata).filter(FeedGroupMetadata.last_sync.isnot(None))]
+        snapshot_groups = {(feed['name'], group['name']) for feed in manifest['feeds'] for group in feed['groups']}
+        conflicts = snapshot_groups.intersection(synced)
+        if conflicts:
+            raise ValueError('Cannot import snapshot, groups already synced in the db: {}'.format(', '.join(['{}/{}'.format(*x) for x in sorted(conflicts)])))
+
+        tables = {x.name: x for x in feed_data_tables()}
+        table_entries = {x['name']: x for x in manifest['tables']}
+        unknown = set(table_entries.keys()).difference(tables.keys())
+        if unknown:
+            raise ValueError('Snapshot contains unknown tables: {}'.format(', '.join(sorted(unknown))))
+
+        try:
+            loader = BulkLoader(db, use_copy=use_copy) if batch_size is None else BulkLoader(db, batch_size=batch_size, use_copy=use_copy)
+
+            for table in feed_data_tables():
+                entry = table_entries.get(table.name)
+                if not entry:
+                    continue
+
+                columns = [table.columns[x] for x in entry['columns']]
+                for chunk in entry['chunks']:
+                    for values in _read_chunk(archive, chunk):
+                        loader.add_row(table, {column.key: _decode_value(column, value) for column, value in zip(columns, values)})
+
+                # Children reference the parent rows, so write each table out before the next
+                loader.flush()
+                log.info('Imported {} rows into table {}'.format(loader.row_counts.get(table.name, 0), table.name))
+
+            for feed_json in manifest['feeds']:
+                _merge_feed(db, feed_json)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    log.info('Imported feed snapshot from {} with {} rows in {} sec'.format(path, loader.total_rows(), time.time() - timer))
+    return manifest
+
+
+def _feed_json(feed):
+    return {
+        'name': feed.name,
+        'description': feed.description,
+        'access_tier': feed.access_tier,
+        'last_full_sync': _encode_datetime(feed.last_full_sync),
+        'last_update': _encode_datetime(feed.last_update),
+        'groups': [
+            {
+                'name': x.name,
+                'description': x.description,
+                'access_tier': x.access_tier,
+                'last_sync': _encode_datetime(x.last_sync)
+            } for x in sorted(feed.groups, key=lambda g: g.name)
+        ]
+    }
+
+
+def _merge_feed(db, feed_json):
+    feed = db.query(FeedMetadata).get(feed_json['name'])
+    if not feed:
+        feed = FeedMetadata(name=feed_json['name'])
+        db.add(feed)
+
+    feed.description = feed_json['description']
+    feed.access_tier = feed_json['access_tier']
+    feed.last_full_sync = _decode_datetime(feed_json['last_full_sync'])
+    feed.last_update = _decode_datetime(feed_json['last_update'])
+
+    for group_json in feed_json['groups']:
+        group = db.query(FeedGroupMetadata).get((group_json['name'], feed_json['name']))
+        if not group:
+            group = FeedGroupMetadata(name=group_json['name'], feed_name=feed_json['name'])
+            db.add(group)
+
+        group.description = group_json['description']
+        group.access_tier = group_json['access_tier']
+        group.last_sync = _decode_datetime(group_json['last_sync'])
+
+    db.flush()
+
+
+def _read_manifest(archive):
+    try:
+        manifest = json.loads(archive.extractfile(MANIFEST_NAME).read().decode('utf-8'))
+    except KeyError:
+        raise ValueError('Not a feed snapshot, no {} found'.format(MANIFEST_NAME))
+
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError('Unsupported snapshot format version {}, expected {}'.format(manifest.get('format_version'), SNAPSHOT_FORMAT_VERSION))
+
+    if manifest.get('db_version') != version.db_version:
+        raise ValueError('Snapshot was exported from db version {}, this db is version {}'.format(manifest.get('db_version'), version.db_version))
+
+    return manifest
+
+
+def _write_chunk(archive, table_name, number, rows):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as f:
+        for values in rows:
+            f.write(json.dumps(values, separators=(',', ':')).encode('utf-8'))
+            f.write(b'\n')
+
+    data = buf.getvalue()
+    name = '{}/{:06d}.jsonl.gz'.format(table_name, number)
+    _add_file(archive, name, data)
+    return {'file': name, 'rows': len(rows), 'sha256': hashlib.sha256(data).hexdigest()}
+
+
+def _read_chunk(archive, chunk):
+    data = archive.extractfile(chunk['file']).read()
+    if hashlib.sha256(data).hexdigest() != chunk['sha256']:
+        raise ValueError('Snapshot chunk {} does not match its digest'.format(chunk['file']))
+
+    with gzip.GzipFile(fileobj=io.BytesIO(data), mode='rb') as f:
+        for line in f:
+            yield json.loads(line.decode('utf-8'))
+
+
+def _add_file(archive, name, data):
+    info = tarfile.TarInfo(name=name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(data))
+
+
+def _encode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return _encode_datetime(value)
+    if isinstance(column.type, LargeBinary):
+        return base64.b64encode(value).decode('utf-8')
+    return value
+
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return _decode_datetime(value)
+    if isinstance(column.type, LargeBinary):
+        return base64.b64decode(value)
+    return value
+
+
+def _encode_datetime(value):
+    return value.isoformat() if value else None
+
+
+def _decode_datetime(value):
+    return dateutil.parser.parse(value) if value else None
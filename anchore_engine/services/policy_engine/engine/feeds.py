@@ -9,21 +9,36 @@ an update to the feed handling code is ok to be required as well.
 """
 import json
 import datetime
+import hashlib
 import re
+import queue
 import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from anchore_engine.db import get_thread_scoped_session as get_session
+import anchore_engine.subsys.metrics
+from anchore_engine.db import get_thread_scoped_session as get_session, end_session
 from anchore_engine.db import GenericFeedDataRecord, FeedMetadata, FeedGroupMetadata
-from anchore_engine.db import FixedArtifact, Vulnerability, GemMetadata, NpmMetadata, NvdMetadata, CpeVulnerability
+from anchore_engine.db import FixedArtifact, Vulnerability, GemMetadata, NpmMetadata, NvdMetadata, CpeVulnerability, DistroNamespace
 from anchore_engine.services.policy_engine.engine.logs import get_logger
+from anchore_engine.configuration import localconfig
+from anchore_engine.services.policy_engine.engine import match_cache, fix_index
+from anchore_engine.services.policy_engine.engine.sync_status import get_sync_status
+from anchore_engine.services.policy_engine.engine.vulnerability_summary import discard_stale_summaries, update_stale_summaries
+from anchore_engine.services.policy_engine.engine.bulk_load import BulkLoader, deferred_indexes, DEFAULT_BATCH_SIZE as DEFAULT_BULK_SYNC_BATCH_SIZE
 from anchore_engine.clients.feeds.feed_service import get_client as get_feeds_client, InsufficientAccessTierError, InvalidCredentialsError
 from anchore_engine.util.semver import convert_langversionlist_to_semver
+from anchore_engine.util.packages import package_version_key, version_key_flavors
 
 log = get_logger()
 
 feed_list_cache = threading.local()
 
+DEFAULT_SYNC_CHUNK_SIZE = 1000 # Number of mapped records held in memory at a time during a group sync
+DEFAULT_SYNC_WORKERS = 1 # Number of groups of a feed synced concurrently
+DEFAULT_SYNC_PREFETCH_CHUNKS = 1 # Number of chunks of group data fetched and mapped ahead of the db writes
+
 
 def get_feeds_config(full_config):
     """
@@ -34,6 +49,127 @@ def get_feeds_config(full_config):
     return full_config.get('feeds',{})
 
 
+def get_sync_chunk_size(config):
+    """
+    Given a configuration dict, determine how many mapped records a group sync holds in memory before flushing them to the db.
+
+    :param config:
+    :return: int max number of records per chunk
+    """
+    try:
+        chunk_size = int(get_feeds_config(config).get('sync_chunk_size', DEFAULT_SYNC_CHUNK_SIZE))
+    except (TypeError, ValueError):
+        log.warn('Invalid feeds sync_chunk_size in config, using default {}'.format(DEFAULT_SYNC_CHUNK_SIZE))
+        chunk_size = DEFAULT_SYNC_CHUNK_SIZE
+
+    return chunk_size if chunk_size > 0 else DEFAULT_SYNC_CHUNK_SIZE
+
+
+def get_bulk_sync_config(config):
+    """
+    Given a configuration dict, determine the settings for bulk syncs of feeds that have never been synced.
+
+    :param config:
+    :return: dict with batch_size (rows per write), use_copy (use COPY on PostgreSQL), and defer_indexes (rebuild indexes after the load)
+    """
+    bulk_config = get_feeds_config(config).get('bulk_sync', {})
+
+    try:
+        batch_size = int(bulk_config.get('batch_size', DEFAULT_BULK_SYNC_BATCH_SIZE))
+    except (TypeError, ValueError):
+        log.warn('Invalid feeds bulk_sync batch_size in config, using default {}'.format(DEFAULT_BULK_SYNC_BATCH_SIZE))
+        batch_size = DEFAULT_BULK_SYNC_BATCH_SIZE
+
+    return {
+        'batch_size': batch_size if batch_size > 0 else DEFAULT_BULK_SYNC_BATCH_SIZE,
+        'use_copy': bool(bulk_config.get('use_copy', True)),
+        'defer_indexes': bool(bulk_config.get('defer_indexes', False))
+    }
+
+
+def get_sync_workers(config):
+    """
+    Given a configuration dict, determine how many groups of a feed to sync concurrently.
+
+    :param config:
+    :return: int number of worker threads, 1 for sequential syncs
+    """
+    try:
+        workers = int(get_feeds_config(config).get('sync_workers', DEFAULT_SYNC_WORKERS))
+    except (TypeError, ValueError):
+        log.warn('Invalid feeds sync_workers in config, using default {}'.format(DEFAULT_SYNC_WORKERS))
+        workers = DEFAULT_SYNC_WORKERS
+
+    return max(workers, 1)
+
+
+def get_sync_prefetch_chunks(config):
+    """
+    Given a configuration dict, determine how many chunks of group data to fetch from the feed service ahead of the db writes.
+
+    :param config:
+    :return: int number of chunks, 0 to fetch and write in turn
+    """
+    try:
+        chunks = int(get_feeds_config(config).get('sync_prefetch_chunks', DEFAULT_SYNC_PREFETCH_CHUNKS))
+    except (TypeError, ValueError):
+        log.warn('Invalid feeds sync_prefetch_chunks in config, using default {}'.format(DEFAULT_SYNC_PREFETCH_CHUNKS))
+        chunks = DEFAULT_SYNC_PREFETCH_CHUNKS
+
+    return max(chunks, 0)
+
+
+def prefetch(iterable, depth=1):
+    """
+    Iterate over the iterable with its items produced in a background thread, up to depth items ahead of the consumer, so that
+    producing the next items (e.g. fetching feed pages over http) overlaps with processing the current one (e.g. db writes).
+    Exceptions raised by the iterable are re-raised to the consumer.
+
+    :param iterable:
+    :param depth: max number of items buffered ahead, 0 to iterate in the calling thread
+    :return: generator
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+
+    buffered = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+    end = object()
+
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                buffered.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((None, e))
+
+    producer = threading.Thread(target=produce, name='feed_prefetch', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffered.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        # Unblocks and stops the producer if the consumer stopped early
+        stopped.set()
+
+
 def get_selected_feeds_to_sync(config):
     """
     Given a configuration dict, determine which feeds should be synced.
@@ -78,11 +214,24 @@ class FeedDataMapper(object):
     Base interface for mapping feed records into the db
     """
 
+    # Included in content digests, increment when a mapping changes so that records stored with an older mapping are not skipped as unchanged
+    digest_version = 1
+
     def __init__(self, feed_name, group_name, keyname):
         self.feed = feed_name
         self.group = group_name
         self.key_item_name = keyname
 
+    def content_digest(self, record_json):
+        """
+        Digest of the normalized record json along with the group it is mapped into, to detect records re-sent unchanged by the feed service.
+
+        :param record_json: data record deserialized from json (dict)
+        :return: str digest of the form 'sha256:<hex>'
+        """
+        normalized = json.dumps([self.digest_version, self.group, record_json], sort_keys=True, separators=(',', ':'))
+        return 'sha256:' + hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
     def map(self, record_json):
         """
         Map a single data feed record from msg to db format
@@ -277,6 +426,7 @@ class SnykFeedDataMapper(FeedDataMapper):
         # primary keys
         db_rec.namespace_name = self.group
         db_rec.id = id
+        db_rec.content_digest = self.content_digest(record_json)
 
         # severity calculation
         db_rec.cvss2_score = pkgvuln.get('cvssScore')
@@ -367,6 +517,7 @@ class VulnerabilityFeedDataMapper(FeedDataMapper):
         db_rec = Vulnerability()
         db_rec.id = vuln['Name']
         db_rec.namespace_name = self.group
+        db_rec.content_digest = self.content_digest(vuln)
         db_rec.severity = vuln.get('Severity', 'Unknown')
         db_rec.link = vuln.get('Link')
         description = vuln.get("Description", "")
@@ -392,6 +543,7 @@ class VulnerabilityFeedDataMapper(FeedDataMapper):
                 fix.version = f['Version']
                 fix.version_format = f['VersionFormat']
                 fix.epochless_version = re.sub(r'^[0-9]*:', '', f['Version'])
+                fix.version_key = package_version_key(version_key_flavors.get(fix.version_format), fix.name, fix.epochless_version)
                 fix.vulnerability_id = db_rec.id
                 fix.namespace_name = self.group
                 fix.vendor_no_advisory = f.get('VendorAdvisory', {}).get('NoAdvisory', False)
@@ -593,8 +745,6 @@ class AnchoreServiceFeed(DataFeed):
     __source_cls__ = AnchoreFeedServiceClient
     __group_data_mappers__ = GenericFeedDataMapper
 
-    MAX_FEED_SYNC_PAGES = 4 # Number of pages of data (~5mb each) to process at a time during feed sync to keep memory usage reasonable
-
     def __init__(self, metadata=None, src=None):
         if not metadata:
             db = get_session()
@@ -731,76 +881,204 @@ class AnchoreServiceFeed(DataFeed):
         """
         return item.__hash__()
 
-    def _get_deduped_data(self, group_obj, since=None, next_token=None, max_pages=None):
+    def _get_deduped_data(self, group_obj, since=None, chunk_size=None, dedup_all=False, replaced=None):
         """
-        Fetch data and deduplicate items in-line. Still requires buffering of entire data set in memory,
-        but only the deduped data set, so usage is minimal.
+        Fetch, map, and deduplicate group data in-line, yielding the mapped objects in chunks so that memory use is bounded by the
+        chunk size and the source page size rather than the size of the group.
+
+        Items are always deduplicated within a chunk, with the last occurrence kept. If dedup_all is set, items are deduplicated across
+        the whole group by keeping a set of the keys already yielded, as required for inserts. The latest occurrence of an item repeated
+        after its key was yielded is put in the replaced dict instead, for the caller to apply over the earlier one once all chunks are
+        consumed. Merges can take repeated items in later chunks, which then update the earlier ones.
 
         Returns mapped objects, not raw json dicts. Objects mapped using the class's defined mapper
 
         :param group_obj:
-        :return:
+        :param since:
+        :param chunk_size: max number of mapped objects per chunk, defaults to the configured feeds sync_chunk_size
+        :param dedup_all: deduplicate across the whole group instead of within a chunk only
+        :param replaced: dict to collect item key -> latest occurrence of items repeated in later chunks, required with dedup_all
+        :return: generator of lists of mapped objects
         """
+        if dedup_all and replaced is None:
+            raise ValueError('A replaced dict is required to deduplicate across the group')
+
         mapper = self._load_mapper(group_obj)
-        new_data = True
+        if not chunk_size:
+            chunk_size = get_sync_chunk_size(localconfig.get_config())
+
+        seen_keys = set() if dedup_all else None
+        chunk = OrderedDict()  # Dedup by item key
+
+        # The next page is fetched while the current one is mapped
+        for new_data in prefetch(self._get_pages(group_obj, since=since), depth=1):
+            for x in new_data:
+                mapped = mapper.map(x)
+                if not mapped:
+                    continue
+
+                key = self._dedup_data_key(mapped)
+                if seen_keys is not None and key in seen_keys:
+                    replaced[key] = mapped
+                    continue
+
+                chunk[key] = mapped
+                if len(chunk) >= chunk_size:
+                    if seen_keys is not None:
+                        seen_keys.update(chunk.keys())
+                    yield list(chunk.values())
+                    chunk = OrderedDict()
+
+            new_data = None
+
+        if chunk:
+            yield list(chunk.values())
+
+    def _get_pages(self, group_obj, since=None):
+        """
+        Fetch the raw group data from the source page by page.
+
+        :param group_obj:
+        :param since:
+        :return: generator of lists of data records (json dicts)
+        """
+        next_token = None
         pages = 0
-        new_data_deduped = {}  # Dedup by item key
-        while (new_data or next_token) and (max_pages is None or pages <= max_pages):
+        while True:
             new_data, next_token = self.source.get_paged_feed_group_data(self.__feed_name__, group_obj.name,
                                                                          since=since,
                                                                          next_token=next_token)
             pages += 1
-            for x in new_data:
-                mapped = mapper.map(x)
-                if mapped:
-                    new_data_deduped[self._dedup_data_key(mapped)] = mapped
+            log.debug('Page = {}, next_token = {}'.format(pages, bool(next_token)))
+            get_sync_status().page_fetched(self.__feed_name__, group_obj.name, len(new_data) if new_data else 0)
+            yield new_data
 
-            new_data = None
-            log.debug('Page = {}, new_data = {}, next_token = {}'.format(pages, bool(new_data), bool(next_token), max_pages))
+            if not next_token:
+                break
+
+    def _get_prefetched_data(self, group_obj, **kwargs):
+        """
+        Same as _get_deduped_data() but with the data fetched from the source and mapped in a background thread, ahead of the
+        caller by the configured feeds sync_prefetch_chunks.
+
+        """
+        return prefetch(self._get_deduped_data(group_obj, **kwargs), depth=get_sync_prefetch_chunks(localconfig.get_config()))
+
+    def _sync_groups(self, group_names, sync_fn):
+        """
+        Sync the named groups with sync_fn, either one after another or, if feeds sync_workers is more than 1, concurrently.
+
+        Every group is already synced in its own transaction, so concurrent workers each get their own session along with their own
+        instance of this feed, so that neither the sessions nor the feed source clients are shared between threads.
+
+        :param group_names: list of group names to sync
+        :param sync_fn: function taking (feed, group_obj) to sync a single group, where feed is this feed or a worker's instance of it
+        :return: dict mapping group name -> sync_fn result for the groups that synced successfully
+        """
+        results = {}
+        workers = min(get_sync_workers(localconfig.get_config()), len(group_names))
+
+        status = get_sync_status()
+        status.groups_queued(self.__feed_name__, group_names)
+
+        def tracked_sync_fn(feed, group_obj):
+            status.group_started(feed.__feed_name__, group_obj.name)
+            try:
+                result = sync_fn(feed, group_obj)
+            except Exception:
+                status.group_finished(feed.__feed_name__, group_obj.name, success=False)
+                raise
+            status.group_finished(feed.__feed_name__, group_obj.name, success=True)
+            return result
+
+        if workers <= 1:
+            for group_name in group_names:
+                try:
+                    results[group_name] = tracked_sync_fn(self, self.group_by_name(group_name)[0])
+                except Exception as e:
+                    log.exception('Failed syncing group data for {}/{}'.format(self.__feed_name__, group_name))
+            return results
+
+        source = self.source if not isinstance(self.source, self.__source_cls__) else None
+
+        def run(group_name):
+            try:
+                feed = self.__class__(src=source)
+                return tracked_sync_fn(feed, feed.group_by_name(group_name)[0])
+            finally:
+                end_session()
 
-        data = list(new_data_deduped.values())
-        new_data_deduped = None
-        return data, next_token
+        log.info('Syncing {} groups of feed {} with {} workers'.format(len(group_names), self.__feed_name__, workers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {group_name: executor.submit(run, group_name) for group_name in group_names}
+
+        for group_name, future in futures.items():
+            try:
+                results[group_name] = future.result()
+            except Exception as e:
+                log.exception('Failed syncing group data for {}/{}'.format(self.__feed_name__, group_name))
+
+        # The groups were updated in the workers' sessions, so reload this session's copies before they are used again
+        get_session().expire_all()
+
+        return results
 
     def _bulk_sync_group(self, group_obj):
         """
-        Performs a bulk sync of a single group.
+        Performs a bulk sync of a single group. Records are written as rows in batches by a BulkLoader rather than through
+        the session's unit of work, so the group's data must not exist yet.
 
         :param group_obj:
         :return: number of records inserted
         """
 
-        fetch_time = time.time()
-        new_data_deduped, next_token = self._get_deduped_data(group_obj)
-        fetch_time = time.time() - fetch_time
-        log.info('Group data fetch took {} sec'.format(fetch_time))
-
-        log.info('Adding {} records from group {}'.format(len(new_data_deduped), group_obj.name))
-        db_time = time.time()
+        sync_time = time.time()
+        count = 0
         db = get_session()
+        bulk_config = get_bulk_sync_config(localconfig.get_config())
+        loader = BulkLoader(db, batch_size=bulk_config['batch_size'], use_copy=bulk_config['use_copy'])
         try:
-            for i in new_data_deduped:
-                db.add(i)
+            replaced = OrderedDict()
+            for chunk in self._get_prefetched_data(group_obj, dedup_all=True, replaced=replaced):
+                db_time = time.time()
+                loader.add_all(chunk)
+                count += len(chunk)
+                get_sync_status().records_merged(self.__feed_name__, group_obj.name, len(chunk), time.time() - db_time)
+                log.debug('Added {} records from group {}'.format(count, group_obj.name))
+            loader.flush()
+
+            # Records the source sent again after their first occurrence was written replace it, so the latest occurrence is kept
+            if replaced:
+                log.info('Replacing {} records repeated later in group {}'.format(len(replaced), group_obj.name))
+                for rec in replaced.values():
+                    db.merge(rec)
+                db.flush()
 
             # Data complete, update the timestamp
             group_obj.last_sync = datetime.datetime.utcnow()
             db.add(group_obj)
             db.commit()
-            return len(new_data_deduped)
+            DistroNamespace.vulnerability_namespaces.invalidate()
+            log.info('Added {} records from group {}'.format(count, group_obj.name))
+            return count
         except Exception as e:
             log.exception('Error syncing group: {}'.format(group_obj))
             db.rollback()
             raise
         finally:
-            db_time = time.time() - db_time
-            log.info('Sync db time took {} sec'.format(db_time))
+            sync_time = time.time() - sync_time
+            rows = loader.total_rows()
+            rate = rows / sync_time if sync_time > 0 else 0.0
+            log.info('Bulk sync of group {} wrote {} rows ({}) in {} sec, db write time {} sec, {:.1f} rows/sec'.format(group_obj.name, rows, loader.row_counts, sync_time, loader.write_time, rate))
+            anchore_engine.subsys.metrics.gauge_set('anchore_feed_bulk_sync_rows_per_second', rate, feed=self.__feed_name__, group=group_obj.name)
 
-    def _sync_group(self, group_obj, full_flush=False):
+    def _sync_group(self, group_obj, full_flush=False, page_processing_fn=None):
         """
         Sync data from a single group and return the data. This operation is scoped to a transaction on the db.
 
         :param group_obj:
-        :return:
+        :param page_processing_fn: optional callback taking (db, list of merged records) invoked once per chunk within the transaction, returning a list of affected (user_id, image_id) tuples
+        :return: set of (user_id, image_id) tuples returned by page_processing_fn
         """
         sync_time = time.time()
         updated_images = set()
@@ -811,23 +1089,20 @@ class AnchoreServiceFeed(DataFeed):
             last_sync = group_obj.last_sync
 
         try:
-            next_token = ''
-            while next_token is not None:
-                if next_token == '':
-                    next_token = None
-                fetch_time = time.time()
-
-                new_data_deduped, next_token = self._get_deduped_data(group_obj, since=last_sync, next_token=next_token, max_pages=self.MAX_FEED_SYNC_PAGES)
-                fetch_time = time.time() - fetch_time
-                log.info('Group data fetch took {} sec'.format(fetch_time))
+            for new_data_deduped in self._get_prefetched_data(group_obj, since=last_sync):
                 log.info('Merging {} records from group {}'.format(len(new_data_deduped), group_obj.name))
                 db_time = time.time()
+                merged_records = []
                 for rec in new_data_deduped:
-                    merged = db.merge(rec)
-                    #db.add(merged)
+                    merged_records.append(db.merge(rec))
                 db.flush()
+                get_sync_status().records_merged(self.__feed_name__, group_obj.name, len(new_data_deduped), time.time() - db_time)
                 log.info('Db merge took {} sec'.format(time.time() - db_time))
 
+                if page_processing_fn and merged_records:
+                    updated_images = updated_images.union(set(page_processing_fn(db, merged_records)))
+                    db.flush()
+
             group_obj.last_sync = datetime.datetime.utcnow()
             db.add(group_obj)
             db.commit()
@@ -883,15 +1158,20 @@ class AnchoreServiceFeed(DataFeed):
             raise
 
         updated_records = {}
+        status = get_sync_status()
+        status.groups_queued(self.__feed_name__, [g.name for g in self.metadata.groups if not group or g.name == group])
 
         # Each group update is a unique session and can roll itself back.
         for g in self.metadata.groups:
             log.info('Processing group for bulk sync: {}'.format(g.name))
             if not group or g.name == group:
+                status.group_started(self.__feed_name__, g.name)
                 try:
                     inserted_count = self._bulk_sync_group(g)
                     updated_records[g.name] = inserted_count
+                    status.group_finished(self.__feed_name__, g.name, success=True)
                 except Exception as e:
+                    status.group_finished(self.__feed_name__, g.name, success=False)
                     log.exception('Failed bulk syncing group data for {}/{}'.format(self.__feed_name__, g.name))
                     raise e
             else:
@@ -923,7 +1203,7 @@ class AnchoreServiceFeed(DataFeed):
                 db_session.rollback()
             raise
 
-    def sync(self, group=None, item_processing_fn=None, full_flush=False, flush_helper_fn=None):
+    def sync(self, group=None, item_processing_fn=None, full_flush=False, flush_helper_fn=None, page_processing_fn=None):
         """
         Sync data with the feed source. This may be *very* slow if there are lots of updates.
 
@@ -935,6 +1215,7 @@ class AnchoreServiceFeed(DataFeed):
         }
 
         :param: group: The group to sync, optionally. If not specified, all groups are synced.
+        :param: page_processing_fn: optional callback invoked with each chunk of merged records, see _sync_group()
         :return: changed data updated in the sync as a list of records        
         """
 
@@ -952,23 +1233,24 @@ class AnchoreServiceFeed(DataFeed):
             db.rollback()
             raise
 
-        updated_records = {}
-        # Each group update is a unique session and can roll itself back.
-        for g in self.metadata.groups:
+        def sync_group(feed, g):
             log.info('Processing group: {}'.format(g.name))
-            if not group or g.name == group:
-                if full_flush:
-                    log.info('Performing group data flush prior to sync')
-                    self._flush_group(g, flush_helper_fn)
+            if full_flush:
+                log.info('Performing group data flush prior to sync')
+                feed._flush_group(g, flush_helper_fn)
 
-                try:
-                    new_data = self._sync_group(g, full_flush=full_flush)  # Each group sync is a transaction
-                    updated_records[g.name] = new_data
-                except Exception as e:
-                    log.exception('Failed syncing group data for {}/{}'.format(self.__feed_name__, g.name))
+            return feed._sync_group(g, full_flush=full_flush, page_processing_fn=page_processing_fn)  # Each group sync is a transaction
+
+        group_names = []
+        for g in self.metadata.groups:
+            if not group or g.name == group:
+                group_names.append(g.name)
             else:
                 log.info('Skipping group {} since not selected'.format(g))
 
+        # Each group update is a unique session and can roll itself back.
+        updated_records = self._sync_groups(group_names, sync_group)
+
         db = get_session()
         try:
             # Update timestamps
@@ -1031,54 +1313,127 @@ class VulnerabilityFeed(AnchoreServiceFeed):
     def _dedup_data_key(self, item):
         return item.id
 
-    def _sync_group(self, group_obj, vulnerability_processing_fn=None, full_flush=False):
+    def _sync_group(self, group_obj, vulnerability_processing_fn=None, full_flush=False, page_processing_fn=None):
         """
         Sync data from a single group and return the data. The vulnerability_processing_fn callback is invoked for each item within the transaction scope.
+        If page_processing_fn is provided it is used instead, invoked once per chunk of fetched records with the list of items that need an image match update.
 
         :param group_obj: the group object to sync
         :param bulk_load: should the load be done in bulk fashion, typically this is only for first run as it bypasses all per-item processing
+        :param page_processing_fn: callback taking (db, list of merged vulnerabilities) and returning a list of affected (user_id, image_id) tuples
         :return:
         """
         sync_time = time.time()
         updated_images = set() # A set
+        synced_vulnerability_ids = set()
         db = get_session()
+        committed = False
 
         if full_flush:
             last_sync = None
         else:
             last_sync = group_obj.last_sync
 
+        unchanged_count = 0
+
         try:
-            next_token = ''
-            while next_token is not None:
-                if next_token == '':
-                    next_token = None
-                fetch_time = time.time()
-                new_data_deduped, next_token = self._get_deduped_data(group_obj, since=last_sync, next_token=next_token, max_pages=self.MAX_FEED_SYNC_PAGES)
-                fetch_time = time.time() - fetch_time
-                log.debug('Group data fetch took {} sec'.format(fetch_time))
-                log.debug('Merging {} records from group {}'.format(len(new_data_deduped), group_obj.name))
+            for chunk in self._get_prefetched_data(group_obj, since=last_sync):
                 db_time = time.time()
-                for rec in new_data_deduped:
-                    # Make any updates and changes within this single transaction scope
-                    updated_image_ids = self.update_vulnerability(db, rec, vulnerability_processing_fn=vulnerability_processing_fn)
-                    updated_images = updated_images.union(set(updated_image_ids))  # Record after commit to ensure in-sync.
+                new_data_deduped, existing_ids = self._skip_unchanged(db, group_obj.name, chunk)
+                unchanged_count += len(chunk) - len(new_data_deduped)
+                log.debug('Merging {} changed records from group {}'.format(len(new_data_deduped), group_obj.name))
+
+                if page_processing_fn:
+                    changed = []
+                    for rec in new_data_deduped:
+                        synced_vulnerability_ids.add(rec.id)
+                        merged, needs_update = self._merge_vulnerability(db, rec, exists=rec.id in existing_ids)
+                        if needs_update:
+                            changed.append(merged)
                     db.flush()
+                    get_sync_status().records_merged(self.__feed_name__, group_obj.name, len(chunk), time.time() - db_time)
+
+                    if changed:
+                        updated_images = updated_images.union(set(page_processing_fn(db, changed)))
+                        db.flush()
+                else:
+                    # The match updates are interleaved with the merges, and reported by the callback, so only the merges are timed here
+                    merge_time = time.time() - db_time
+                    for rec in new_data_deduped:
+                        synced_vulnerability_ids.add(rec.id)
+                        # Make any updates and changes within this single transaction scope
+                        merge_start = time.time()
+                        merged, needs_update = self._merge_vulnerability(db, rec, exists=rec.id in existing_ids)
+                        db.flush()
+                        merge_time += time.time() - merge_start
+
+                        if vulnerability_processing_fn and needs_update:
+                            updated_image_ids = vulnerability_processing_fn(db, merged)
+                            updated_images = updated_images.union(set(updated_image_ids))  # Record after commit to ensure in-sync.
+                            db.flush()
+                        else:
+                            log.debug('Skipping image processing due to no diff: {}'.format(merged))
+                    get_sync_status().records_merged(self.__feed_name__, group_obj.name, len(chunk), merge_time)
                 log.debug('Db merge took {} sec'.format(time.time() - db_time))
 
+            if unchanged_count:
+                log.info('Skipped {} unchanged records in group {}'.format(unchanged_count, group_obj.name))
+                anchore_engine.subsys.metrics.counter_inc('anchore_feed_unchanged_records_total', unchanged_count, feed=self.__feed_name__, group=group_obj.name)
+
             group_obj.last_sync = datetime.datetime.utcnow()
             db.add(group_obj)
             db.commit()
+            committed = True
         except Exception as e:
             log.exception('Error syncing group: {}'.format(group_obj))
             db.rollback()
+            discard_stale_summaries(db)
             raise
         finally:
+            # Matches cached against this group's data may be stale whether the sync committed or partially failed
+            match_cache.invalidate_namespace(group_obj.name)
+            DistroNamespace.vulnerability_namespaces.invalidate()
+            self._update_fix_index(db, group_obj.name, synced_vulnerability_ids, incremental=committed and not full_flush)
             sync_time = time.time() - sync_time
             log.info('Syncing group took {} sec'.format(sync_time))
 
+        # The match updates only marked the summaries of the affected images stale, recompute each once now the matches are committed
+        try:
+            summary_time = time.time()
+            count = update_stale_summaries(db)
+            log.info('Updated vulnerability summaries of {} images after syncing group {} in {} sec'.format(count, group_obj.name, time.time() - summary_time))
+        except Exception as e:
+            log.exception('Error updating vulnerability summaries after syncing group: {}'.format(group_obj.name))
+            db.rollback()
+
         return updated_images
 
+    @staticmethod
+    def _update_fix_index(db, group_name, vulnerability_ids, incremental=True):
+        """
+        Bring the in-memory fix index, if enabled, in line with the group data after a sync. Only the fixes of the synced vulnerabilities
+        are reloaded for an incremental update, otherwise the group's index is dropped and reloaded on next use.
+
+        :param db: the db session used for the sync
+        :param group_name:
+        :param vulnerability_ids: ids of the vulnerability records merged by the sync
+        :param incremental: False if the sync failed or replaced all the group data
+        :return:
+        """
+        index = fix_index.get_fix_index()
+        if index is None:
+            return
+
+        try:
+            if incremental:
+                last_sync = db.query(FeedGroupMetadata.last_sync).filter(FeedGroupMetadata.name == group_name).scalar()
+                index.refresh_vulnerabilities(db, group_name, vulnerability_ids, last_sync=last_sync)
+            else:
+                index.drop_namespace(group_name)
+        except Exception as e:
+            log.exception('Error updating the in-memory fix index for group {}, dropping it to force a reload'.format(group_name))
+            index.drop_namespace(group_name)
+
     @staticmethod
     def _are_match_equivalent(vulnerability_a, vulnerability_b):
         """
@@ -1115,7 +1470,54 @@ class VulnerabilityFeed(AnchoreServiceFeed):
 
         return True
 
-    def update_vulnerability(self, db, vulnerability_record, vulnerability_processing_fn=None):
+    @staticmethod
+    def _skip_unchanged(db, group_name, vulnerability_records):
+        """
+        Drop the records whose content digest matches the one stored for the same record, fetching the stored digests for the whole
+        chunk of records in one query. Unchanged records need neither a merge nor an image match update.
+
+        :param db:
+        :param group_name:
+        :param vulnerability_records: list of mapped records from the feed source, all in the group
+        :return: tuple of (list of new or changed records, set of ids of the records already stored)
+        """
+        if not vulnerability_records:
+            return vulnerability_records, set()
+
+        stored_digests = dict(db.query(Vulnerability.id, Vulnerability.content_digest).filter(Vulnerability.namespace_name == group_name, Vulnerability.id.in_([x.id for x in vulnerability_records])))
+        changed = [x for x in vulnerability_records if x.content_digest is None or stored_digests.get(x.id) != x.content_digest]
+        return changed, set(stored_digests.keys())
+
+    def _merge_vulnerability(self, db, vulnerability_record, exists=None):
+        """
+        Merge a single vulnerability record from the feed source into the db session.
+
+        :param db:
+        :param vulnerability_record: the record from the feed source to merge
+        :param exists: whether the record is already stored, if known, to save the lookup of new records
+        :return: tuple of (merged record, True if the change requires an image match update)
+        """
+        if exists is False:
+            # Nothing to merge into, so just add it
+            db.add(vulnerability_record)
+            return vulnerability_record, True
+
+        try:
+            existing = db.query(Vulnerability).filter(Vulnerability.id == vulnerability_record.id, Vulnerability.namespace_name == vulnerability_record.namespace_name).one_or_none()
+        except:
+            log.debug('No current record found for {}'.format(vulnerability_record))
+            existing = None
+
+        if existing:
+            needs_update = not VulnerabilityFeed._are_match_equivalent(existing, vulnerability_record)
+            if needs_update:
+                log.debug('Found update that requires an image match update from {} to {}'.format(existing, vulnerability_record))
+        else:
+            needs_update = True
+
+        return db.merge(vulnerability_record), needs_update
+
+    def update_vulnerability(self, db, vulnerability_record, vulnerability_processing_fn=None, exists=None):
         """
         Processes a single vulnerability record. Specifically for vulnerabilities:
         Checks and updates any fixed-in or vulnerable-in records and given the final state of the vulneraability,
@@ -1124,25 +1526,12 @@ class VulnerabilityFeed(AnchoreServiceFeed):
 
         :param vulnerability_record: the record from the feed source to process and load into the db.
         :param vulnerability_processing_fn: a callback function to execute with the new date, but before any transaction commit
+        :param exists: whether the record is already stored, if known
         :return:
         """
         try:
             updates = []
-
-            try:
-                existing = db.query(Vulnerability).filter(Vulnerability.id == vulnerability_record.id, Vulnerability.namespace_name == vulnerability_record.namespace_name).one_or_none()
-            except:
-                log.debug('No current record found for {}'.format(vulnerability_record))
-                existing = None
-
-            if existing:
-                needs_update = not VulnerabilityFeed._are_match_equivalent(existing, vulnerability_record)
-                if needs_update:
-                    log.debug('Found update that requires an image match update from {} to {}'.format(existing, vulnerability_record))
-            else:
-                needs_update = True
-
-            merged = db.merge(vulnerability_record)
+            merged, needs_update = self._merge_vulnerability(db, vulnerability_record, exists=exists)
 
             if vulnerability_processing_fn and needs_update:
                 updates = vulnerability_processing_fn(db, merged)
@@ -1167,7 +1556,7 @@ class VulnerabilityFeed(AnchoreServiceFeed):
 
         db.flush()
 
-    def sync(self, group=None, item_processing_fn=None, full_flush=False, flush_helper_fn=None):
+    def sync(self, group=None, item_processing_fn=None, full_flush=False, flush_helper_fn=None, page_processing_fn=None):
         """
         Sync data with the feed source. This may be *very* slow if there are lots of updates.
 
@@ -1179,6 +1568,7 @@ class VulnerabilityFeed(AnchoreServiceFeed):
         }
 
         :param: group: The group to sync, optionally. If not specified, all groups are synced.
+        :param: page_processing_fn: per-page alternative to item_processing_fn, see _sync_group()
         :return: changed data updated in the sync as a list of records
         """
 
@@ -1199,24 +1589,31 @@ class VulnerabilityFeed(AnchoreServiceFeed):
         updated_records = {}
 
         # Setup the group name cache
-        feed_list_cache.vuln_group_list = [x.name for x in self.metadata.groups]
+        all_group_names = [x.name for x in self.metadata.groups]
+        feed_list_cache.vuln_group_list = all_group_names
+
+        def sync_group(feed, g):
+            # The cache is thread-local, so must also be set up in worker threads
+            feed_list_cache.vuln_group_list = all_group_names
+
+            log.info('Processing group: {}'.format(g.name))
+            if full_flush:
+                log.info('Performing group data flush prior to sync')
+                feed._flush_group(g, flush_helper_fn)
+
+            return feed._sync_group(g, vulnerability_processing_fn=item_processing_fn, full_flush=full_flush, page_processing_fn=page_processing_fn)
+
         try:
-            # Each group update is a unique session and can roll itself back.
+            group_names = []
             for g in self.metadata.groups:
-                log.info('Processing group: {}'.format(g.name))
                 if not group or g.name == group:
-                    if full_flush:
-                        log.info('Performing group data flush prior to sync')
-                        self._flush_group(g, flush_helper_fn)
-
-                    try:
-                        new_data = self._sync_group(g, vulnerability_processing_fn=item_processing_fn, full_flush=full_flush)
-                        updated_records[g.name] = new_data
-                    except Exception as e:
-                        log.exception('Failed syncing group data for {}/{}'.format(self.__feed_name__, g.name))
+                    group_names.append(g.name)
                 else:
                     log.info('Group not selected for sync: {}. Skipping.'.format(g.name))
 
+            # Each group update is a unique session and can roll itself back.
+            updated_records = self._sync_groups(group_names, sync_group)
+
             self._update_last_sync_timestamp()
             return updated_records
         finally:
@@ -1415,7 +1812,9 @@ class DataFeeds(object):
 
     def __init__(self):
         self.vuln_fn = None
+        self.vuln_page_fn = None
         self.vuln_flush_fn = None
+        self.nvd_page_fn = None
 
     @classmethod
     def instance(cls):
@@ -1493,6 +1892,14 @@ class DataFeeds(object):
         :return:
         """
 
+        status = get_sync_status()
+        status.sync_started('full_flush' if full_flush else 'incremental')
+        try:
+            return self._sync_feeds(to_sync, full_flush)
+        finally:
+            status.sync_finished()
+
+    def _sync_feeds(self, to_sync, full_flush):
         all_success = True
 
         updated_records = {}
@@ -1500,7 +1907,7 @@ class DataFeeds(object):
         if to_sync is None or 'vulnerabilities' in to_sync:
             try:
                 log.info('Syncing vulnerability feed')
-                updated_records['vulnerabilities'] = self.vulnerabilities.sync(item_processing_fn=self.vuln_fn, full_flush=full_flush, flush_helper_fn=self.vuln_flush_fn)
+                updated_records['vulnerabilities'] = self.vulnerabilities.sync(item_processing_fn=self.vuln_fn, full_flush=full_flush, flush_helper_fn=self.vuln_flush_fn, page_processing_fn=self.vuln_page_fn)
             except:
                 log.exception('Failure updating the vulnerabilities feed. Continuing with next feed')
                 all_success = False
@@ -1516,7 +1923,7 @@ class DataFeeds(object):
         if to_sync is None or 'nvd' in to_sync:
             try:
                 log.info('Syncing nvd feed')
-                updated_records['nvd'] = self.nvd.sync()
+                updated_records['nvd'] = self.nvd.sync(page_processing_fn=self.nvd_page_fn)
             except:
                 log.exception('Failure updating the nvd feed.')
                 all_success = False
@@ -1524,7 +1931,7 @@ class DataFeeds(object):
         if to_sync is None or 'snyk' in to_sync:
             try:
                 log.info('Syncing snyk feed')
-                updated_records['snyk'] = self.snyk.sync(item_processing_fn=self.vuln_fn, full_flush=full_flush, flush_helper_fn=self.vuln_flush_fn)
+                updated_records['snyk'] = self.snyk.sync(item_processing_fn=self.vuln_fn, full_flush=full_flush, flush_helper_fn=self.vuln_flush_fn, page_processing_fn=self.vuln_page_fn)
             except:
                 log.exception('Failure updating the snyk feed.')
                 all_success = False
@@ -1537,10 +1944,27 @@ class DataFeeds(object):
     def bulk_sync(self, to_sync=None, only_if_unsynced=True):
         """
         Sync all feeds using a bulk sync for each for performance, particularly on initial sync.
+
+        If feeds.bulk_sync.defer_indexes is set in the config, the secondary indexes of the feed data tables are dropped before
+        the syncs and rebuilt after.
+
         :param to_sync: list of feed names to sync, if None all feeds are synced
         :return:
         """
 
+        status = get_sync_status()
+        status.sync_started('bulk')
+        try:
+            if not get_bulk_sync_config(localconfig.get_config())['defer_indexes']:
+                return self._bulk_sync_feeds(to_sync, only_if_unsynced)
+
+            tables = [x.__table__ for x in [Vulnerability, FixedArtifact, NvdMetadata, CpeVulnerability, NpmMetadata, GemMetadata, GenericFeedDataRecord]]
+            with deferred_indexes(get_session(), tables):
+                return self._bulk_sync_feeds(to_sync, only_if_unsynced)
+        finally:
+            status.sync_finished()
+
+    def _bulk_sync_feeds(self, to_sync, only_if_unsynced):
         all_success = True
 
         updated_records = {}
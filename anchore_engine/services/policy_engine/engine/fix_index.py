@@ -0,0 +1,315 @@
+"""
+In-memory, per-namespace index of FixedArtifact records for the vulnerability matcher.
+
+When enabled, the fix records of a namespace are loaded into compact FixRecord objects the first time a package in that namespace
+is matched, indexed by package name. Version strings are parsed once per record and reused for every comparison after that. After a
+feed group sync commits, only the fix records of the vulnerabilities touched by the sync are reloaded. Indexes loaded under an older
+group last_sync timestamp than the one in the db (e.g. synced by another process) are dropped and reloaded lazily.
+
+Config: services.policy_engine.vulnerabilities.fix_index_enabled (default False)
+
+"""
+import sys
+import threading
+
+import anchore_engine.subsys.metrics
+from anchore_engine.configuration import localconfig
+from anchore_engine.db import FixedArtifact
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+from anchore_engine.util.apk import compare_versions as apkg_compare_versions
+from anchore_engine.util.deb import DpkgVersion
+from anchore_engine.util.rpm import split_rpm_filename, compare_labels
+from anchore_engine.util.semver import compare_versions as semver_compare_versions
+
+log = get_logger()
+
+# Max number of vulnerability ids in a single IN clause when reloading records incrementally
+REFRESH_BATCH_SIZE = 500
+
+_fix_columns = (FixedArtifact.vulnerability_id, FixedArtifact.namespace_name, FixedArtifact.name, FixedArtifact.version,
+                FixedArtifact.version_format, FixedArtifact.epochless_version, FixedArtifact.vendor_no_advisory, FixedArtifact.version_key)
+
+
+def parse_version(flavor, name, version):
+    """
+    Parse a version string into the form used for comparison by the given distro flavor.
+
+    :param flavor: distro flavor, e.g. RHEL, DEB, ALPINE
+    :param name: package name, needed for rpm filename-based parsing
+    :param version: version string to parse
+    :return: parsed version, or the version string itself if the flavor has no pre-parsed form
+    """
+    if flavor == 'RHEL':
+        n, v, r, e, a = split_rpm_filename(name + '-' + version + '.arch.rpm')
+        return ('1', v, r)
+    elif flavor == 'DEB':
+        return DpkgVersion.from_string(version)
+    else:
+        return version
+
+
+def is_older(flavor, package_version, fix_version):
+    """
+    Compare pre-parsed versions with the same semantics as the rpm/dpkg/apk compare_versions functions for a 'less than' check
+
+    :param flavor:
+    :param package_version: parsed package version, as returned by parse_version()
+    :param fix_version: parsed fix version, as returned by parse_version()
+    :return: True if package_version is older than fix_version
+    """
+    if flavor == 'RHEL':
+        return compare_labels(package_version, fix_version) < 0
+    elif flavor == 'DEB':
+        return package_version.__cmp__(fix_version) < 0
+    elif flavor == 'ALPINE':
+        return apkg_compare_versions(package_version, 'lt', fix_version)
+    else:
+        return False
+
+
+class FixRecord(object):
+    """
+    A compact, read-only representation of a FixedArtifact for in-memory matching.
+
+    """
+
+    __slots__ = ['vulnerability_id', 'namespace_name', 'name', 'version', 'version_format', 'epochless_version', 'vendor_no_advisory', 'version_key', '_parsed']
+
+    def __init__(self, vulnerability_id, namespace_name, name, version, version_format, epochless_version, vendor_no_advisory, version_key=None):
+        self.vulnerability_id = vulnerability_id
+        self.namespace_name = namespace_name
+        self.name = name
+        self.version = version
+        self.version_format = version_format
+        self.epochless_version = epochless_version
+        self.vendor_no_advisory = vendor_no_advisory
+        self.version_key = version_key
+        self._parsed = None
+
+    def parsed_version(self, flavor):
+        """
+        Returns the epochless version parsed for the given flavor. Parsed once and kept, so repeated comparisons are cheap.
+
+        :param flavor:
+        :return:
+        """
+        parsed = self._parsed
+        if parsed is None or parsed[0] != flavor:
+            # Single tuple assignment so concurrent readers never see a mismatched flavor/value pair
+            parsed = (flavor, parse_version(flavor, self.name, self.epochless_version))
+            self._parsed = parsed
+
+        return parsed[1]
+
+    def match_but_not_fixed(self, package_obj, package_version=None):
+        """
+        Same semantics as FixedArtifact.match_but_not_fixed(), using the pre-parsed versions.
+
+        :param package_obj: an ImagePackage record
+        :param package_version: the package's fullversion as returned by parse_version() for the package's flavor, parsed here if not provided
+        :return: True if the names match and the fix record indicates the package is vulnerable and not fixed.
+        """
+        flavor = package_obj.distro_namespace_meta.flavor
+
+        # Double-check names
+        if self.name != package_obj.name and self.name != package_obj.normalized_src_pkg:
+            log.warn('Name mismatch in fix check. This should not happen: Fix: {}, Package: {}, Package_Norm_Src: {}, Package_Src: {}'.format(self.name, package_obj.name, package_obj.normalized_src_pkg, package_obj.src_pkg))
+            return False
+
+        # Explicit 'None' versions indicate all versions of the named package are vulnerable.
+        if self.version == 'None':
+            return True
+
+        if flavor in ['RHEL', 'DEB', 'ALPINE']:
+            if package_version is None:
+                package_version = parse_version(flavor, package_obj.name, package_obj.fullversion)
+
+            if is_older(flavor, package_version, self.parsed_version(flavor)):
+                return True
+
+        if package_obj.pkg_type in ['java', 'maven', 'npm', 'gem', 'python', 'js']:
+            if package_obj.pkg_type in ['java', 'maven']:
+                pomprops = package_obj.get_pom_properties()
+                if pomprops:
+                    pkgversion = pomprops.get('version', None)
+                else:
+                    pkgversion = package_obj.version
+            else:
+                pkgversion = package_obj.fullversion
+
+            if semver_compare_versions(self.version, pkgversion, language=package_obj.pkg_type):
+                return True
+
+        # Newer or the same
+        return False
+
+    def size_of(self):
+        """
+        Approximate memory footprint of the record in bytes, including its string values
+        """
+        return sys.getsizeof(self) + sum([sys.getsizeof(getattr(self, x)) for x in ['vulnerability_id', 'name', 'version', 'version_format', 'epochless_version', 'version_key']])
+
+    def __repr__(self):
+        return '<FixRecord vulnerability_id={}, namespace_name={}, name={}, version={}>'.format(self.vulnerability_id, self.namespace_name, self.name, self.version)
+
+
+class NamespaceFixIndex(object):
+    """
+    Fix records for a single namespace, indexed by package name
+
+    """
+
+    def __init__(self, namespace_name, last_sync=None):
+        self.namespace_name = namespace_name
+        self.last_sync = last_sync
+        self.by_name = {}
+
+    def add(self, record):
+        self.by_name.setdefault(record.name, []).append(record)
+
+    def remove_vulnerabilities(self, vulnerability_ids):
+        """
+        Remove all records for the given vulnerability ids
+
+        :param vulnerability_ids: set of vulnerability id strings
+        """
+        for name in list(self.by_name.keys()):
+            remaining = [x for x in self.by_name[name] if x.vulnerability_id not in vulnerability_ids]
+            if remaining:
+                self.by_name[name] = remaining
+            else:
+                self.by_name.pop(name)
+
+    def get(self, name):
+        return self.by_name.get(name, [])
+
+    def record_count(self):
+        return sum([len(x) for x in self.by_name.values()])
+
+    def memory_usage(self):
+        """
+        Approximate memory usage of the index in bytes
+        """
+        total = sys.getsizeof(self.by_name)
+        for name, records in self.by_name.items():
+            total += sys.getsizeof(name) + sys.getsizeof(records)
+            for r in records:
+                total += r.size_of()
+        return total
+
+
+class FixIndex(object):
+    """
+    Process-wide container of per-namespace fix indexes. Namespaces are loaded lazily on first use.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._namespaces = {}
+
+    def _load(self, db, namespace_name, last_sync):
+        idx = NamespaceFixIndex(namespace_name, last_sync=last_sync)
+        for row in db.query(*_fix_columns).filter(FixedArtifact.namespace_name == namespace_name):
+            idx.add(FixRecord(*row))
+
+        log.info('Loaded {} fix records into in-memory index for namespace {}'.format(idx.record_count(), namespace_name))
+        self._report(idx)
+        return idx
+
+    def _report(self, idx):
+        anchore_engine.subsys.metrics.gauge_set('anchore_vulnerability_fix_index_bytes', idx.memory_usage(), namespace=idx.namespace_name)
+        anchore_engine.subsys.metrics.gauge_set('anchore_vulnerability_fix_index_records', idx.record_count(), namespace=idx.namespace_name)
+
+    def get_namespace(self, db, namespace_name, last_sync=None):
+        """
+        Returns the index for the namespace, loading it if not present or if it was built under a different group sync timestamp
+
+        :param db: db session to use for loading
+        :param namespace_name:
+        :param last_sync: the current last_sync of the namespace's feed group, if known
+        :return: NamespaceFixIndex
+        """
+        with self._lock:
+            idx = self._namespaces.get(namespace_name)
+            if idx is None or idx.last_sync != last_sync:
+                idx = self._load(db, namespace_name, last_sync)
+                self._namespaces[namespace_name] = idx
+
+            return idx
+
+    def refresh_vulnerabilities(self, db, namespace_name, vulnerability_ids, last_sync=None):
+        """
+        Incrementally update a loaded namespace index by reloading the fix records for the given vulnerabilities. No-op if the
+        namespace is not loaded, it will be loaded on next use.
+
+        :param db: db session to use
+        :param namespace_name:
+        :param vulnerability_ids: ids of the vulnerabilities that were added, changed or removed
+        :param last_sync: the new last_sync of the group
+        """
+        with self._lock:
+            idx = self._namespaces.get(namespace_name)
+            if idx is None:
+                return
+
+            vulnerability_ids = list(set(vulnerability_ids))
+            idx.remove_vulnerabilities(set(vulnerability_ids))
+            for i in range(0, len(vulnerability_ids), REFRESH_BATCH_SIZE):
+                chunk = vulnerability_ids[i:i + REFRESH_BATCH_SIZE]
+                for row in db.query(*_fix_columns).filter(FixedArtifact.namespace_name == namespace_name, FixedArtifact.vulnerability_id.in_(chunk)):
+                    idx.add(FixRecord(*row))
+
+            idx.last_sync = last_sync
+            log.info('Refreshed {} vulnerabilities in in-memory fix index for namespace {}'.format(len(vulnerability_ids), namespace_name))
+            self._report(idx)
+
+    def drop_namespace(self, namespace_name):
+        with self._lock:
+            self._namespaces.pop(namespace_name, None)
+
+    def flush(self):
+        with self._lock:
+            self._namespaces.clear()
+
+    def memory_usage(self):
+        """
+        Approximate memory usage, in bytes, of each loaded namespace index
+
+        :return: dict of namespace_name -> bytes
+        """
+        with self._lock:
+            return {name: idx.memory_usage() for name, idx in self._namespaces.items()}
+
+
+_index = None
+_enabled = None
+
+
+def is_enabled():
+    global _enabled
+
+    if _enabled is None:
+        try:
+            config = localconfig.get_config()
+            _enabled = bool(config.get('services', {}).get('policy_engine', {}).get('vulnerabilities', {}).get('fix_index_enabled', False))
+        except Exception as e:
+            log.warn('Could not read fix index config, disabling in-memory fix index. Error: {}'.format(e))
+            _enabled = False
+
+    return _enabled
+
+
+def get_fix_index():
+    """
+    Returns the process-wide fix index, or None if it is not enabled in the config
+    """
+    global _index
+
+    if not is_enabled():
+        return None
+
+    if _index is None:
+        _index = FixIndex()
+
+    return _index
@@ -8,6 +8,7 @@ from anchore_engine.db import DistroNamespace
 from anchore_engine.db import Image, ImagePackage, FilesystemAnalysis, ImageNpm, ImageGem, AnalysisArtifact, ImagePackageManifestEntry, ImageCpe#, ImageJava, ImagePython
 from .logs import get_logger
 from anchore_engine.util.rpm import split_rpm_filename
+from anchore_engine.util.packages import package_version_key
 
 log = get_logger()
 
@@ -402,6 +403,8 @@ class ImageLoader(object):
             else:
                 p.fullversion = p.version
 
+            p.version_key = package_version_key(img_distro.flavor, p.name, p.fullversion)
+
             if img_distro.flavor == 'DEB':
                 cleanvers = re.sub(re.escape("+b") + "\d+.*", "", p.version)
                 spkg = re.sub(re.escape("-" + cleanvers), "", p.src_pkg)
@@ -426,6 +429,7 @@ class ImageLoader(object):
             p.name = pkg_name
             p.version = version
             p.fullversion = all_pkgs_src[pkg_name]
+            p.version_key = package_version_key(img_distro.flavor, p.name, p.fullversion)
 
             if img_distro.flavor == 'RHEL':
                 name, parsed_version, release, epoch, arch = split_rpm_filename(
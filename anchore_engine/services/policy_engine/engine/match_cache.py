@@ -0,0 +1,236 @@
+"""
+Process-wide cache of package -> vulnerability matches.
+
+Many images share the same base layers and therefore the same package versions, so the result of matching a given package
+version against the vulnerability data of a namespace can be reused across images until that namespace's feed data changes.
+
+Entries are keyed by the package identity relevant to matching and hold the primary keys of the matched FixedArtifact records.
+A namespace's entries are dropped when a sync of that feed group commits in this process, and also when the group's last_sync
+timestamp in the db differs from the one the entries were computed under, which covers syncs done by other processes.
+
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+import anchore_engine.subsys.metrics
+from anchore_engine.configuration import localconfig
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+
+log = get_logger()
+
+DEFAULT_MAX_ENTRIES = 100000
+
+# Lightweight record of a matched FixedArtifact, enough to build an ImagePackageVulnerability or re-load the fix record
+MatchedFix = namedtuple('MatchedFix', ['vulnerability_id', 'namespace_name', 'name', 'version'])
+
+MatchKey = namedtuple('MatchKey', ['namespace_name', 'name', 'normalized_src_pkg', 'version', 'fullversion', 'pkg_type', 'flavor', 'semver_key', 'semver_namespace_pattern'])
+
+
+def match_key(package_obj, namespace_name, flavor, semver_key=None, semver_version=None, semver_namespace_pattern=None):
+    """
+    Build the cache key for the package as matched against the given namespace.
+
+    :param package_obj: ImagePackage object
+    :param namespace_name: the resolved namespace name used for os package matching
+    :param flavor: the distro flavor used for version comparison
+    :param semver_key: the key used for semver matching, if any (e.g. groupId:artifactId for java)
+    :param semver_version: the version used for semver matching, if any
+    :param semver_namespace_pattern: the namespace like-pattern used for semver matching, if any
+    :return: MatchKey tuple
+    """
+    return MatchKey(namespace_name=namespace_name,
+                    name=package_obj.name,
+                    normalized_src_pkg=package_obj.normalized_src_pkg,
+                    version=package_obj.version,
+                    fullversion=package_obj.fullversion,
+                    pkg_type=package_obj.pkg_type,
+                    flavor=flavor,
+                    semver_key=(semver_key, semver_version) if semver_key else None,
+                    semver_namespace_pattern=semver_namespace_pattern)
+
+
+def _pattern_matches(pattern, namespace_name):
+    """
+    Evaluates a simple sql like-pattern of the form '%value%' against the namespace name
+
+    """
+    return pattern.strip('%') in namespace_name
+
+
+class PackageMatchCache(object):
+    """
+    A thread-safe, size-bounded LRU mapping MatchKey -> tuple of MatchedFix records.
+
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._keys_by_namespace = {}
+        self._keys_by_pattern = {}
+        self._group_stamps = {}
+
+    def lookup(self, key):
+        """
+        Returns the cached matches for the key or None if not found. A cached empty match set is returned as an empty tuple.
+
+        :param key: MatchKey
+        :return: tuple of MatchedFix or None
+        """
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return found
+
+    def cache_it(self, key, matches):
+        """
+        Cache the match result for the key, evicting least-recently-used entries if the cache is full.
+
+        :param key: MatchKey
+        :param matches: iterable of MatchedFix
+        """
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                self._keys_by_namespace.setdefault(key.namespace_name, set()).add(key)
+                if key.semver_namespace_pattern:
+                    self._keys_by_pattern.setdefault(key.semver_namespace_pattern, set()).add(key)
+
+            self._entries[key] = tuple(matches)
+
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._unindex(evicted)
+
+    def _unindex(self, key):
+        keys = self._keys_by_namespace.get(key.namespace_name)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                self._keys_by_namespace.pop(key.namespace_name)
+
+        if key.semver_namespace_pattern:
+            keys = self._keys_by_pattern.get(key.semver_namespace_pattern)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    self._keys_by_pattern.pop(key.semver_namespace_pattern)
+
+    def invalidate_namespace(self, namespace_name):
+        """
+        Drop all entries whose matches depend on the given namespace (feed group) name.
+
+        :param namespace_name: str name of the feed group that changed
+        :return: count of entries removed
+        """
+        with self._lock:
+            to_remove = set(self._keys_by_namespace.get(namespace_name, set()))
+            for pattern, keys in self._keys_by_pattern.items():
+                if _pattern_matches(pattern, namespace_name):
+                    to_remove.update(keys)
+
+            for key in to_remove:
+                self._entries.pop(key, None)
+                self._unindex(key)
+
+            self._group_stamps.pop(namespace_name, None)
+
+        if to_remove:
+            log.debug('Invalidated {} vulnerability match cache entries for namespace {}'.format(len(to_remove), namespace_name))
+
+        return len(to_remove)
+
+    def validate(self, group_stamps):
+        """
+        Compare the given feed group sync timestamps to those seen previously and invalidate any namespace that changed.
+
+        :param group_stamps: dict mapping feed group name -> last_sync datetime
+        """
+        with self._lock:
+            changed = [name for name, stamp in self._group_stamps.items() if group_stamps.get(name) != stamp]
+            for name in changed:
+                self.invalidate_namespace(name)
+
+            self._group_stamps.update(group_stamps)
+
+    def flush(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_namespace.clear()
+            self._keys_by_pattern.clear()
+            self._group_stamps.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: dict with current hit, miss, and size counts
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'max_entries': self.max_entries}
+
+
+_cache = None
+_cache_init_lock = threading.Lock()
+
+
+def get_match_cache():
+    """
+    Returns the process-wide match cache, initializing it from the service config on first use.
+
+    Config: services.policy_engine.vulnerabilities.match_cache_size (0 to disable caching)
+
+    :return: PackageMatchCache
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_init_lock:
+            if _cache is None:
+                max_entries = DEFAULT_MAX_ENTRIES
+                try:
+                    config = localconfig.get_config()
+                    max_entries = int(config.get('services', {}).get('policy_engine', {}).get('vulnerabilities', {}).get('match_cache_size', DEFAULT_MAX_ENTRIES))
+                except Exception as e:
+                    log.warn('Could not read vulnerability match cache size from config, using default {}. Error: {}'.format(DEFAULT_MAX_ENTRIES, e))
+
+                log.info('Initializing vulnerability match cache with max entries: {}'.format(max_entries))
+                _cache = PackageMatchCache(max_entries=max_entries)
+
+    return _cache
+
+
+def invalidate_namespace(namespace_name):
+    """
+    Invalidate all cached matches for the namespace. Called when a sync of the feed group commits.
+
+    :param namespace_name:
+    :return:
+    """
+    return get_match_cache().invalidate_namespace(namespace_name)
+
+
+def record_metrics(hits, misses):
+    """
+    Export the hit/miss counts from a matching operation to the metrics registry
+
+    """
+    cache = get_match_cache()
+    if hits:
+        anchore_engine.subsys.metrics.counter_inc('anchore_vulnerability_match_cache_hits', step=hits)
+    if misses:
+        anchore_engine.subsys.metrics.counter_inc('anchore_vulnerability_match_cache_misses', step=misses)
+    anchore_engine.subsys.metrics.gauge_set('anchore_vulnerability_match_cache_size', cache.size())
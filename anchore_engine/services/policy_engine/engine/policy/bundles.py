@@ -1,12 +1,18 @@
 from collections import OrderedDict, namedtuple
 import enum
 import copy
+import hashlib
+import heapq
+import json
 import re
 import itertools
+import threading
+import anchore_engine.subsys.metrics
+from anchore_engine.configuration import localconfig
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, TriggerMatch
 from anchore_engine.services.policy_engine.engine.logs import get_logger
 from anchore_engine.util.docker import parse_dockerimage_string
-from anchore_engine.util.matcher import regexify, is_match
+from anchore_engine.util.matcher import is_wildcard, wildcard_match
 from anchore_engine.services.policy_engine.engine.policy.formatting import policy_json_to_txt, whitelist_json_to_txt
 from anchore_engine.services.policy_engine.engine.policy.gate import BaseTrigger
 
@@ -52,18 +58,123 @@ class GateAction(enum.IntEnum):
     go = 1
 
 
-class SimpleMemoryBundleCache(object):
-    def __init__(self):
-        self._bundles = {}
+DEFAULT_BUNDLE_CACHE_SIZE = 100
 
-    def get(self, user_id, bundle_id):
-        return self._bundles.get((user_id, bundle_id))
+BundleCacheKey = namedtuple('BundleCacheKey', ['user_id', 'digest', 'mapping_rule', 'allow_deprecated'])
 
-    def cache(self, user_id, bundle):
-        self._bundles[(user_id, bundle.id)] = bundle
+
+def bundle_digest(bundle_json):
+    """
+    Content digest of a bundle document, independent of key order.
+
+    :param bundle_json: the bundle dict
+    :return: hex sha256 string
+    """
+    return hashlib.sha256(json.dumps(bundle_json, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class CompiledBundleCache(object):
+    """
+    A thread-safe, size-bounded LRU of ExecutableBundle objects keyed by BundleCacheKey. A bundle built for a tag only contains the
+    mapping rule, policies and whitelists selected for that tag, so entries are keyed by the selected mapping rule and shared by all
+    the tags that select it. The parsed mappings of each bundle digest are kept too, to select the rule for a tag without a build.
+
+    Cached bundles are executed concurrently, so execution must not modify them, see ExecutablePolicyRule.execute().
+    """
+
+    def __init__(self, max_entries=DEFAULT_BUNDLE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._bundles = OrderedDict()
+        self._mappings = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            found = self._bundles.get(key)
+            if found is None:
+                self.misses += 1
+                return None
+
+            self._bundles.move_to_end(key)
+            self.hits += 1
+            return found
+
+    def cache(self, key, bundle):
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._bundles[key] = bundle
+            self._bundles.move_to_end(key)
+            while len(self._bundles) > self.max_entries:
+                self._bundles.popitem(last=False)
+
+    def get_mapping(self, digest, mapping_json):
+        """
+        Returns the ExecutableMapping of the bundle with the given digest, building it from mapping_json if not cached
+
+        """
+        with self._lock:
+            found = self._mappings.get(digest)
+            if found is not None:
+                self._mappings.move_to_end(digest)
+                return found
+
+        mapping = ExecutableMapping(mapping_json, rule_cls=PolicyMappingRule)
+        if self.max_entries > 0:
+            with self._lock:
+                self._mappings[digest] = mapping
+                while len(self._mappings) > self.max_entries:
+                    self._mappings.popitem(last=False)
+
+        return mapping
 
     def flush(self):
-        self._bundles = {}
+        with self._lock:
+            self._bundles.clear()
+            self._mappings.clear()
+
+    def size(self):
+        return len(self._bundles)
+
+    def stats(self):
+        """
+        :return: dict with current hit, miss, and size counts
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._bundles), 'max_entries': self.max_entries}
+
+
+_bundle_cache = None
+_bundle_cache_init_lock = threading.Lock()
+
+
+def get_bundle_cache():
+    """
+    Returns the process-wide compiled bundle cache, initializing it from the service config on first use.
+
+    Config: services.policy_engine.policy_bundle_cache_size (0 to disable caching)
+
+    :return: CompiledBundleCache
+    """
+    global _bundle_cache
+
+    if _bundle_cache is None:
+        with _bundle_cache_init_lock:
+            if _bundle_cache is None:
+                max_entries = DEFAULT_BUNDLE_CACHE_SIZE
+                try:
+                    config = localconfig.get_config()
+                    max_entries = int(config.get('services', {}).get('policy_engine', {}).get('policy_bundle_cache_size', DEFAULT_BUNDLE_CACHE_SIZE))
+                except Exception as e:
+                    log.warn('Could not read policy bundle cache size from config, using default {}. Error: {}'.format(DEFAULT_BUNDLE_CACHE_SIZE, e))
+
+                log.info('Initializing policy bundle cache with max entries: {}'.format(max_entries))
+                _bundle_cache = CompiledBundleCache(max_entries=max_entries)
+
+    return _bundle_cache
 
 
 class WhitelistAwarePolicyDecider(object):
@@ -435,29 +546,34 @@ class ExecutablePolicyRule(PolicyRule):
 
         matches = None
 
+        # The rule may be shared by concurrent executions of a cached bundle, so errors and the trigger's fired matches are kept per execution
+        errors = list(self.errors)
+
         try:
             if not self.configured_trigger:
                 log.error('No configured trigger to execute for gate {} and trigger: {}. Returning'.format(self.gate_name, self.trigger_name))
                 raise TriggerNotFoundError(trigger_name=self.trigger_name, gate_name=self.gate_name)
 
             if self.gate_cls.__lifecycle_state__ == LifecycleStates.eol:
-                self.errors.append(EndOfLifedError(gate_name=self.gate_name, superceded=self.gate_cls.__superceded_by__))
+                errors.append(EndOfLifedError(gate_name=self.gate_name, superceded=self.gate_cls.__superceded_by__))
             elif self.gate_cls.__lifecycle_state__ == LifecycleStates.deprecated:
-                self.errors.append(DeprecationWarning(gate_name=self.gate_name, superceded=self.gate_cls.__superceded_by__))
+                errors.append(DeprecationWarning(gate_name=self.gate_name, superceded=self.gate_cls.__superceded_by__))
             elif self.configured_trigger.__lifecycle_state__ == LifecycleStates.eol:
-                self.errors.append(EndOfLifedError(gate_name=self.gate_name, trigger_name=self.trigger_name, superceded=self.configured_trigger.__superceded_by__))
+                errors.append(EndOfLifedError(gate_name=self.gate_name, trigger_name=self.trigger_name, superceded=self.configured_trigger.__superceded_by__))
             elif self.configured_trigger.__lifecycle_state__ == LifecycleStates.deprecated:
-                self.errors.append(DeprecationWarning(gate_name=self.gate_name, trigger_name=self.trigger_name, superceded=self.configured_trigger.__superceded_by__))
+                errors.append(DeprecationWarning(gate_name=self.gate_name, trigger_name=self.trigger_name, superceded=self.configured_trigger.__superceded_by__))
 
+            # A shallow copy shares the configured parameters but gets its own execution state
+            trigger = copy.copy(self.configured_trigger)
             try:
-                self.configured_trigger.execute(image_obj, exec_context)
+                trigger.execute(image_obj, exec_context)
             except TriggerEvaluationError:
                 raise
             except Exception as e:
                 log.exception('Unmapped exception caught during trigger evaluation')
-                raise TriggerEvaluationError(trigger=self.configured_trigger, message='Could not evaluate trigger due to error in evaluation execution')
+                raise TriggerEvaluationError(trigger=trigger, message='Could not evaluate trigger due to error in evaluation execution')
 
-            matches = self.configured_trigger.fired
+            matches = trigger.fired
             decisions = []
 
             # Try all rules and record all decisions and errors so multiple errors can be reported if present, not just the first encountered
@@ -466,9 +582,9 @@ class ExecutablePolicyRule(PolicyRule):
                     decisions.append(PolicyRuleDecision(trigger_match=match, policy_rule=self))
                 except TriggerEvaluationError as e:
                     log.exception('Policy rule decision mapping exception: {}'.format(e))
-                    self.errors.append(str(e))
+                    errors.append(str(e))
 
-            return self.errors, decisions
+            return errors, decisions
         except Exception as e:
             log.exception('Error executing trigger {} on image {}'.format(self.trigger_name, image_obj.id))
             raise
@@ -671,14 +787,20 @@ class MappingRule(object):
     def is_id(self):
         return self.image_match_type == 'id'
 
+    def is_literal_location(self):
+        """
+        Returns True if the registry and repository are matched by string equality, without wildcards
+        """
+        return isinstance(self.registry, str) and isinstance(self.repository, str) and not is_wildcard(self.registry) and not is_wildcard(self.repository)
+
     def _registry_match(self, registry_str):
-        return is_match(regexify, self.registry, registry_str)
+        return wildcard_match(self.registry, registry_str)
 
     def _repository_match(self, repository_str):
-        return is_match(regexify, self.repository, repository_str)
+        return wildcard_match(self.repository, repository_str)
 
     def _tag_match(self, tag_str):
-        return is_match(regexify, self.image_tag, tag_str)
+        return wildcard_match(self.image_tag, tag_str)
 
     def _id_match(self, image_id):
         return self.image_id == image_id and image_id is not None
@@ -697,8 +819,17 @@ class MappingRule(object):
 
         if not tag:
             raise ValueError('Tag cannot be empty or null for matching evaluation')
-        else:
-            match_target = parse_dockerimage_string(tag)
+
+        return self.matches_target(image_obj, parse_dockerimage_string(tag))
+
+    def matches_target(self, image_obj, match_target):
+        """
+        Same as matches(), with the tag already parsed by parse_dockerimage_string()
+
+        :param image_obj: loaded image object
+        :param match_target: parsed tag dict
+        :return: Boolean
+        """
 
         # Must match registry and repo first
         if not (self._registry_match(match_target.get('registry')) and self._repository_match(match_target.get('repo'))):
@@ -750,12 +881,47 @@ class ExecutableMapping(object):
     A set of mapping rules to be evaluated against a tag name and image (image identifiers can be in mapping rules)
 
     Evaluates the bundle mappings in order. Order is very important and must be preserved.
+
+    Rules with a literal registry and repository are indexed by them, so a tag is only checked against the rules indexed for its
+    registry and repository plus the rules with wildcards, in the original order.
     """
 
     def __init__(self, mapping_json=None, rule_cls=MappingRule):
         self.raw = mapping_json
         self.mapping_rules = [rule_cls(rule) for rule in mapping_json]
 
+    @property
+    def mapping_rules(self):
+        return self._mapping_rules
+
+    @mapping_rules.setter
+    def mapping_rules(self, rules):
+        self._mapping_rules = rules
+
+        # (registry, repository) -> ascending positions of the rules matching exactly those, and positions of all other rules
+        self._literal_index = {}
+        self._wildcard_positions = []
+        for index, rule in enumerate(rules):
+            if rule.is_literal_location():
+                self._literal_index.setdefault((rule.registry, rule.repository), []).append(index)
+            else:
+                self._wildcard_positions.append(index)
+
+    def _candidate_positions(self, match_target):
+        """
+        Positions of the rules that may match the parsed tag, in ascending order
+        """
+        registry = match_target.get('registry')
+        repository = match_target.get('repo')
+
+        if not isinstance(registry, str) or not isinstance(repository, str):
+            # e.g. a bare image id or digest, check every rule as the rules decide how to handle it
+            return range(len(self._mapping_rules))
+
+        # A wildcard pattern '^literal$' also matches the literal followed by a newline, so index lookups must too
+        literal_positions = [self._literal_index.get((reg, repo), []) for reg in _literal_keys(registry) for repo in _literal_keys(repository)]
+        return heapq.merge(self._wildcard_positions, *literal_positions)
+
     def execute(self, image_obj, tag):
         """
         Execute the mapping by performing a match and returning the policy and whitelists referenced.
@@ -765,6 +931,18 @@ class ExecutableMapping(object):
         :return: ExecutableMappingRule that is the first match in the ruleset
         """
 
+        index = self.rule_index(image_obj, tag)
+        return self.mapping_rules[index] if index is not None else None
+
+    def rule_index(self, image_obj, tag):
+        """
+        Execute the mapping and return the position of the first matching rule.
+
+        :param image_obj: loaded image object from db, or None to match on the tag only
+        :param tag: tag string
+        :return: index into mapping_rules or None if no rule matches
+        """
+
         if not tag:
             raise ValueError('tag cannot be None')
 
@@ -774,13 +952,17 @@ class ExecutableMapping(object):
         else:
             target_tag = tag
 
-        result = [y for y in self.mapping_rules if y.matches(image_obj, target_tag)]
+        if not self.mapping_rules:
+            return None
+
+        match_target = parse_dockerimage_string(target_tag)
 
         # Could have more than one match, in which case return the first
-        if result and len(result) >= 1:
-            return result[0]
-        else:
-            return None
+        for index in self._candidate_positions(match_target):
+            if self.mapping_rules[index].matches_target(image_obj, match_target):
+                return index
+
+        return None
 
     def json(self):
         if self.raw:
@@ -789,6 +971,15 @@ class ExecutableMapping(object):
             return [m.json() for m in self.mapping_rules]
 
 
+def _literal_keys(value):
+    """
+    The literal patterns that match the value, i.e. the value itself and, with a trailing newline, the value without it
+    """
+    if isinstance(value, str) and value.endswith('\n'):
+        return [value, value[:-1]]
+    return [value]
+
+
 class WhitelistedTriggerMatch(TriggerMatch):
     """
     A recursive type extension for trigger match to indicate a whitelist match. May match against a base trigger match or
@@ -851,7 +1042,7 @@ class ExecutableWhitelistItem(object):
         # TODO: add alias checks here for backwards compat
 
         return self.gate == fired_trigger_obj.trigger.gate_cls.__gate_name__.lower() and \
-               (self.trigger_id == fired_trigger_obj.id or is_match(regexify, self.trigger_id, fired_trigger_obj.id))
+               (self.trigger_id == fired_trigger_obj.id or wildcard_match(self.trigger_id, fired_trigger_obj.id))
 
     def json(self):
         return {
@@ -1091,6 +1282,10 @@ class ExecutableBundle(VersionedEntityMixin):
         else:
             self.target_tag = None
 
+        # Index of the mapping rule selected for the target tag and the unrestricted mapping, to check other tags against it
+        self.target_mapping_rule = None
+        self._full_mapping = None
+
 
         try:
             # Build the mapping first, then build reachable policies and whitelists
@@ -1100,9 +1295,10 @@ class ExecutableBundle(VersionedEntityMixin):
 
             # If building for a specific tag target, only build the mapped rules, else build all rules
             if self.target_tag:
-                rule = self.mapping.execute(image_obj=None, tag=self.target_tag)
-                if rule is not None:
-                    self.mapping.mapping_rules = [rule]
+                self._full_mapping = copy.copy(self.mapping)
+                self.target_mapping_rule = self.mapping.rule_index(image_obj=None, tag=self.target_tag)
+                if self.target_mapping_rule is not None:
+                    self.mapping.mapping_rules = [self.mapping.mapping_rules[self.target_mapping_rule]]
                 else:
                     self.mapping.mapping_rules = []
 
@@ -1157,6 +1353,22 @@ class ExecutableBundle(VersionedEntityMixin):
                 if w not in self.whitelists:
                     raise ReferencedObjectNotFoundError(reference_id=w, reference_type='whitelist')
 
+    def is_built_for(self, tag):
+        """
+        Returns True if the bundle can execute evaluations of the tag: it was built for all tags, or the tag selects the same mapping rule
+        as the tag it was built for.
+
+        :param tag: tag string
+        :return: bool
+        """
+        if not self.target_tag or tag == self.target_tag:
+            return True
+
+        try:
+            return self._full_mapping is not None and self._full_mapping.rule_index(image_obj=None, tag=tag) == self.target_mapping_rule
+        except Exception:
+            return False
+
     def validate(self):
         """
         Executes a validation pass on the policy bundle as constructed. Does not alter any state.
@@ -1185,6 +1397,22 @@ class ExecutableBundle(VersionedEntityMixin):
             bundle_exec.abort_with_failure(PolicyError.caused_by(e))
             return bundle_exec
 
+    def _prepare_trigger_batches(self, policies, image_object, context):
+        # Let each trigger class prepare once for all its configured instances in the evaluated policies, see BaseTrigger.prepare_batch()
+        batches = OrderedDict()
+        for policy in policies:
+            for rule in policy.rules:
+                trigger = getattr(rule, 'configured_trigger', None)
+                if trigger is not None:
+                    batches.setdefault(trigger.__class__, []).append(trigger)
+
+        for trigger_cls, triggers in batches.items():
+            try:
+                trigger_cls.prepare_batch(triggers, image_object, context)
+            except Exception:
+                # Not fatal, each trigger evaluates on its own data and reports its own errors
+                log.exception('Error preparing evaluation of {} triggers'.format(trigger_cls.__trigger_name__))
+
     def _process_mapping_result(self, bundle_exec, image_object, tag, context):
         # Evaluate the selected policy or set none if none found
 
@@ -1203,6 +1431,8 @@ class ExecutableBundle(VersionedEntityMixin):
         try:
             policy_decisions = []
             if evaluated_policies:
+                self._prepare_trigger_batches(evaluated_policies, image_object, context)
+
                 for evaluated_policy in evaluated_policies:
                     errors, policy_decision = evaluated_policy.execute(image_obj=image_object, context=context)
                     if errors:
@@ -1246,7 +1476,7 @@ class ExecutableBundle(VersionedEntityMixin):
         :return: 
         """
 
-        if self.target_tag and tag != self.target_tag:
+        if self.target_tag and tag != self.target_tag and not self.is_built_for(tag):
             raise BundleTargetTagMismatchError(self.target_tag, tag)
 
         bundle_exec = BundleExecution(self, image_id=image_object.id, tag=tag)
@@ -1318,3 +1548,41 @@ def build_bundle(bundle_json, for_tag=None, allow_deprecated=False):
     else:
         raise ValueError('No bundle json found')
     return bundle
+
+
+def build_cached_bundle(user_id, bundle_json, for_tag, allow_deprecated=False, cache=None):
+    """
+    Cached equivalent of build_bundle(bundle_json, for_tag=for_tag, allow_deprecated=allow_deprecated). The compiled bundle is reused
+    for any tag selecting the same mapping rule of the same bundle content, until evicted from the cache.
+
+    :param user_id: the user owning the bundle
+    :param bundle_json: the bundle dict
+    :param for_tag: the tag to build the bundle for
+    :param allow_deprecated: bool to allow deprecated and eol gates
+    :param cache: CompiledBundleCache to use, the process-wide one if not set
+    :return: ExecutableBundle object or None, as returned by build_bundle()
+    """
+    if not bundle_json or not for_tag:
+        return build_bundle(bundle_json, for_tag=for_tag, allow_deprecated=allow_deprecated)
+
+    if cache is None:
+        cache = get_bundle_cache()
+
+    try:
+        digest = bundle_digest(bundle_json)
+        mapping_rule = cache.get_mapping(digest, bundle_json.get('mappings', [])).rule_index(image_obj=None, tag=for_tag)
+    except Exception as e:
+        # Invalid mappings are reported by the build as initialization errors
+        log.debug('Could not select the mapping rule for tag {}, building bundle without cache: {}'.format(for_tag, e))
+        return build_bundle(bundle_json, for_tag=for_tag, allow_deprecated=allow_deprecated)
+
+    key = BundleCacheKey(user_id=user_id, digest=digest, mapping_rule=mapping_rule, allow_deprecated=allow_deprecated)
+    bundle = cache.get(key)
+    anchore_engine.subsys.metrics.counter_inc('anchore_policy_bundle_cache_hits' if bundle is not None else 'anchore_policy_bundle_cache_misses')
+    if bundle is None:
+        bundle = build_bundle(bundle_json, for_tag=for_tag, allow_deprecated=allow_deprecated)
+        if bundle is not None:
+            cache.cache(key, bundle)
+            anchore_engine.subsys.metrics.gauge_set('anchore_policy_bundle_cache_size', cache.size())
+
+    return bundle
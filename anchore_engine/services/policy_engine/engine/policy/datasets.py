@@ -0,0 +1,146 @@
+"""
+Loaders of the image datasets shared by gates through ExecutionContext.image_data, see ImageDataProvider.
+
+Gates request these by name in prepare_context() instead of loading them themselves, so an image's data is loaded once per evaluation
+even when several policies, rules, or gates use it.
+
+"""
+from anchore_engine.db import AnalysisArtifact, GemMetadata, ImageCpeVulnerability, NpmMetadata
+from anchore_engine.services.policy_engine.engine.policy.gate import image_dataset
+
+# ImagePackageVulnerability list
+PACKAGE_VULNERABILITIES = 'package_vulnerabilities'
+
+# dict of severity -> list of ImageCpeVulnerability
+CPE_VULNERABILITIES_BY_SEVERITY = 'cpe_vulnerabilities_by_severity'
+
+# list of file names, or None if the image has no file listing
+FILENAMES = 'filenames'
+
+# dict of file name -> content search regex matches
+CONTENT_SEARCH_MATCHES = 'content_search_matches'
+
+# dict of file name -> secret search regex matches
+SECRET_SEARCH_MATCHES = 'secret_search_matches'
+
+# dict of user name -> remaining /etc/passwd fields, or None if not found
+PASSWD_ENTRIES = 'passwd_entries'
+
+# list of (package name, license) tuples
+PACKAGE_LICENSES = 'package_licenses'
+
+# dict of package name -> list of installed versions
+GEM_VERSIONS = 'gem_versions'
+NPM_VERSIONS = 'npm_versions'
+
+# list of feed metadata records for the installed packages
+GEM_FEED_METADATA = 'gem_feed_metadata'
+NPM_FEED_METADATA = 'npm_feed_metadata'
+
+# Packages names per query when fetching feed metadata, to avoid a single large in() statement with 1000+ keys
+FEED_METADATA_CHUNK_SIZE = 100
+
+
+@image_dataset(PACKAGE_VULNERABILITIES)
+def load_package_vulnerabilities(provider, image_obj, db):
+    return image_obj.vulnerabilities()
+
+
+@image_dataset(CPE_VULNERABILITIES_BY_SEVERITY)
+def load_cpe_vulnerabilities_by_severity(provider, image_obj, db):
+    # The non-package (CPE) vulnerability matches persisted at image load
+    all_cpe_matches = db.query(ImageCpeVulnerability).filter(ImageCpeVulnerability.image_user_id == image_obj.user_id, ImageCpeVulnerability.image_id == image_obj.id)
+
+    severity_matches = {}
+    for cpe_match in all_cpe_matches:
+        severity_matches.setdefault(cpe_match.severity, []).append(cpe_match)
+
+    return severity_matches
+
+
+@image_dataset(FILENAMES)
+def load_filenames(provider, image_obj, db):
+    if image_obj.fs:
+        extracted_files_json = image_obj.fs.files
+        if extracted_files_json:
+            return list(extracted_files_json.keys())
+
+    return None
+
+
+def _regexp_matches(image_obj, analyzer_id):
+    content_matches = image_obj.analysis_artifacts.filter(AnalysisArtifact.analyzer_id == analyzer_id, AnalysisArtifact.analyzer_artifact == 'regexp_matches.all', AnalysisArtifact.analyzer_type == 'base').all()
+    return {m.artifact_key: m.json_value for m in content_matches}
+
+
+@image_dataset(CONTENT_SEARCH_MATCHES)
+def load_content_search_matches(provider, image_obj, db):
+    return _regexp_matches(image_obj, 'content_search')
+
+
+@image_dataset(SECRET_SEARCH_MATCHES)
+def load_secret_search_matches(provider, image_obj, db):
+    return _regexp_matches(image_obj, 'secret_search')
+
+
+@image_dataset(PASSWD_ENTRIES)
+def load_passwd_entries(provider, image_obj, db):
+    content_matches = image_obj.analysis_artifacts.filter(AnalysisArtifact.analyzer_id == 'retrieve_files', AnalysisArtifact.analyzer_artifact == 'file_content.all', AnalysisArtifact.analyzer_type == 'base', AnalysisArtifact.artifact_key == '/etc/passwd').first()
+    if not content_matches:
+        return None
+
+    pentries = {}
+    for line in str(content_matches.binary_value).splitlines():
+        line = line.strip()
+        pentry = line.split(':')
+        pentries[pentry[0]] = pentry[1:]
+
+    return pentries
+
+
+@image_dataset(PACKAGE_LICENSES)
+def load_package_licenses(provider, image_obj, db):
+    licenses = []
+    for pkg in image_obj.packages:
+        for lic in pkg.license.split():
+            licenses.append((pkg.name, lic))
+
+    return licenses
+
+
+def _package_versions(image_obj, pkg_type):
+    # handle multiple records with the same version (but in different locations)
+    versions = {}
+    for p in image_obj.get_packages_by_type(pkg_type):
+        versions.setdefault(p.name, []).append(p.version)
+
+    return versions
+
+
+def _feed_metadata(db, metadata_cls, names):
+    names = list(names)
+    records = []
+    for i in range(0, len(names), FEED_METADATA_CHUNK_SIZE):
+        records += db.query(metadata_cls).filter(metadata_cls.name.in_(names[i:i + FEED_METADATA_CHUNK_SIZE])).all()
+
+    return records
+
+
+@image_dataset(GEM_VERSIONS)
+def load_gem_versions(provider, image_obj, db):
+    return _package_versions(image_obj, 'gem')
+
+
+@image_dataset(NPM_VERSIONS)
+def load_npm_versions(provider, image_obj, db):
+    return _package_versions(image_obj, 'npm')
+
+
+@image_dataset(GEM_FEED_METADATA)
+def load_gem_feed_metadata(provider, image_obj, db):
+    return _feed_metadata(db, GemMetadata, provider.get(GEM_VERSIONS, image_obj).keys())
+
+
+@image_dataset(NPM_FEED_METADATA)
+def load_npm_feed_metadata(provider, image_obj, db):
+    return _feed_metadata(db, NpmMetadata, provider.get(NPM_VERSIONS, image_obj).keys())
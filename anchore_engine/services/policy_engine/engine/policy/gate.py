@@ -65,6 +65,55 @@ class GateMeta(type):
         return list(cls.registry.keys())
 
 
+class ImageDataProvider(object):
+    """
+    Image-scoped, memoized source of the named datasets that gates evaluate, e.g. the image's vulnerability matches or file names.
+
+    Loaders are registered by name with the image_dataset() decorator and called as loader(provider, image_obj, db) the first time
+    a dataset of an image is requested, so each dataset is computed at most once per execution context regardless of how many
+    policies, rules and gates use it. Loaders may request other datasets from the provider.
+
+    """
+    loaders = {}
+
+    def __init__(self, db_session):
+        self.db = db_session
+        self._datasets = {}
+
+    def get(self, name, image_obj):
+        """
+        Returns the named dataset for the image, loading it on first request
+
+        :param name: registered dataset name
+        :param image_obj: the image being evaluated
+        :return: the dataset, as returned by its loader
+        """
+        key = (name, image_obj.user_id, image_obj.id)
+        if key not in self._datasets:
+            loader = self.loaders.get(name)
+            if loader is None:
+                raise KeyError(name)
+
+            self._datasets[key] = loader(self, image_obj, self.db)
+
+        return self._datasets[key]
+
+
+def image_dataset(name):
+    """
+    Decorator to register a loader function for the named ImageDataProvider dataset
+
+    :param name: the dataset name
+    :return:
+    """
+
+    def decorator(fn):
+        ImageDataProvider.loaders[name] = fn
+        return fn
+
+    return decorator
+
+
 class ExecutionContext(object):
     """
     Execution context defines the gate execution environment including logging, db connections, and cache space.
@@ -77,6 +126,7 @@ class ExecutionContext(object):
         self.configuration = configuration
         self.params = params
         self.data = {}
+        self.image_data = ImageDataProvider(db_session)
 
 
 class TriggerMatch(object):
@@ -248,6 +298,20 @@ class BaseTrigger(LifecycleMixin):
         """
         raise NotImplementedError()
 
+    @classmethod
+    def prepare_batch(cls, triggers, image_obj, context):
+        """
+        Called once per bundle evaluation, before any trigger is evaluated, with all the configured instances of this trigger
+        in the evaluated policies. Triggers that scan the same image data with different parameters can override this to
+        scan it once for all instances and leave the results in context.data for evaluate(). Does nothing by default.
+
+        :param triggers: list of configured trigger objects of this class
+        :param image_obj: the image to be evaluated
+        :param context: the ExecutionContext of the evaluation
+        :return:
+        """
+        pass
+
     def _fire(self, instance_id=None, msg=None):
         """
         Internal function used by evaluation code to indicate a match found. May be called many times and results in
@@ -3,6 +3,7 @@ import time
 
 from anchore_engine.services.policy_engine.engine.feeds import DataFeeds
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger, LifecycleStates
+from anchore_engine.services.policy_engine.engine.policy.datasets import PACKAGE_VULNERABILITIES
 from anchore_engine.services.policy_engine.engine.vulnerabilities import have_vulnerabilities_for
 from anchore_engine.db import DistroNamespace
 from anchore_engine.services.policy_engine.engine.logs import get_logger
@@ -152,5 +153,5 @@ class AnchoreSecGate(Gate):
         :rtype:
         """
         # Load the vulnerability info up front
-        context.data['loaded_vulnerabilities'] = image_obj.vulnerabilities()
+        context.data['loaded_vulnerabilities'] = context.image_data.get(PACKAGE_VULNERABILITIES, image_obj)
         return context
@@ -4,9 +4,9 @@ import stat
 from anchore_engine.utils import ensure_str, ensure_bytes
 from anchore_engine.services.policy_engine.engine.policy.gates.util import deprecated_operation
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger, LifecycleStates
+from anchore_engine.services.policy_engine.engine.policy.datasets import FILENAMES, CONTENT_SEARCH_MATCHES
 from anchore_engine.services.policy_engine.engine.logs import get_logger
 from anchore_engine.services.policy_engine.engine.policy.params import PipeDelimitedStringListParameter
-from anchore_engine.db import AnalysisArtifact
 log = get_logger()
 
 
@@ -115,16 +115,10 @@ class FileCheckGate(Gate):
         :param context:
         :return:
         """
-        if image_obj.fs:
-            extracted_files_json = image_obj.fs.files
+        filenames = context.image_data.get(FILENAMES, image_obj)
+        if filenames:
+            context.data['filenames'] = filenames
 
-            if extracted_files_json:
-               context.data['filenames'] = list(extracted_files_json.keys())
-
-        content_matches = image_obj.analysis_artifacts.filter(AnalysisArtifact.analyzer_id == 'content_search', AnalysisArtifact.analyzer_artifact == 'regexp_matches.all', AnalysisArtifact.analyzer_type == 'base').all()
-        matches = {}
-        for m in content_matches:
-            matches[m.artifact_key] = m.json_value
-        context.data['content_regexp'] = matches
+        context.data['content_regexp'] = context.image_data.get(CONTENT_SEARCH_MATCHES, image_obj)
 
         return context
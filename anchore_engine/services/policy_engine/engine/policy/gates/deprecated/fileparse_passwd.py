@@ -1,6 +1,6 @@
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger, LifecycleStates
 from anchore_engine.services.policy_engine.engine.policy.params import CommaDelimitedNumberListParameter, CommaDelimitedStringListParameter, PipeDelimitedStringListParameter
-from anchore_engine.db import AnalysisArtifact
+from anchore_engine.services.policy_engine.engine.policy.datasets import PASSWD_ENTRIES
 
 
 class FileNotStoredTrigger(BaseTrigger):
@@ -159,16 +159,8 @@ class FileparsePasswordGate(Gate):
         :return:
         """
 
-        content_matches = image_obj.analysis_artifacts.filter(AnalysisArtifact.analyzer_id == 'retrieve_files', AnalysisArtifact.analyzer_artifact == 'file_content.all', AnalysisArtifact.analyzer_type == 'base', AnalysisArtifact.artifact_key == '/etc/passwd').first()
-        if content_matches:
-            try:
-                pentries = {}
-                for line in str(content_matches.binary_value).splitlines():
-                    line = line.strip()
-                    pentry = line.split(':')
-                    pentries[pentry[0]] = pentry[1:]
-                context.data['passwd_entries'] = pentries
-            except Exception as e:
-                raise e
+        pentries = context.image_data.get(PASSWD_ENTRIES, image_obj)
+        if pentries is not None:
+            context.data['passwd_entries'] = pentries
 
         return context
\ No newline at end of file
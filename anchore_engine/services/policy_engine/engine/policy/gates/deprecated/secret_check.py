@@ -2,9 +2,9 @@ import base64
 import re
 from anchore_engine.utils import ensure_bytes, ensure_str
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger, LifecycleStates
+from anchore_engine.services.policy_engine.engine.policy.datasets import FILENAMES, SECRET_SEARCH_MATCHES
 from anchore_engine.services.policy_engine.engine.logs import get_logger
 from anchore_engine.services.policy_engine.engine.policy.params import PipeDelimitedStringListValidator, PipeDelimitedStringListParameter
-from anchore_engine.db import AnalysisArtifact
 
 log = get_logger()
 
@@ -90,16 +90,10 @@ class SecretCheckGate(Gate):
         :return:
         """
 
-        if image_obj.fs:
-            extracted_files_json = image_obj.fs.files
+        filenames = context.image_data.get(FILENAMES, image_obj)
+        if filenames:
+            context.data['filenames'] = filenames
 
-            if extracted_files_json:
-                context.data['filenames'] = list(extracted_files_json.keys())
-
-        content_matches = image_obj.analysis_artifacts.filter(AnalysisArtifact.analyzer_id == 'secret_search', AnalysisArtifact.analyzer_artifact == 'regexp_matches.all', AnalysisArtifact.analyzer_type == 'base').all()
-        matches = {}
-        for m in content_matches:
-            matches[m.artifact_key] = m.json_value
-        context.data['secret_content_regexp'] = matches
+        context.data['secret_content_regexp'] = context.image_data.get(SECRET_SEARCH_MATCHES, image_obj)
 
         return context
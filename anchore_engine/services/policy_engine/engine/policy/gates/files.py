@@ -3,9 +3,10 @@ import stat
 import base64
 from anchore_engine.utils import ensure_str, ensure_bytes
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger
+from anchore_engine.services.policy_engine.engine.policy.datasets import FILENAMES, CONTENT_SEARCH_MATCHES
 from anchore_engine.services.policy_engine.engine.logs import get_logger
+from anchore_engine.util.matcher import multi_regex_matcher
 from anchore_engine.services.policy_engine.engine.policy.params import PipeDelimitedStringListParameter, TriggerParameter, TypeValidator
-from anchore_engine.db import AnalysisArtifact
 log = get_logger()
 
 
@@ -50,18 +51,31 @@ class FilenameMatchTrigger(BaseTrigger):
 
     regex = TriggerParameter(validator=TypeValidator('string'), name='regex', example_str='.*\.pem', description='Regex to apply to file names for match.', is_required=True)
 
+    @classmethod
+    def prepare_batch(cls, triggers, image_obj, context):
+        # Match the file names against the regexes of all the instances in a single pass instead of one pass per instance
+        patterns = tuple(sorted(set(t.regex.value() for t in triggers)))
+        filenames = context.image_data.get(FILENAMES, image_obj) or []
+        context.data['filename_regex_matches'] = multi_regex_matcher(patterns).match_all(ensure_str(f) for f in filenames)
+
     def evaluate(self, image_obj, context):
         # decode the param regexes from b64
         regex_param = self.regex.value()
 
-        files = []
+        matched_files = None
         if hasattr(context, 'data'):
-            files = context.data.get('filenames')
+            matched_files = context.data.get('filename_regex_matches', {}).get(regex_param)
 
-        for thefile in files:
-            thefile = ensure_str(thefile)
-            if re.match(regex_param, thefile):
-                self._fire(msg='Application of regex matched file found in container: file={} regexp={}'.format(thefile, regex_param))
+        if matched_files is None:
+            # Not prepared with the other instances, or an invalid regex whose error is raised here
+            files = []
+            if hasattr(context, 'data'):
+                files = context.data.get('filenames') or []
+
+            matched_files = [thefile for thefile in (ensure_str(f) for f in files) if re.match(regex_param, thefile)]
+
+        for thefile in matched_files:
+            self._fire(msg='Application of regex matched file found in container: file={} regexp={}'.format(thefile, regex_param))
 
 
 class SuidCheckTrigger(BaseTrigger):
@@ -100,16 +114,10 @@ class FileCheckGate(Gate):
         :param context:
         :return:
         """
-        if image_obj.fs:
-            extracted_files_json = image_obj.fs.files
-
-            if extracted_files_json:
-                context.data['filenames'] = list(extracted_files_json.keys())
+        filenames = context.image_data.get(FILENAMES, image_obj)
+        if filenames:
+            context.data['filenames'] = filenames
 
-        content_matches = image_obj.analysis_artifacts.filter(AnalysisArtifact.analyzer_id == 'content_search', AnalysisArtifact.analyzer_artifact == 'regexp_matches.all', AnalysisArtifact.analyzer_type == 'base').all()
-        matches = {}
-        for m in content_matches:
-            matches[m.artifact_key] = m.json_value
-        context.data['content_regexp'] = matches
+        context.data['content_regexp'] = context.image_data.get(CONTENT_SEARCH_MATCHES, image_obj)
 
         return context
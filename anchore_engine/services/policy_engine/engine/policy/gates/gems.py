@@ -1,6 +1,6 @@
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger
+from anchore_engine.services.policy_engine.engine.policy.datasets import GEM_VERSIONS, GEM_FEED_METADATA
 from anchore_engine.services.policy_engine.engine.policy.params import CommaDelimitedStringListParameter, TriggerParameter, TypeValidator
-from anchore_engine.db import GemMetadata
 from anchore_engine.services.policy_engine.engine.logs import get_logger
 from anchore_engine.services.policy_engine.engine.feeds import DataFeeds
 
@@ -168,27 +168,12 @@ class GemCheckGate(Gate):
             :return:
             """
 
-            db_gems = image_obj.get_packages_by_type('gem') 
-            if not db_gems:
+            gem_list_key_data = context.image_data.get(GEM_VERSIONS, image_obj)
+            if not gem_list_key_data:
                 return context
 
-            #context.data[GEM_LIST_KEY] = {p.name: p.versions_json for p in image_obj.gems}
-
-            # update to handle multiple records with the same version (but in different locations)
-            gem_list_key_data = {}
-            for p in db_gems:
-                if p.name not in gem_list_key_data:
-                    gem_list_key_data[p.name] = []
-                gem_list_key_data[p.name].append(p.version)
-
             context.data[GEM_LIST_KEY] = gem_list_key_data
-            context.data[GEM_MATCH_KEY] = []
-            gems = list(context.data[GEM_LIST_KEY].keys())
-
-            # Use a chunked fetch approach to avoid a single large in() statement with 1000+ keys
-            chunks = [gems[i: i+100] for i in range(0, len(gems), 100)]
-            for key_range in chunks:
-                context.data[GEM_MATCH_KEY] += context.db.query(GemMetadata).filter(GemMetadata.name.in_(key_range)).all()
+            context.data[GEM_MATCH_KEY] = context.image_data.get(GEM_FEED_METADATA, image_obj)
 
 
             return context
@@ -1,5 +1,6 @@
 import re
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger
+from anchore_engine.services.policy_engine.engine.policy.datasets import PACKAGE_LICENSES
 from anchore_engine.services.policy_engine.engine.policy.params import CommaDelimitedStringListParameter
 
 
@@ -70,9 +71,7 @@ class LicensesGate(Gate):
         #    for license in pkg_meta.licenses_json if pkg_meta.licenses_json else []:
         #        licenses.append((pkg_meta.name + "(gem)", license))
 
-        for pkg in image_obj.packages:
-            for lic in pkg.license.split():
-                licenses.append((pkg.name, lic))
+        licenses += context.image_data.get(PACKAGE_LICENSES, image_obj)
 
         context.data['licenses'] = licenses
         return context
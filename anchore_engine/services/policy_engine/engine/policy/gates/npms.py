@@ -1,6 +1,6 @@
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger
+from anchore_engine.services.policy_engine.engine.policy.datasets import NPM_VERSIONS, NPM_FEED_METADATA
 from anchore_engine.services.policy_engine.engine.policy.params import TypeValidator, TriggerParameter
-from anchore_engine.db import NpmMetadata
 from anchore_engine.services.policy_engine.engine.logs import get_logger
 from anchore_engine.services.policy_engine.engine.feeds import DataFeeds
 
@@ -170,22 +170,11 @@ class NpmCheckGate(Gate):
             :return:
             """
 
-            db_npms = image_obj.get_packages_by_type('npm')
-            if not db_npms:
+            npm_listing_key_data = context.image_data.get(NPM_VERSIONS, image_obj)
+            if not npm_listing_key_data:
                 return context
 
-            #context.data[NPM_LISTING_KEY] = {p.name: p.versions_json for p in image_obj.npms}
-            npm_listing_key_data = {}
-            for p in db_npms:
-                if p.name not in npm_listing_key_data:
-                    npm_listing_key_data[p.name] = []
-                npm_listing_key_data[p.name].append(p.version)
             context.data[NPM_LISTING_KEY] = npm_listing_key_data
-
-            npms = list(context.data[NPM_LISTING_KEY].keys())
-            context.data[NPM_MATCH_KEY] = []
-            chunks = [npms[i: i+100] for i in range(0, len(npms), 100)]
-            for key_range in chunks:
-                context.data[NPM_MATCH_KEY] += context.db.query(NpmMetadata).filter(NpmMetadata.name.in_(key_range)).all()
+            context.data[NPM_MATCH_KEY] = context.image_data.get(NPM_FEED_METADATA, image_obj)
 
             return context
@@ -3,8 +3,9 @@ import time
 
 from anchore_engine.services.policy_engine.engine.feeds import DataFeeds
 from anchore_engine.services.policy_engine.engine.policy.gate import Gate, BaseTrigger
+from anchore_engine.services.policy_engine.engine.policy.datasets import PACKAGE_VULNERABILITIES, CPE_VULNERABILITIES_BY_SEVERITY
 from anchore_engine.services.policy_engine.engine.vulnerabilities import have_vulnerabilities_for
-from anchore_engine.db import DistroNamespace, ImageCpe, CpeVulnerability
+from anchore_engine.db import DistroNamespace
 from anchore_engine.services.policy_engine.engine.logs import get_logger
 from anchore_engine.services.policy_engine.engine.policy.params import BooleanStringParameter, IntegerStringParameter, EnumCommaDelimStringListParameter, EnumStringParameter
 log = get_logger()
@@ -55,32 +56,32 @@ class VulnerabilityMatchTrigger(BaseTrigger):
                     for sev in list(cpevulns.keys()):
                         found_severity_idx = SEVERITY_ORDERING.index(sev.lower()) if sev else 0
                         if comparison_fn(found_severity_idx, comparison_idx):
-                            for image_cpe, vulnerability_cpe in cpevulns[sev]:
-                                if image_cpe.pkg_type in ['java', 'gem']:
+                            for cpe_match in cpevulns[sev]:
+                                if cpe_match.pkg_type in ['java', 'gem']:
                                     try:
-                                        trigger_fname = image_cpe.pkg_path.split("/")[-1]
+                                        trigger_fname = cpe_match.pkg_path.split("/")[-1]
                                     except:
                                         trigger_fname = None
-                                elif image_cpe.pkg_type in ['npm']:
+                                elif cpe_match.pkg_type in ['npm']:
                                     try:
-                                        trigger_fname = image_cpe.pkg_path.split("/")[-2]
+                                        trigger_fname = cpe_match.pkg_path.split("/")[-2]
                                     except:
                                         trigger_fname = None                                    
 
                                 if not trigger_fname:
-                                    trigger_fname = "-".join([image_cpe.name, image_cpe.version])
+                                    trigger_fname = "-".join([cpe_match.name, cpe_match.version])
 
                                 if is_fix_available is not None:
                                     # Must to a fix_available check
-                                    fix_available_in = image_cpe.fixed_in()
+                                    fix_available_in = cpe_match.fixed_in()
                                     if is_fix_available == (fix_available_in is not None):                                    
-                                        message = sev.upper() + " Vulnerability found in non-os package type ("+image_cpe.pkg_type+") - " + \
-                                                  image_cpe.pkg_path + " (" + vulnerability_cpe.vulnerability_id + " - https://nvd.nist.gov/vuln/detail/" + vulnerability_cpe.vulnerability_id + ")"
-                                        self._fire(instance_id=vulnerability_cpe.vulnerability_id + '+' + trigger_fname, msg=message)
+                                        message = sev.upper() + " Vulnerability found in non-os package type ("+cpe_match.pkg_type+") - " + \
+                                                  cpe_match.pkg_path + " (" + cpe_match.vulnerability_id + " - https://nvd.nist.gov/vuln/detail/" + cpe_match.vulnerability_id + ")"
+                                        self._fire(instance_id=cpe_match.vulnerability_id + '+' + trigger_fname, msg=message)
                                 else:
-                                    message = sev.upper() + " Vulnerability found in non-os package type ("+image_cpe.pkg_type+") - " + \
-                                              image_cpe.pkg_path + " (" + vulnerability_cpe.vulnerability_id + " - https://nvd.nist.gov/vuln/detail/" + vulnerability_cpe.vulnerability_id + ")"
-                                    self._fire(instance_id=vulnerability_cpe.vulnerability_id + '+' + trigger_fname, msg=message)
+                                    message = sev.upper() + " Vulnerability found in non-os package type ("+cpe_match.pkg_type+") - " + \
+                                              cpe_match.pkg_path + " (" + cpe_match.vulnerability_id + " - https://nvd.nist.gov/vuln/detail/" + cpe_match.vulnerability_id + ")"
+                                    self._fire(instance_id=cpe_match.vulnerability_id + '+' + trigger_fname, msg=message)
 
                 except Exception as err:
                     log.warn("problem during non-os vulnerability evaluation - exception: {}".format(err))
@@ -178,20 +179,9 @@ class VulnerabilitiesGate(Gate):
         :rtype:
         """
         # Load the package vulnerability info up front
-        context.data['loaded_vulnerabilities'] = image_obj.vulnerabilities()
+        context.data['loaded_vulnerabilities'] = context.image_data.get(PACKAGE_VULNERABILITIES, image_obj)
 
-        # Load the non-package (CPE) vulnerability info up front
-        all_cpe_matches = context.db.query(ImageCpe,CpeVulnerability).filter(ImageCpe.image_id==image_obj.id).filter(ImageCpe.name==CpeVulnerability.name).filter(ImageCpe.version==CpeVulnerability.version)
-        if not all_cpe_matches:
-            all_cpe_matches = []
-
-        severity_matches = {}
-        for image_cpe, vulnerability_cpe in all_cpe_matches:
-            sev = vulnerability_cpe.severity
-            if sev not in severity_matches:
-                severity_matches[sev] = []
-            severity_matches[sev].append((image_cpe, vulnerability_cpe))
-
-        context.data['loaded_cpe_vulnerabilities'] = severity_matches
+        # Load the non-package (CPE) vulnerability matches persisted at image load up front
+        context.data['loaded_cpe_vulnerabilities'] = context.image_data.get(CPE_VULNERABILITIES_BY_SEVERITY, image_obj)
 
         return context
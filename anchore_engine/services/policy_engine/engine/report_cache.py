@@ -0,0 +1,209 @@
+"""
+Process-wide cache of rendered image vulnerability reports.
+
+The catalog requests the vulnerability report of every subscribed image on each vulnerability scan cycle and the report rarely
+changes between them. Reports are cached per (user, image, vendor_only) together with a version stamp of the data they were built
+from: the image's last_modified timestamp, which is updated on every rescan, and the last_sync timestamps of the feed groups the
+image's matches can come from. A cached report is served only while its stamp equals the current one, which is read with two
+single-table queries and no joins. The stamp also yields the report's ETag, so callers that already hold the current report can
+skip the transfer with If-None-Match.
+
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import anchore_engine.subsys.metrics
+from anchore_engine.configuration import localconfig
+from anchore_engine.db import DistroNamespace, FeedGroupMetadata
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+
+log = get_logger()
+
+DEFAULT_MAX_ENTRIES = 1000
+
+# Feeds whose groups hold cpe vulnerability records, which apply to images of any distro
+cpe_feed_names = ['nvd', 'snyk']
+
+# Parts of the feed group names holding language vulnerability records, see ImagePackage.semver_match_key()
+language_group_patterns = ['java', 'ruby', 'js', 'python']
+
+ReportKey = namedtuple('ReportKey', ['user_id', 'image_id', 'vendor_only'])
+
+CachedReport = namedtuple('CachedReport', ['version', 'etag', 'report'])
+
+
+def _is_relevant_group(feed_name, group_name, namespace_names):
+    """
+    Returns True if the feed group can hold records matched against an image with the given distro namespace names
+
+    """
+    if feed_name in cpe_feed_names or group_name in namespace_names:
+        return True
+
+    return feed_name == 'vulnerabilities' and any(pattern in group_name for pattern in language_group_patterns)
+
+
+def report_version(db, image_obj):
+    """
+    Build the version stamp of the vulnerability report of the image from its current state in the db.
+
+    :param db: the db session
+    :param image_obj: Image object, refreshed if it was just rescanned
+    :return: tuple of the image's last_modified timestamp and the sorted (feed, group, last_sync) tuples of the relevant feed groups
+    """
+    namespace_names = set(DistroNamespace.for_obj(image_obj).like_namespace_names)
+    groups = [(feed_name, group_name, last_sync) for feed_name, group_name, last_sync in db.query(FeedGroupMetadata.feed_name, FeedGroupMetadata.name, FeedGroupMetadata.last_sync)
+              if _is_relevant_group(feed_name, group_name, namespace_names)]
+
+    return image_obj.last_modified, tuple(sorted(groups, key=lambda x: (x[0], x[1])))
+
+
+def report_etag(key, version):
+    """
+    Compute the ETag of the report for the key built from data at the given version. The value only depends on its inputs, so any
+    policy engine instance computes the same one for the same data.
+
+    :param key: ReportKey
+    :param version: stamp from report_version()
+    :return: quoted ETag string
+    """
+    stamp = repr((tuple(key), version[0].isoformat() if version[0] else None, tuple((f, g, s.isoformat() if s else None) for f, g, s in version[1])))
+    return '"{}"'.format(hashlib.sha256(stamp.encode('utf-8')).hexdigest())
+
+
+class VulnerabilityReportCache(object):
+    """
+    A thread-safe, size-bounded LRU mapping ReportKey -> CachedReport.
+
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+
+    def lookup(self, key, version):
+        """
+        Returns the cached report for the key if it was built at the given version, else None. Entries at any other version are dropped.
+
+        :param key: ReportKey
+        :param version: the current stamp from report_version()
+        :return: CachedReport or None
+        """
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None or found.version != version:
+                if found is not None:
+                    self._entries.pop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return found
+
+    def cache_it(self, key, version, etag, report):
+        """
+        Cache the report for the key, evicting least-recently-used entries if the cache is full.
+
+        :param key: ReportKey
+        :param version: the stamp read before the report's data was loaded
+        :param etag: the report's ETag
+        :param report: the rendered report dict
+        """
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = CachedReport(version=version, etag=etag, report=report)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_image(self, user_id, image_id):
+        """
+        Drop the cached reports of the image, e.g. when the image is deleted.
+
+        :param user_id:
+        :param image_id:
+        :return: count of entries removed
+        """
+        with self._lock:
+            to_remove = [x for x in self._entries if x.user_id == user_id and x.image_id == image_id]
+            for key in to_remove:
+                self._entries.pop(key)
+
+        return len(to_remove)
+
+    def flush(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: dict with current hit, miss, and size counts
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'max_entries': self.max_entries}
+
+
+_cache = None
+_cache_init_lock = threading.Lock()
+
+
+def get_report_cache():
+    """
+    Returns the process-wide report cache, initializing it from the service config on first use.
+
+    Config: services.policy_engine.vulnerabilities.report_cache_size (0 to disable caching)
+
+    :return: VulnerabilityReportCache
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_init_lock:
+            if _cache is None:
+                max_entries = DEFAULT_MAX_ENTRIES
+                try:
+                    config = localconfig.get_config()
+                    max_entries = int(config.get('services', {}).get('policy_engine', {}).get('vulnerabilities', {}).get('report_cache_size', DEFAULT_MAX_ENTRIES))
+                except Exception as e:
+                    log.warn('Could not read vulnerability report cache size from config, using default {}. Error: {}'.format(DEFAULT_MAX_ENTRIES, e))
+
+                log.info('Initializing vulnerability report cache with max entries: {}'.format(max_entries))
+                _cache = VulnerabilityReportCache(max_entries=max_entries)
+
+    return _cache
+
+
+def record_metrics(hit):
+    """
+    Export the outcome of a report cache lookup to the metrics registry
+
+    """
+    anchore_engine.subsys.metrics.counter_inc('anchore_vulnerability_report_cache_hits' if hit else 'anchore_vulnerability_report_cache_misses')
+    anchore_engine.subsys.metrics.gauge_set('anchore_vulnerability_report_cache_size', get_report_cache().size())
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Evaluate an If-None-Match header value against the current ETag of a report
+
+    :param if_none_match: the header value, a comma-separated list of ETags or '*', may be None
+    :param etag: quoted ETag string
+    :return: True if the caller already has the current report
+    """
+    if not if_none_match:
+        return False
+
+    candidates = [x.strip() for x in if_none_match.split(',')]
+    # Weak comparison, as the report body is the same for the same stamp regardless of encoding
+    return '*' in candidates or etag in candidates or 'W/' + etag in candidates
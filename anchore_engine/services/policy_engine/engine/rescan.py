@@ -0,0 +1,182 @@
+"""
+Parallel rescans of image vulnerability matches.
+
+After a feed sync, images loaded while the sync was in progress must be rescanned since their matches may have been computed
+against data prior to the sync. The rescanner fetches the ids of those images in chunks and hands each chunk to a pool of worker
+threads. Each worker uses its own thread-scoped db session and commits per image so progress is incremental, and failed images
+are retried with exponential backoff.
+
+Progress, throughput, and failures are logged and exported as metrics.
+
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sqlalchemy import tuple_
+
+import anchore_engine.subsys.metrics
+from anchore_engine.configuration import localconfig
+from anchore_engine.db import get_thread_scoped_session as get_session, end_session, Image
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+from anchore_engine.services.policy_engine.engine.vulnerabilities import rescan_image
+
+log = get_logger()
+
+DEFAULT_WORKERS = 4
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF_SEC = 1.0
+
+
+class ImageRescanner(object):
+    """
+    Rescans the vulnerabilities of images with a pool of worker threads.
+
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, max_retries=DEFAULT_MAX_RETRIES, retry_backoff_sec=DEFAULT_RETRY_BACKOFF_SEC):
+        self.workers = max(int(workers), 1)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.max_retries = max(int(max_retries), 1)
+        self.retry_backoff_sec = retry_backoff_sec
+
+    @classmethod
+    def from_config(cls):
+        """
+        Build a rescanner using the service config.
+
+        Config: services.policy_engine.vulnerabilities.rescan_workers, rescan_chunk_size, and rescan_max_retries
+
+        :return: ImageRescanner
+        """
+        try:
+            config = localconfig.get_config().get('services', {}).get('policy_engine', {}).get('vulnerabilities', {})
+            return ImageRescanner(workers=config.get('rescan_workers', DEFAULT_WORKERS),
+                                  chunk_size=config.get('rescan_chunk_size', DEFAULT_CHUNK_SIZE),
+                                  max_retries=config.get('rescan_max_retries', DEFAULT_MAX_RETRIES))
+        except Exception as e:
+            log.warn('Could not read image rescan config, using defaults. Error: {}'.format(e))
+            return ImageRescanner()
+
+    def rescan_images_created_between(self, from_time, to_time):
+        """
+        Rescan all images created in the given interval.
+
+        :param from_time:
+        :param to_time:
+        :return: count of rescanned images
+        """
+        start_time = time.time()
+        results = {'success': 0, 'missing': 0, 'fail': 0}
+        queued = 0
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for chunk in self._image_id_chunks(from_time, to_time):
+                queued += len(chunk)
+                pending.add(executor.submit(self._rescan_chunk, chunk))
+
+                # Keep at most a couple of chunks per worker in flight so the ids held in memory are bounded
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done, results, queued, start_time)
+
+            done, pending = wait(pending)
+            self._collect(done, results, queued, start_time)
+
+        elapsed = time.time() - start_time
+        rate = results['success'] / elapsed if elapsed > 0 else 0.0
+        anchore_engine.subsys.metrics.gauge_set('anchore_image_rescan_images_per_second', rate)
+        log.info('Rescanned {} images in {:.2f} sec ({:.2f} images/sec) with {} workers. Not found: {}, failed: {}'.format(results['success'], elapsed, rate, self.workers, results['missing'], results['fail']))
+
+        return results['success']
+
+    def _image_id_chunks(self, from_time, to_time):
+        """
+        Yields lists of (id, user_id) tuples for images created in the interval, fetching chunk_size ids per query.
+
+        """
+        last = None
+        while True:
+            db = get_session()
+            try:
+                # it is critical that these tuples are in proper index order for the primary key of the Images object so that subsequent get() operation works
+                qry = db.query(Image.id, Image.user_id).filter(Image.created_at >= from_time, Image.created_at <= to_time)
+                if last is not None:
+                    qry = qry.filter(tuple_(Image.id, Image.user_id) > tuple_(*last))
+                chunk = [(x.id, x.user_id) for x in qry.order_by(Image.id, Image.user_id).limit(self.chunk_size)]
+            finally:
+                db.rollback()
+
+            if not chunk:
+                return
+
+            log.debug('Queueing images for rescan: {}'.format(' ,'.join([str(x) for x in chunk])))
+            yield chunk
+
+            if len(chunk) < self.chunk_size:
+                return
+
+            last = chunk[-1]
+
+    def _collect(self, done, results, queued, start_time):
+        for future in done:
+            try:
+                for status, count in future.result().items():
+                    results[status] += count
+            except Exception as e:
+                log.exception('Unexpected error in image rescan worker')
+
+        completed = sum(results.values())
+        elapsed = time.time() - start_time
+        log.info('Image rescan progress: {} of {} queued images processed, {} failures, {:.2f} images/sec'.format(completed, queued, results['fail'], completed / elapsed if elapsed > 0 else 0.0))
+
+    def _rescan_chunk(self, chunk):
+        """
+        Worker entry point. Rescans each image in the chunk using this thread's session.
+
+        :param chunk: list of (id, user_id) tuples
+        :return: dict of status -> count
+        """
+        results = {'success': 0, 'missing': 0, 'fail': 0}
+        try:
+            for img in chunk:
+                results[self._rescan_one(img)] += 1
+        finally:
+            end_session()
+
+        return results
+
+    def _rescan_one(self, img):
+        """
+        Rescan a single image in a new transaction, retrying with exponential backoff on failure.
+
+        :param img: (id, user_id) tuple
+        :return: status string, one of 'success', 'missing', or 'fail'
+        """
+        for attempt in range(self.max_retries):
+            timer = time.time()
+            db = get_session()
+            try:
+                # If the type or ordering of 'img' tuple changes, this needs to be updated as it relies on symmetry of that tuple and the identity key of the Image entity
+                image_obj = db.query(Image).get(img)
+                if not image_obj:
+                    log.warn('Failed to lookup image with tuple: {}'.format(str(img)))
+                    anchore_engine.subsys.metrics.counter_inc('anchore_image_rescans_total', status='missing')
+                    return 'missing'
+
+                log.info('Rescanning image {} post-vuln sync'.format(img))
+                rescan_image(image_obj, db_session=db)
+                db.commit()
+
+                anchore_engine.subsys.metrics.histogram_observe('anchore_image_rescan_time_seconds', time.time() - timer)
+                anchore_engine.subsys.metrics.counter_inc('anchore_image_rescans_total', status='success')
+                return 'success'
+            except Exception as e:
+                log.exception('Caught exception updating vulnerability scan results for image {} on attempt {} of {}'.format(img, attempt + 1, self.max_retries))
+                db.rollback()
+                if attempt + 1 < self.max_retries:
+                    time.sleep(self.retry_backoff_sec * (2 ** attempt))
+
+        anchore_engine.subsys.metrics.counter_inc('anchore_image_rescans_total', status='fail')
+        return 'fail'
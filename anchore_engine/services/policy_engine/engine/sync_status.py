@@ -0,0 +1,218 @@
+"""
+Live progress and throughput of feed syncs.
+
+The feed sync pipeline reports each stage to the process-wide FeedSyncStatus: groups queued, started, and finished, pages fetched,
+records merged, and image match updates. Each report is exported as a metric and also kept in memory, so the progress of a running sync
+can be served by the api along with an estimate of its remaining time based on how long each group took to sync the previous time.
+
+Progress is per process, it covers the syncs run by this policy engine instance.
+
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+import anchore_engine.subsys.metrics
+
+PENDING = 'pending'
+SYNCING = 'syncing'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+
+class GroupSyncStatus(object):
+    def __init__(self, feed, group):
+        self.feed = feed
+        self.group = group
+        self.state = PENDING
+        self.started_at = None
+        self.finished_at = None
+        self.pages = 0
+        self.records_fetched = 0
+        self.records_merged = 0
+        self.merge_seconds = 0.0
+        self.match_update_seconds = 0.0
+        self.images_updated = 0
+
+    def elapsed(self, now):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at if self.finished_at is not None else now) - self.started_at
+
+    def records_per_second(self, now):
+        elapsed = self.elapsed(now)
+        return self.records_merged / elapsed if elapsed > 0 else 0.0
+
+    def to_json(self, now):
+        return {
+            'feed': self.feed,
+            'group': self.group,
+            'state': self.state,
+            'started_at': _timestamp(self.started_at),
+            'finished_at': _timestamp(self.finished_at),
+            'elapsed_seconds': self.elapsed(now),
+            'pages_fetched': self.pages,
+            'records_fetched': self.records_fetched,
+            'records_merged': self.records_merged,
+            'records_per_second': self.records_per_second(now),
+            'merge_seconds': self.merge_seconds,
+            'match_update_seconds': self.match_update_seconds,
+            'images_updated': self.images_updated
+        }
+
+
+class FeedSyncStatus(object):
+    """
+    Tracks the groups of the current or most recent feed sync, and the duration of the last successful sync of each group for estimates.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sync_type = None
+        self.started_at = None
+        self.finished_at = None
+        self.groups = OrderedDict()
+        self.last_durations = {}
+
+    def sync_started(self, sync_type):
+        """
+        Start tracking a new sync, dropping the progress of the previous one
+
+        :param sync_type: str description of the sync, e.g. 'incremental' or 'bulk'
+        """
+        with self._lock:
+            self.sync_type = sync_type
+            self.started_at = time.time()
+            self.finished_at = None
+            self.groups = OrderedDict()
+
+    def sync_finished(self):
+        with self._lock:
+            self.finished_at = time.time()
+
+    def groups_queued(self, feed, group_names):
+        with self._lock:
+            for name in group_names:
+                self.groups[(feed, name)] = GroupSyncStatus(feed, name)
+
+    def group_started(self, feed, group):
+        with self._lock:
+            status = self._group(feed, group)
+            status.state = SYNCING
+            status.started_at = time.time()
+            status.finished_at = None
+
+        anchore_engine.subsys.metrics.gauge_set('anchore_feed_sync_in_progress', 1, feed=feed, group=group)
+
+    def group_finished(self, feed, group, success=True):
+        with self._lock:
+            status = self._group(feed, group)
+            status.state = COMPLETE if success else FAILED
+            status.finished_at = time.time()
+            if success:
+                self.last_durations[(feed, group)] = status.elapsed(status.finished_at)
+            rate = status.records_per_second(status.finished_at)
+
+        anchore_engine.subsys.metrics.gauge_set('anchore_feed_sync_in_progress', 0, feed=feed, group=group)
+        anchore_engine.subsys.metrics.gauge_set('anchore_feed_sync_records_per_second', rate, feed=feed, group=group)
+        anchore_engine.subsys.metrics.counter_inc('anchore_feed_group_syncs_total', feed=feed, group=group, status=status.state)
+
+    def page_fetched(self, feed, group, record_count):
+        with self._lock:
+            status = self._group(feed, group)
+            status.pages += 1
+            status.records_fetched += record_count
+
+        anchore_engine.subsys.metrics.counter_inc('anchore_feed_sync_pages_total', feed=feed, group=group)
+        anchore_engine.subsys.metrics.counter_inc('anchore_feed_sync_records_fetched_total', record_count, feed=feed, group=group)
+
+    def records_merged(self, feed, group, record_count, seconds):
+        with self._lock:
+            status = self._group(feed, group)
+            status.records_merged += record_count
+            status.merge_seconds += seconds
+
+        anchore_engine.subsys.metrics.counter_inc('anchore_feed_sync_records_merged_total', record_count, feed=feed, group=group)
+        anchore_engine.subsys.metrics.histogram_observe('anchore_feed_sync_merge_time_seconds', seconds, feed=feed, group=group)
+
+    def match_updated(self, group, seconds, image_count):
+        """
+        Record an image match update for vulnerabilities of the group. The feed is looked up from the group being synced since the
+        match update callbacks only know the group (i.e. the vulnerability namespace).
+
+        """
+        with self._lock:
+            status = next((x for x in self.groups.values() if x.group == group and x.state == SYNCING), None)
+            if status is None:
+                return
+            status.match_update_seconds += seconds
+            status.images_updated += image_count
+            feed = status.feed
+
+        anchore_engine.subsys.metrics.histogram_observe('anchore_feed_sync_match_update_time_seconds', seconds, feed=feed, group=group)
+        anchore_engine.subsys.metrics.counter_inc('anchore_feed_sync_images_updated_total', image_count, feed=feed, group=group)
+
+    def status(self):
+        """
+        :return: json-serializable dict of the progress of the current or most recent sync
+        """
+        now = time.time()
+        with self._lock:
+            groups = list(self.groups.values())
+            remaining = self._estimate_remaining(groups, now)
+
+            in_progress = self.started_at is not None and self.finished_at is None
+            return {
+                'sync_type': self.sync_type,
+                'in_progress': in_progress,
+                'started_at': _timestamp(self.started_at),
+                'finished_at': _timestamp(self.finished_at),
+                'elapsed_seconds': ((self.finished_at if self.finished_at is not None else now) - self.started_at) if self.started_at is not None else 0.0,
+                'groups_total': len(groups),
+                'groups_completed': len([x for x in groups if x.state in [COMPLETE, FAILED]]),
+                'groups_syncing': ['{}/{}'.format(x.feed, x.group) for x in groups if x.state == SYNCING],
+                'estimated_remaining_seconds': remaining if in_progress else 0.0,
+                'estimated_completion': _timestamp(now + remaining) if in_progress and remaining is not None else None,
+                'groups': [x.to_json(now) for x in groups]
+            }
+
+    def _estimate_remaining(self, groups, now):
+        """
+        Sum of the expected remaining time of each unfinished group, expecting each to take as long as its previous sync, or the average
+        of the known durations for groups never synced before. Groups synced concurrently make this an upper bound.
+
+        :return: float seconds or None if there is nothing to base an estimate on
+        """
+        if not self.last_durations:
+            return None
+
+        average = sum(self.last_durations.values()) / len(self.last_durations)
+        remaining = 0.0
+        for status in groups:
+            if status.state in [COMPLETE, FAILED]:
+                continue
+
+            expected = self.last_durations.get((status.feed, status.group), average)
+            remaining += max(expected - status.elapsed(now), 0.0)
+
+        return remaining
+
+    def _group(self, feed, group):
+        status = self.groups.get((feed, group))
+        if status is None:
+            status = GroupSyncStatus(feed, group)
+            self.groups[(feed, group)] = status
+        return status
+
+
+def _timestamp(epoch_seconds):
+    return datetime.datetime.utcfromtimestamp(epoch_seconds).isoformat() + 'Z' if epoch_seconds is not None else None
+
+
+_sync_status = FeedSyncStatus()
+
+
+def get_sync_status():
+    return _sync_status
@@ -10,15 +10,20 @@ import time
 import urllib.request, urllib.parse, urllib.error
 
 
-from anchore_engine.db import get_thread_scoped_session as get_session, Image, end_session
+from anchore_engine.db import get_thread_scoped_session as get_session, Image, end_session, DistroNamespace
 from anchore_engine.services.policy_engine.engine.logs import get_logger
 from anchore_engine.services.policy_engine.engine.loaders import ImageLoader
 from anchore_engine.services.policy_engine.engine.exc import *
-from anchore_engine.services.policy_engine.engine.vulnerabilities import vulnerabilities_for_image, find_vulnerable_image_packages, ImagePackageVulnerability, rescan_image
+from anchore_engine.services.policy_engine.engine.vulnerabilities import vulnerabilities_for_image, find_vulnerable_image_packages, ImagePackageVulnerability, rescan_image, update_vulnerability_matches, \
+    match_image_cpes, update_cpe_vulnerability_matches
 
 from anchore_engine.clients.services.catalog import CatalogClient
 from anchore_engine.clients.services import internal_client_for
 from anchore_engine.services.policy_engine.engine.feeds import DataFeeds, get_selected_feeds_to_sync
+from anchore_engine.services.policy_engine.engine.rescan import ImageRescanner
+from anchore_engine.services.policy_engine.engine.sync_status import get_sync_status
+from anchore_engine.services.policy_engine.engine.vulnerability_summary import update_vulnerability_summaries, images_with_matches, mark_summaries_stale
+from anchore_engine.services.policy_engine.engine import match_cache, fix_index
 from anchore_engine.configuration import localconfig
 from anchore_engine.clients.services.simplequeue import run_target_with_lease, LeaseAcquisitionFailedError
 from anchore_engine.subsys.events import FeedSyncStart, FeedSyncComplete, FeedSyncFail
@@ -114,6 +119,10 @@ class FeedsFlushTask(IAsyncTask):
             f = DataFeeds.instance()
             f.flush()
             db.commit()
+            match_cache.get_match_cache().flush()
+            DistroNamespace.vulnerability_namespaces.invalidate()
+            if fix_index.get_fix_index():
+                fix_index.get_fix_index().flush()
         except:
             log.exception('Error executing feeds flush task')
             raise
@@ -212,7 +221,9 @@ class FeedsUpdateTask(IAsyncTask):
             start_time = datetime.datetime.utcnow()
 
             f.vuln_fn = FeedsUpdateTask.process_updated_vulnerability
+            f.vuln_page_fn = FeedsUpdateTask.process_updated_vulnerabilities
             f.vuln_flush_fn = FeedsUpdateTask.flush_vulnerability_matches
+            f.nvd_page_fn = FeedsUpdateTask.process_updated_nvd_records
 
             updated_dict = f.sync(to_sync=self.feeds, full_flush=self.full_flush)
 
@@ -237,7 +248,8 @@ class FeedsUpdateTask(IAsyncTask):
         If this was a vulnerability update (e.g. timestamps vuln feeds lies in that interval), then look for any images that were loaded in that interval and
         re-scan the cves for those to ensure that no ordering of transactions caused cves to be missed for an image.
 
-        This is an alternative to a blocking approach by which image loading is blocked during feed syncs.
+        This is an alternative to a blocking approach by which image loading is blocked during feed syncs. Images are rescanned in
+        parallel by an ImageRescanner configured from the service config.
 
         :param from_time:
         :param to_time:
@@ -248,44 +260,7 @@ class FeedsUpdateTask(IAsyncTask):
             raise ValueError('Cannot process None timestamp')
 
         log.info('Rescanning images loaded between {} and {}'.format(from_time.isoformat(), to_time.isoformat()))
-        count = 0
-
-        db = get_session()
-        try:
-            # it is critical that these tuples are in proper index order for the primary key of the Images object so that subsequent get() operation works
-            imgs = [(x.id, x.user_id) for x in db.query(Image).filter(Image.created_at >= from_time, Image.created_at <= to_time)]
-            log.info('Detected images: {} for rescan'.format(' ,'.join([str(x) for x in imgs])))
-        finally:
-            db.rollback()
-
-
-        retry_max = 3
-        for img in imgs:
-            for i in range(retry_max):
-                try:
-                    # New transaction for each image to get incremental progress
-                    db = get_session()
-                    try:
-                        # If the type or ordering of 'img' tuple changes, this needs to be updated as it relies on symmetry of that tuple and the identity key of the Image entity
-                        image_obj = db.query(Image).get(img)
-                        if image_obj:
-                            log.info('Rescanning image {} post-vuln sync'.format(img))
-                            vulns = rescan_image(image_obj, db_session=db)
-                            count += 1
-                        else:
-                            log.warn('Failed to lookup image with tuple: {}'.format(str(img)))
-
-                        db.commit()
-
-                    finally:
-                        db.rollback()
-
-                    break
-                except Exception as e:
-                    log.exception('Caught exception updating vulnerability scan results for image {}. Waiting and retrying'.format(img))
-                    time.sleep(5)
-
-        return count
+        return ImageRescanner.from_config().rescan_images_created_between(from_time, to_time)
 
     @staticmethod
     def flush_vulnerability_matches(db, feed_name=None, group_name=None):
@@ -297,8 +272,10 @@ class FeedsUpdateTask(IAsyncTask):
         :return:
         """
 
+        affected_images = images_with_matches(db, group_name)
         count = db.query(ImagePackageVulnerability).filter(ImagePackageVulnerability.vulnerability_namespace_name == group_name).delete()
         log.info('Deleted {} rows in flush for group {}'.format(count, group_name))
+        mark_summaries_stale(db, affected_images)
 
 
     @staticmethod
@@ -312,11 +289,15 @@ class FeedsUpdateTask(IAsyncTask):
         :return: list of (user_id, image_id) that were affected
         """
         log.spew('Processing CVE update for: {}'.format(vulnerability.id))
+        timer = time.time()
         changed_images = []
 
         # Find any packages already matched with the CVE ID.
         current_affected = vulnerability.current_package_vulnerabilities(db)
 
+        # The summaries of images already matched may change even if their matches don't, e.g. on a severity update
+        summary_images = {(x.pkg_user_id, x.pkg_image_id) for x in current_affected}
+
         # May need to remove vuln from some packages.
         if vulnerability.is_empty():
             log.spew('Detected an empty CVE. Removing all existing matches on this CVE')
@@ -329,6 +310,7 @@ class FeedsUpdateTask(IAsyncTask):
                     log.debug('Removing match on image: {}/{}'.format(pkgVuln.pkg_user_id, pkgVuln.pkg_image_id))
                     db.delete(pkgVuln)
                     changed_images.append((pkgVuln.pkg_user_id, pkgVuln.pkg_image_id))
+                db.flush()
         else:
             # Find impacted images for the current vulnerability
             new_vulnerable_packages = [ImagePackageVulnerability.from_pair(x, vulnerability) for x in find_vulnerable_image_packages(vulnerability)]
@@ -358,10 +340,70 @@ class FeedsUpdateTask(IAsyncTask):
 
             db.flush()
 
+        mark_summaries_stale(db, summary_images.union(changed_images))
+
         log.spew('Images changed for cve {}: {}'.format(vulnerability.id, changed_images))
+        get_sync_status().match_updated(vulnerability.namespace_name, time.time() - timer, len(changed_images))
 
         return changed_images
 
+    @staticmethod
+    def process_updated_vulnerabilities(db, vulnerabilities):
+        """
+        Page-level equivalent of process_updated_vulnerability(), updates the vulnerability matches for all the given vulnerabilities using
+        set-based matching and bulk statements. This function will not commit, the caller is expected to manage the session lifecycle.
+
+        :param db: The db session to use, should be valid and open
+        :param vulnerabilities: list of updated vulnerability objects
+        :return: list of (user_id, image_id) that were affected
+        """
+        log.debug('Processing CVE updates for {} vulnerabilities'.format(len(vulnerabilities)))
+        timer = time.time()
+
+        added, removed = update_vulnerability_matches(vulnerabilities, db_session=db)
+        changed_images = list({(key[0], key[1]) for key in added.union(removed)})
+
+        # Images keeping their matches need new summaries too if the severity or fixes of a vulnerability changed
+        ids_by_namespace = {}
+        for vulnerability in vulnerabilities:
+            ids_by_namespace.setdefault(vulnerability.namespace_name, []).append(vulnerability.id)
+
+        summary_images = set(changed_images)
+        for namespace_name, vulnerability_ids in ids_by_namespace.items():
+            summary_images.update(images_with_matches(db, namespace_name, vulnerability_ids))
+        mark_summaries_stale(db, summary_images)
+
+        log.debug('Added {} and removed {} vulnerability matches, {} images changed'.format(len(added), len(removed), len(changed_images)))
+        if vulnerabilities:
+            # Vulnerabilities are processed a page of a single group at a time
+            get_sync_status().match_updated(vulnerabilities[0].namespace_name, time.time() - timer, len(changed_images))
+
+        return changed_images
+
+    @staticmethod
+    def process_updated_nvd_records(db, nvd_records):
+        """
+        Update the persisted image cpe matches of the cpe vulnerabilities of the given nvd records. This function will not commit, the
+        caller is expected to manage the session lifecycle.
+
+        :param db: The db session to use, should be valid and open
+        :param nvd_records: list of merged NvdMetadata objects
+        :return: list of (user_id, image_id) that were affected
+        """
+        ids_by_namespace = {}
+        for record in nvd_records:
+            ids_by_namespace.setdefault(record.namespace_name, []).append(record.name)
+
+        changed_images = set()
+        for namespace_name, vulnerability_ids in ids_by_namespace.items():
+            timer = time.time()
+            images = update_cpe_vulnerability_matches(namespace_name, vulnerability_ids, db_session=db)
+            get_sync_status().match_updated(namespace_name, time.time() - timer, len(images))
+            changed_images.update(images)
+
+        log.debug('Updated cpe matches for {} nvd records, {} images changed'.format(len(nvd_records), len(changed_images)))
+        return list(changed_images)
+
     @classmethod
     def from_json(cls, json_obj):
         if not json_obj.get('task_type') == cls.__task_name__:
@@ -470,6 +512,13 @@ class ImageLoadTask(IAsyncTask):
                 for vuln in vulns:
                     db.add(vuln)
 
+                log.info("Adding image cpe vulnerabilities to db")
+                db.flush()
+                match_image_cpes(image_obj, db)
+
+                log.info("Adding image vulnerability summary to db")
+                update_vulnerability_summaries(db, [(image_obj.user_id, image_obj.id)])
+
                 db.commit()
             except:
                 log.exception('Error adding image to db')
@@ -11,23 +11,30 @@ work the way they do and often the behavior is a result of the range of cleanlin
 
 """
 
-from sqlalchemy import or_
+import datetime
+
+from sqlalchemy import or_, tuple_
 
 from anchore_engine.db import DistroNamespace, get_thread_scoped_session
-from anchore_engine.db import Vulnerability, FixedArtifact, ImagePackage, ImagePackageVulnerability
+from anchore_engine.db import Vulnerability, FixedArtifact, ImagePackage, ImagePackageVulnerability, FeedGroupMetadata
+from anchore_engine.db import ImageCpe, CpeVulnerability, ImageCpeVulnerability
 from anchore_engine.common import nonos_package_types, os_package_types
 
 from .feeds import DataFeeds, VulnerabilityFeed
 from .logs import get_logger
+from .match_cache import get_match_cache, match_key, MatchedFix, record_metrics as record_match_cache_metrics
+from .fix_index import get_fix_index, parse_version
+from .vulnerability_summary import update_vulnerability_summaries
 from anchore_engine.util.apk import compare_versions as apkg_compare_versions
 from anchore_engine.util.deb import compare_versions as dpkg_compare_versions
 from anchore_engine.util.rpm import compare_versions as rpm_compare_versions
 from anchore_engine.util.semver import compare_versions as semver_compare_versions
+from anchore_engine.util.packages import version_key_flavors
 
 log = get_logger()
 
-# TODO: introduce a match cache for the fix key and package key to optimize the lookup and updates since its common to
-# see a lot of images with the same versions of packages installed.
+# Max number of names in a single IN clause when fetching match candidates in bulk
+MATCH_QUERY_BATCH_SIZE = 500
 
 
 def have_vulnerabilities_for(distro_namespace_obj):
@@ -63,16 +70,14 @@ def namespace_has_no_feed(name, version):
     return not VulnerabilityFeed.cached_group_name_lookup(name + ':' + version)
 
 
-def find_vulnerable_image_packages(vulnerability_obj):
+def _reverse_match_scope(namespace_name):
     """
-    Given a vulnerability object, find images that are affected via their package manifests.
-    Result may have duplicates based on match type, caller must de-dup if desired.
+    Determine which image packages may be affected by vulnerabilities in the given namespace.
 
-    :param vulnerability_obj:
-    :return: list of ImagePackage objects
+    :param namespace_name: the vulnerability namespace name
+    :return: tuple of (DistroNamespace, list of related distro names, like-pattern for non-os package types or None)
     """
-    db = get_thread_scoped_session()
-    distro, version = vulnerability_obj.namespace_name.split(':', 1)
+    distro, version = namespace_name.split(':', 1)
     dist = DistroNamespace(distro, version)
     related_names = dist.mapped_names() # Returns list of names that map to this one, not including itself necessarily
 
@@ -91,15 +96,29 @@ def find_vulnerable_image_packages(vulnerability_obj):
 
     # TODO would like a better way to do the pkg_type <-> namespace_name mapping, with other side in ImagePackage.vulnerabilities_for_package
     likematch = None
-    if ':maven' in vulnerability_obj.namespace_name or 'java' in vulnerability_obj.namespace_name:
+    if ':maven' in namespace_name or 'java' in namespace_name:
         likematch = 'java'
-    elif ':ruby' in vulnerability_obj.namespace_name or 'gem' in vulnerability_obj.namespace_name:
+    elif ':ruby' in namespace_name or 'gem' in namespace_name:
         likematch = 'gem'
-    elif ':js' in vulnerability_obj.namespace_name or 'npm' in vulnerability_obj.namespace_name:
+    elif ':js' in namespace_name or 'npm' in namespace_name:
         likematch = 'npm'
-    elif 'python' in vulnerability_obj.namespace_name:
+    elif 'python' in namespace_name:
         likematch = 'python'
 
+    return dist, related_names, likematch
+
+
+def find_vulnerable_image_packages(vulnerability_obj):
+    """
+    Given a vulnerability object, find images that are affected via their package manifests.
+    Result may have duplicates based on match type, caller must de-dup if desired.
+
+    :param vulnerability_obj:
+    :return: list of ImagePackage objects
+    """
+    db = get_thread_scoped_session()
+    dist, related_names, likematch = _reverse_match_scope(vulnerability_obj.namespace_name)
+
     try:
         affected = []
         if vulnerability_obj.fixed_in:
@@ -108,7 +127,11 @@ def find_vulnerable_image_packages(vulnerability_obj):
                 package_candidates = []
 
                 # Find packages of related distro names with compatible versions, this does not have to be precise, just an initial filter.
-                pkgs = db.query(ImagePackage).filter(ImagePackage.distro_name.in_(related_names), ImagePackage.distro_version.like(dist.version + '%'), or_(ImagePackage.name == fix_rec.name, ImagePackage.normalized_src_pkg == fix_rec.name)).all()
+                qry = db.query(ImagePackage).filter(ImagePackage.distro_name.in_(related_names), ImagePackage.distro_version.like(dist.version + '%'), or_(ImagePackage.name == fix_rec.name, ImagePackage.normalized_src_pkg == fix_rec.name))
+                if fix_rec.version_key is not None and version_key_flavors.get(fix_rec.version_format) == dist.flavor:
+                    # Exclude packages already at or past the fix version in the db. Packages without a key are left for the full check below.
+                    qry = qry.filter(or_(ImagePackage.version_key == None, ImagePackage.version_key < fix_rec.version_key))
+                pkgs = qry.all()
                 package_candidates += pkgs
 
                 # add non distro candidates
@@ -140,6 +163,269 @@ def find_vulnerable_image_packages(vulnerability_obj):
         raise
 
 
+def _chunks(items, size):
+    """
+    Yields successive lists of at most size elements from the given list
+    """
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _packages_by_name(db, names, *criteria):
+    """
+    Fetch the ImagePackage records whose binary or source package name is one of the given names, in as few queries as possible.
+
+    :param db: the db session to use
+    :param names: iterable of package names
+    :param criteria: additional filter criteria for the ImagePackage query
+    :return: dict mapping name -> list of ImagePackage records, a package is listed under both its name and its source package name
+    """
+    found = {}
+    names = sorted(set([x for x in names if x]))
+
+    for chunk in _chunks(names, MATCH_QUERY_BATCH_SIZE):
+        qry = db.query(ImagePackage).filter(or_(ImagePackage.name.in_(chunk), ImagePackage.normalized_src_pkg.in_(chunk)), *criteria)
+        for package in qry:
+            found.setdefault(package.name, []).append(package)
+            if package.normalized_src_pkg and package.normalized_src_pkg != package.name:
+                found.setdefault(package.normalized_src_pkg, []).append(package)
+
+    return found
+
+
+def find_vulnerable_image_packages_for_page(vulnerabilities):
+    """
+    Page-level equivalent of find_vulnerable_image_packages(). Candidate packages for all the fix records of the given vulnerabilities
+    are fetched with one batched query per namespace rather than one or two per fix record, and version comparisons are done in memory.
+
+    :param vulnerabilities: list of Vulnerability objects, typically the records changed in a single feed page
+    :return: dict mapping (vulnerability id, namespace name) -> list of affected ImagePackage objects, empty for vulnerabilities without fixes
+    """
+    db = get_thread_scoped_session()
+    affected = {}
+    by_namespace = {}
+
+    for vulnerability in vulnerabilities:
+        affected[(vulnerability.id, vulnerability.namespace_name)] = []
+        if vulnerability.fixed_in:
+            by_namespace.setdefault(vulnerability.namespace_name, []).append(vulnerability)
+
+    try:
+        for namespace_name, namespace_vulnerabilities in by_namespace.items():
+            dist, related_names, likematch = _reverse_match_scope(namespace_name)
+            names = [fix_rec.name for vulnerability in namespace_vulnerabilities for fix_rec in vulnerability.fixed_in]
+
+            # Same initial filter as the per-vulnerability query, precise checks are done per fix record below
+            os_candidates = _packages_by_name(db, names, ImagePackage.distro_name.in_(related_names), ImagePackage.distro_version.like(dist.version + '%'))
+            if likematch:
+                nonos_candidates = _packages_by_name(db, names, ImagePackage.pkg_type.in_(nonos_package_types), ImagePackage.pkg_type.like(likematch))
+            else:
+                nonos_candidates = {}
+
+            for vulnerability in namespace_vulnerabilities:
+                found = affected[(vulnerability.id, vulnerability.namespace_name)]
+                for fix_rec in vulnerability.fixed_in:
+                    for candidate in os_candidates.get(fix_rec.name, []):
+                        if not _excluded_by_version_key(candidate, fix_rec, dist.flavor) and fix_rec.match_but_not_fixed(candidate):
+                            found.append(candidate)
+
+                    for candidate in nonos_candidates.get(fix_rec.name, []):
+                        if fix_rec.match_but_not_fixed(candidate):
+                            found.append(candidate)
+
+        return affected
+    except Exception as e:
+        log.exception('Failed to query and find packages affected by vulnerabilities in page')
+        raise
+
+
+def _fixes_by_name(db, names, namespace_name=None, likematch=None):
+    """
+    Fetch all FixedArtifact records for the given set of package names in as few queries as possible.
+
+    :param db: the db session to use
+    :param names: iterable of package names (binary or source names)
+    :param namespace_name: exact namespace to match, for os packages
+    :param likematch: namespace like-pattern to match semver records, for non-os packages
+    :return: dict mapping name -> list of FixedArtifact records
+    """
+    found = {}
+    names = sorted(set([x for x in names if x]))
+
+    for chunk in _chunks(names, MATCH_QUERY_BATCH_SIZE):
+        qry = db.query(FixedArtifact).filter(FixedArtifact.name.in_(chunk))
+        if namespace_name is not None:
+            qry = qry.filter(FixedArtifact.namespace_name == namespace_name)
+        if likematch is not None:
+            qry = qry.filter(FixedArtifact.version_format == 'semver', FixedArtifact.namespace_name.like(likematch))
+
+        for fix in qry:
+            found.setdefault(fix.name, []).append(fix)
+
+    return found
+
+
+def _excluded_by_version_key(package, fix, flavor):
+    """
+    Check the package and fix version keys, if both have one, to rule out the fix without a full version comparison.
+
+    :param package: ImagePackage
+    :param fix: FixedArtifact or FixRecord
+    :param flavor: the distro flavor of the package
+    :return: True if the keys show the package is not older than the fix, False if the full comparison is needed
+    """
+    if package.version_key is None or fix.version_key is None or package.pkg_type in nonos_package_types:
+        return False
+
+    return version_key_flavors.get(fix.version_format) == flavor and not package.version_key < fix.version_key
+
+
+def _indexed_fixes_by_name(db, fix_index, names, namespace_names, group_stamps, version_format=None):
+    """
+    In-memory equivalent of _fixes_by_name() using the process-wide fix index.
+
+    :param db: the db session to use for loading namespace indexes not yet in memory
+    :param fix_index: the FixIndex
+    :param names: iterable of package names (binary or source names)
+    :param namespace_names: list of namespaces to look in
+    :param group_stamps: dict of feed group name -> last_sync, used to detect stale namespace indexes
+    :param version_format: only return records with this version format if set
+    :return: dict mapping name -> list of FixRecord objects
+    """
+    found = {}
+    names = set([x for x in names if x])
+
+    for namespace_name in namespace_names:
+        ns_index = fix_index.get_namespace(db, namespace_name, last_sync=group_stamps.get(namespace_name))
+        for name in names:
+            for fix in ns_index.get(name):
+                if version_format is None or fix.version_format == version_format:
+                    found.setdefault(name, []).append(fix)
+
+    return found
+
+
+def match_packages(packages):
+    """
+    Set-based equivalent of calling ImagePackage.vulnerabilities_for_package() on each package in the list.
+
+    Packages are grouped by their distro so the namespace resolution is done once per group. Results for package versions already
+    matched in this process are served from the shared match cache. For the rest, the candidate FixedArtifact records for all the
+    package and source package names in a group are fetched in batched queries, or from the in-memory fix index if enabled, and
+    version comparisons are done in memory.
+
+    :param packages: list of ImagePackage objects
+    :return: list of (ImagePackage, [MatchedFix]) tuples, one per package with at least one match, in input order
+    """
+    db = get_thread_scoped_session()
+    cache = get_match_cache()
+    fix_index = get_fix_index()
+    group_stamps = {name: last_sync for name, last_sync in db.query(FeedGroupMetadata.name, FeedGroupMetadata.last_sync)}
+    cache.validate(group_stamps)
+    DistroNamespace.vulnerability_namespaces.validate(group_stamps)
+
+    # Group by distro so namespace resolution happens once per distro rather than once per package
+    distro_groups = {}
+    for package in packages:
+        distro_groups.setdefault((package.distro_name, package.distro_version, package.like_distro), []).append(package)
+
+    distro_namespaces = {}
+    for distro_key, group in distro_groups.items():
+        dist = DistroNamespace(*distro_key)
+        for package in group:
+            package.distro_namespace_meta = dist
+        distro_namespaces[distro_key] = (dist, dist.vulnerability_namespace_name())
+
+    package_matches = {}
+    to_match = []
+    for package in packages:
+        distro_key = (package.distro_name, package.distro_version, package.like_distro)
+        dist, namespace_name = distro_namespaces[distro_key]
+        pkgkey, pkgversion, likematch = package.semver_match_key()
+        if not (pkgkey and pkgversion and likematch):
+            pkgkey = pkgversion = likematch = None
+
+        key = match_key(package, namespace_name, dist.flavor, semver_key=pkgkey, semver_version=pkgversion, semver_namespace_pattern=likematch)
+        found = cache.lookup(key)
+        if found is not None:
+            package_matches[id(package)] = list(found)
+        else:
+            to_match.append((package, key))
+
+    record_match_cache_metrics(hits=len(packages) - len(to_match), misses=len(to_match))
+
+    # Fetch candidates only for the packages not found in the cache
+    semver_names = {}
+    os_names = {}
+    for package, key in to_match:
+        if key.semver_namespace_pattern:
+            semver_names.setdefault(key.semver_namespace_pattern, set()).add(key.semver_key[0])
+        names = os_names.setdefault(key.namespace_name, set())
+        names.add(package.name)
+        names.add(package.normalized_src_pkg)
+
+    semver_fixes = {}
+    for likematch, names in semver_names.items():
+        if fix_index:
+            semver_namespaces = [x for x in group_stamps if likematch.strip('%') in x]
+            semver_fixes[likematch] = _indexed_fixes_by_name(db, fix_index, names, semver_namespaces, group_stamps, version_format='semver')
+        else:
+            semver_fixes[likematch] = _fixes_by_name(db, names, likematch=likematch)
+
+    os_fixes = {}
+    for namespace_name, names in os_names.items():
+        if fix_index:
+            os_fixes[namespace_name] = _indexed_fixes_by_name(db, fix_index, names, [namespace_name], group_stamps)
+        else:
+            os_fixes[namespace_name] = _fixes_by_name(db, names, namespace_name=namespace_name)
+
+    for package, key in to_match:
+        matches = []
+        matched_ids = set()
+
+        if key.semver_namespace_pattern:
+            pkgkey, pkgversion = key.semver_key
+            for candidate in semver_fixes[key.semver_namespace_pattern].get(pkgkey, []):
+                if candidate.vulnerability_id not in matched_ids and semver_compare_versions(candidate.version, pkgversion, language=package.pkg_type):
+                    matches.append(candidate)
+                    matched_ids.add(candidate.vulnerability_id)
+
+        fixes = os_fixes[key.namespace_name]
+        candidates = fixes.get(package.name, [])
+        if package.normalized_src_pkg != package.name:
+            candidates = candidates + fixes.get(package.normalized_src_pkg, [])
+
+        if fix_index and candidates and key.flavor in ['RHEL', 'DEB']:
+            # Parse the package version once for all the candidate comparisons. On parse errors, leave it to the per-fix
+            # comparison so errors surface the same way as without the index
+            try:
+                parsed_version = parse_version(key.flavor, package.name, package.fullversion)
+            except ValueError:
+                parsed_version = None
+        else:
+            parsed_version = None
+
+        for candidate in candidates:
+            # De-dup evaluations based on the underlying vulnerability_id. For packages where src has many binary builds, once we have a match we have a match.
+            if candidate.vulnerability_id in matched_ids or _excluded_by_version_key(package, candidate, key.flavor):
+                continue
+
+            if fix_index:
+                matched = candidate.match_but_not_fixed(package, package_version=parsed_version)
+            else:
+                matched = candidate.match_but_not_fixed(package)
+
+            if matched:
+                matches.append(candidate)
+                matched_ids.add(candidate.vulnerability_id)
+
+        matches = [MatchedFix(vulnerability_id=x.vulnerability_id, namespace_name=x.namespace_name, name=x.name, version=x.version) for x in matches]
+        cache.cache_it(key, matches)
+        package_matches[id(package)] = matches
+
+    return [(package, package_matches[id(package)]) for package in packages if package_matches.get(id(package))]
+
+
 def vulnerabilities_for_image(image_obj):
     """
     Return the list of vulnerabilities for the specified image id by recalculating the matches for the image. Ignores
@@ -153,8 +439,7 @@ def vulnerabilities_for_image(image_obj):
     # Recompute. Session and persistence in the session is up to the caller
     try:
         computed_vulnerabilties = []
-        for package in image_obj.packages:
-            pkg_vulnerabilities = package.vulnerabilities_for_package()
+        for package, pkg_vulnerabilities in match_packages(list(image_obj.packages)):
             for v in pkg_vulnerabilities:
                 img_v = ImagePackageVulnerability()
                 img_v.pkg_image_id = image_obj.id
@@ -195,9 +480,105 @@ def rescan_image(image_obj, db_session):
         db_session.add(v)
     db_session.flush()
 
+    match_image_cpes(image_obj, db_session)
+    update_vulnerability_summaries(db_session, [(image_obj.user_id, image_obj.id)])
+
+    # Marks the image's cached vulnerability reports as stale
+    image_obj.last_modified = datetime.datetime.utcnow()
+
     return vulns
 
 
+def match_image_cpes(image_obj, db_session):
+    """
+    Compute and persist the cpe vulnerability matches of an image's non-os packages, replacing any existing ones. The image and its cpes
+    must already be flushed to the db. Does not commit.
+
+    :param image_obj:
+    :param db_session:
+    :return: number of matches persisted
+    """
+    db_session.query(ImageCpeVulnerability).filter(ImageCpeVulnerability.image_user_id == image_obj.user_id, ImageCpeVulnerability.image_id == image_obj.id).delete(synchronize_session=False)
+    count = ImageCpeVulnerability.insert_matches(db_session, ImageCpe.image_user_id == image_obj.user_id, ImageCpe.image_id == image_obj.id)
+    log.debug('Persisted {} cpe vulnerability matches for {}/{}'.format(count, image_obj.user_id, image_obj.id))
+    return count
+
+
+def update_cpe_vulnerability_matches(namespace_name, vulnerability_ids, db_session):
+    """
+    Bring the persisted image cpe matches of the given cpe vulnerabilities in line with their current data, by deleting their matches
+    and inserting the current ones for every image. Does not commit.
+
+    :param namespace_name: the namespace (nvd feed group) of the vulnerabilities
+    :param vulnerability_ids: list of vulnerability ids to update, or None to update all of the namespace
+    :param db_session:
+    :return: set of (user_id, image_id) of the images that had or now have matches on the vulnerabilities
+    """
+    if vulnerability_ids is None:
+        chunks = [None]
+    else:
+        chunks = _chunks(sorted(set(vulnerability_ids)), MATCH_QUERY_BATCH_SIZE)
+
+    images = set()
+    for chunk in chunks:
+        match_criteria = [ImageCpeVulnerability.vulnerability_namespace_name == namespace_name]
+        vulnerability_criteria = [CpeVulnerability.namespace_name == namespace_name]
+        if chunk is not None:
+            match_criteria.append(ImageCpeVulnerability.vulnerability_id.in_(chunk))
+            vulnerability_criteria.append(CpeVulnerability.vulnerability_id.in_(chunk))
+
+        images.update(tuple(x) for x in db_session.query(ImageCpeVulnerability.image_user_id, ImageCpeVulnerability.image_id).filter(*match_criteria).distinct())
+        db_session.query(ImageCpeVulnerability).filter(*match_criteria).delete(synchronize_session=False)
+        if ImageCpeVulnerability.insert_matches(db_session, *vulnerability_criteria):
+            images.update(tuple(x) for x in db_session.query(ImageCpeVulnerability.image_user_id, ImageCpeVulnerability.image_id).filter(*match_criteria).distinct())
+
+    return images
+
+
+# Columns identifying a match record, in the order of the match keys used by update_vulnerability_matches()
+_match_key_columns = [ImagePackageVulnerability.pkg_user_id, ImagePackageVulnerability.pkg_image_id, ImagePackageVulnerability.pkg_name,
+                      ImagePackageVulnerability.pkg_version, ImagePackageVulnerability.pkg_type, ImagePackageVulnerability.pkg_arch,
+                      ImagePackageVulnerability.pkg_path, ImagePackageVulnerability.vulnerability_id, ImagePackageVulnerability.vulnerability_namespace_name]
+
+
+def update_vulnerability_matches(vulnerabilities, db_session):
+    """
+    Bring the image package matches of the given vulnerabilities in line with their current data. The current and the new matches are
+    computed as sets of keys and the differences applied with bulk delete and insert statements, so no match records are loaded into
+    or tracked by the session. Does not commit.
+
+    :param vulnerabilities: list of Vulnerability objects, typically the records changed in a single feed page
+    :param db_session:
+    :return: tuple of (set of added match keys, set of removed match keys), each key a tuple of values for _match_key_columns
+    """
+    current = set()
+    ids_by_namespace = {}
+    for vulnerability in vulnerabilities:
+        ids_by_namespace.setdefault(vulnerability.namespace_name, set()).add(vulnerability.id)
+
+    for namespace_name, vulnerability_ids in ids_by_namespace.items():
+        for chunk in _chunks(sorted(vulnerability_ids), MATCH_QUERY_BATCH_SIZE):
+            qry = db_session.query(*_match_key_columns).filter(ImagePackageVulnerability.vulnerability_namespace_name == namespace_name, ImagePackageVulnerability.vulnerability_id.in_(chunk))
+            current.update(tuple(row) for row in qry)
+
+    new = set()
+    for (vulnerability_id, namespace_name), packages in find_vulnerable_image_packages_for_page(vulnerabilities).items():
+        for package in packages:
+            new.add((package.image_user_id, package.image_id, package.name, package.version, package.pkg_type, package.arch, package.pkg_path, vulnerability_id, namespace_name))
+
+    removed = current.difference(new)
+    added = new.difference(current)
+
+    for chunk in _chunks(list(removed), MATCH_QUERY_BATCH_SIZE):
+        db_session.query(ImagePackageVulnerability).filter(tuple_(*_match_key_columns).in_(chunk)).delete(synchronize_session=False)
+
+    column_names = [column.key for column in _match_key_columns]
+    for chunk in _chunks(list(added), MATCH_QUERY_BATCH_SIZE):
+        db_session.execute(ImagePackageVulnerability.__table__.insert(), [dict(zip(column_names, key)) for key in chunk])
+
+    return added, removed
+
+
 def delete_matches(namespace_name, db_session):
     """
     Flush all vuln matches for the specified namespace.
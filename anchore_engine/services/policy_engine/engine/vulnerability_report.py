@@ -0,0 +1,110 @@
+"""
+Builds the legacy (table style) vulnerability report of an image.
+
+Each report row reads the matched vulnerability, the matched package and the vulnerability's fix records. Loading those through the
+lazy relationships of each match costs several queries per row, so the matches are loaded together with all three up front and the
+table is then built in a single pass over them.
+
+"""
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload, selectinload
+
+from anchore_engine.db import ImagePackageVulnerability, Vulnerability
+
+TABLE_STYLE_HEADER_LIST = ['CVE_ID', 'Severity', '*Total_Affected', 'Vulnerable_Package', 'Fix_Available', 'Fix_Images', 'Rebuild_Images', 'URL', 'Package_Type', 'Feed', 'Feed_Group', 'Package_Name', 'Package_Version', 'CVES']
+
+
+def load_image_vulnerabilities(db, user_id, image_id):
+    """
+    Load the vulnerability matches of the image with their package, vulnerability and the vulnerability's fixed artifacts. The matches,
+    packages and vulnerabilities are loaded with one joined query and the fixed artifacts with a second one for all the vulnerabilities.
+
+    :param db: the db session
+    :param user_id:
+    :param image_id:
+    :return: list of ImagePackageVulnerability objects
+    """
+    return _eager_query(db).filter(ImagePackageVulnerability.pkg_user_id == user_id, ImagePackageVulnerability.pkg_image_id == image_id).all()
+
+
+def load_vulnerabilities_for_images(db, image_keys):
+    """
+    Multi-image equivalent of load_image_vulnerabilities(), loads the matches of all the given images with the same two queries.
+
+    :param db: the db session
+    :param image_keys: list of (user_id, image_id) tuples
+    :return: list of ImagePackageVulnerability objects
+    """
+    if not image_keys:
+        return []
+
+    return _eager_query(db).filter(tuple_(ImagePackageVulnerability.pkg_user_id, ImagePackageVulnerability.pkg_image_id).in_(list(image_keys))).all()
+
+
+def _eager_query(db):
+    return db.query(ImagePackageVulnerability).options(
+        joinedload(ImagePackageVulnerability.package),
+        joinedload(ImagePackageVulnerability.vulnerability).selectinload(Vulnerability.fixed_in)
+    )
+
+
+def legacy_report_rows(vulnerabilities, vendor_only=False):
+    """
+    Build the rows of the legacy report table, with columns as in TABLE_STYLE_HEADER_LIST.
+
+    :param vulnerabilities: list of ImagePackageVulnerability objects, see load_image_vulnerabilities()
+    :param vendor_only: if true, skip the vulnerabilities that the vendor will explicitly not address
+    :return: list of rows
+    """
+    rows = []
+    for vuln in vulnerabilities:
+        # Skip the vulnerability if the vendor_only flag is set to True and the issue won't be addressed by the vendor
+        if vendor_only and vuln.fix_has_no_advisory():
+            continue
+
+        vulnerability = vuln.vulnerability
+        package = vuln.package
+
+        cves = ''
+        if vulnerability.additional_metadata:
+            cves = ' '.join(vulnerability.additional_metadata.get('cves', []))
+
+        rows.append([
+            vuln.vulnerability_id,
+            vulnerability.severity,
+            1,
+            vuln.pkg_name + '-' + package.fullversion,
+            str(vuln.fixed_in()),
+            vuln.pkg_image_id,
+            'None',  # Always empty this for now
+            vulnerability.link,
+            vuln.pkg_type,
+            'vulnerabilities',
+            vulnerability.namespace_name,
+            vuln.pkg_name,
+            package.fullversion,
+            cves,
+        ])
+
+    return rows
+
+
+def legacy_report(rows, warns=None):
+    """
+    :param rows: report rows from legacy_report_rows()
+    :param warns: list of warning strings to include
+    :return: the legacy report dict
+    """
+    return {
+        'multi': {
+            'url_column_index': 7,
+            'result': {
+                'header': TABLE_STYLE_HEADER_LIST,
+                'rowcount': len(rows),
+                'colcount': len(TABLE_STYLE_HEADER_LIST),
+                'rows': rows
+            },
+            'warns': warns if warns else []
+        }
+    }
@@ -0,0 +1,131 @@
+"""
+Maintains the per-image vulnerability summaries (counts by severity, fixable and vendor won't-fix) in ImageVulnerabilitySummary.
+
+Image loads and rescans recompute the summary of the image within the transaction that changes its matches, so reads never need to
+load the matches. Feed syncs change the matches of the same images many times in one group transaction, so the feed-driven match
+updates and group flushes only mark the affected images stale in the session, and the summaries are recomputed once per image after
+the group transaction commits, see update_stale_summaries().
+
+"""
+import threading
+
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+
+from anchore_engine.db import Image, ImagePackageVulnerability, ImageVulnerabilitySummary
+from anchore_engine.services.policy_engine.engine.logs import get_logger
+from anchore_engine.services.policy_engine.engine.vulnerability_report import load_vulnerabilities_for_images
+
+log = get_logger()
+
+# Images whose matches are loaded together to recompute their summaries
+SUMMARY_BATCH_SIZE = 100
+
+# Session.info key of the images marked stale in the session's transaction
+STALE_SUMMARIES_KEY = 'stale_vulnerability_summaries'
+
+# Serializes the recomputes after concurrent group syncs, so each reads the matches and summaries committed by the earlier ones
+_stale_update_lock = threading.Lock()
+
+
+def update_vulnerability_summaries(db, image_keys):
+    """
+    Recompute the summaries of the given images from their current matches, creating any missing. Keys of images not in the db are
+    ignored. Flushes but does not commit.
+
+    :param db: the db session, with the match changes already flushed
+    :param image_keys: iterable of (user_id, image_id) tuples
+    :return: number of summaries updated
+    """
+    image_keys = sorted(set(image_keys))
+    updated = 0
+
+    for i in range(0, len(image_keys), SUMMARY_BATCH_SIZE):
+        chunk = image_keys[i:i + SUMMARY_BATCH_SIZE]
+
+        present = {tuple(x) for x in db.query(Image.user_id, Image.id).filter(tuple_(Image.user_id, Image.id).in_(chunk))}
+        if not present:
+            continue
+
+        vulns_by_image = {}
+        for vuln in load_vulnerabilities_for_images(db, present):
+            vulns_by_image.setdefault((vuln.pkg_user_id, vuln.pkg_image_id), []).append(vuln)
+
+        summaries = {(x.image_user_id, x.image_id): x for x in db.query(ImageVulnerabilitySummary).filter(tuple_(ImageVulnerabilitySummary.image_user_id, ImageVulnerabilitySummary.image_id).in_(list(present)))}
+
+        for key in present:
+            summary = summaries.get(key)
+            if summary is None:
+                summary = ImageVulnerabilitySummary(image_user_id=key[0], image_id=key[1])
+                db.add(summary)
+
+            summary.set_counts(vulns_by_image.get(key, []))
+            updated += 1
+
+        db.flush()
+
+    log.debug('Updated vulnerability summaries of {} images'.format(updated))
+    return updated
+
+
+def images_with_matches(db, namespace_name, vulnerability_ids=None):
+    """
+    Find the images with matches to vulnerabilities of the namespace, e.g. to update their summaries once those matches change.
+
+    :param db: the db session
+    :param namespace_name: the vulnerability namespace (feed group) name
+    :param vulnerability_ids: optional list of vulnerability ids to limit the search to
+    :return: set of (user_id, image_id) tuples
+    """
+    qry = db.query(ImagePackageVulnerability.pkg_user_id, ImagePackageVulnerability.pkg_image_id).filter(ImagePackageVulnerability.vulnerability_namespace_name == namespace_name)
+    if vulnerability_ids is not None:
+        qry = qry.filter(ImagePackageVulnerability.vulnerability_id.in_(list(vulnerability_ids)))
+
+    return {tuple(x) for x in qry.distinct()}
+
+
+def mark_summaries_stale(db, image_keys):
+    """
+    Mark images whose matches are changed in the session's transaction, for update_stale_summaries() to recompute their summaries once
+    the transaction commits.
+
+    :param db: the db session changing the matches
+    :param image_keys: iterable of (user_id, image_id) tuples
+    :return:
+    """
+    db.info.setdefault(STALE_SUMMARIES_KEY, set()).update(image_keys)
+
+
+def discard_stale_summaries(db):
+    """
+    Forget the images marked stale in the session, e.g. once the transaction changing their matches is rolled back.
+
+    :param db: the db session
+    :return:
+    """
+    db.info.pop(STALE_SUMMARIES_KEY, None)
+
+
+def update_stale_summaries(db):
+    """
+    Recompute the summaries of the images marked stale in the session, in a new transaction that is committed. To be called after the
+    transaction that changed the matches commits. Recomputes are serialized within the process, so concurrent group syncs touching the
+    same images do not overwrite each other's summaries, and retried once if a missing summary was inserted concurrently.
+
+    :param db: the db session, with no pending changes
+    :return: number of summaries updated
+    """
+    image_keys = db.info.pop(STALE_SUMMARIES_KEY, None)
+    if not image_keys:
+        return 0
+
+    with _stale_update_lock:
+        try:
+            updated = update_vulnerability_summaries(db, image_keys)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            updated = update_vulnerability_summaries(db, image_keys)
+            db.commit()
+
+    return updated
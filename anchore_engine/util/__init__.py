@@ -1 +1,11 @@
 RFC1123_TIME_FORMAT = '%a, %d %b %Y %H:%M:%S %Z'
+
+
+def is_ascii(value):
+    """
+    Whether the string only has ascii characters, as str.isascii() which is not available before python 3.7.
+
+    :param value: str
+    :return: bool
+    """
+    return all(ord(c) < 128 for c in value)
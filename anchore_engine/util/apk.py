@@ -5,6 +5,8 @@ Utilities for working with APK packages in Alpine images
 import enum
 import copy
 
+from .memoize import memoized, VERSION_COMPARE_GROUP
+
 
 class ComparisonResult(enum.IntEnum):
     less_than = -1
@@ -198,6 +200,7 @@ def get_version_relationship(ver_str1, ver_str2):
     return ComparisonResult.equal_to
 
 
+@memoized(group=VERSION_COMPARE_GROUP)
 def compare_versions(v1, op, v2):
     result = get_version_relationship(v1, v2)
 
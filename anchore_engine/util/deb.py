@@ -2,6 +2,8 @@
 Utils for working with debian packages (dpkg and apt).
 
 """
+from . import is_ascii
+from .memoize import memoized, VERSION_COMPARE_GROUP
 
 # Map ops to the conversion from a standard cmp output
 compare_operators = {
@@ -84,6 +86,75 @@ class DpkgVersion(object):
         return DpkgVersion._compare_version_str(self.revision, other.revision)
 
 
+    def sort_key(self):
+        """
+        Returns a byte string such that comparing the keys of two versions as bytes orders them the same as __cmp__(), so
+        a "version a < version b" check can be done as a plain comparison or a db range predicate.
+
+        The one difference is for a lower epoch, which __cmp__() reports as equal rather than less. The key orders by epoch.
+
+        :return: bytes
+        """
+        epoch = str(self.epoch if self.epoch else 0)
+        return bytes([len(epoch)]) + epoch.encode('ascii') + DpkgVersion._version_str_key(self.version) + DpkgVersion._version_str_key(self.revision)
+
+    @staticmethod
+    def _version_str_key(ver):
+        """
+        Encode a single version string element for sort_key().
+
+        The string is split into the same (non-digit, digit) part pairs as _compare_version_str(). Each non-digit char is encoded
+        as its weight from _order(), followed by a terminator with the weight of the end of the string, then the digits without
+        leading zeros prefixed by their count. The end of the string is encoded so it compares like an unlimited run of empty pairs.
+
+        :param ver:
+        :return: bytes
+        """
+        if ver is None:
+            ver = ''
+
+        if not is_ascii(ver):
+            raise ValueError('Cannot build version key for non-ascii version string: {}'.format(ver))
+
+        pairs = []
+        i = 0
+        while i < len(ver):
+            j = i
+            while j < len(ver) and not ver[j].isdigit():
+                j += 1
+            k = j
+            while k < len(ver) and ver[k].isdigit():
+                k += 1
+            pairs.append((ver[i:j], ver[j:k].lstrip('0')))
+            i = k
+
+        # An all-zero version is the same as an empty one
+        if pairs == [('', '')]:
+            pairs = []
+
+        key = bytearray()
+        for non_digits, digits in pairs:
+            for c in non_digits:
+                key += DpkgVersion._key_weight(c)
+            key += DpkgVersion._key_weight(None)
+            key.append(len(digits))
+            key += digits.encode('ascii')
+
+        # End of string: an empty pair followed by a marker between '~' and end-of-string weights
+        key += DpkgVersion._key_weight(None)
+        key.append(0)
+        key += (2).to_bytes(3, 'big')
+
+        return bytes(key)
+
+    @staticmethod
+    def _key_weight(c):
+        """
+        The _order() weight of the char shifted to be non-negative and leave room for the end marker, as 3 bytes
+        """
+        order = DpkgVersion._order(c)
+        return (order + 4 if order >= 0 else 1).to_bytes(3, 'big')
+
     @staticmethod
     def _compare_version_str(ver_a, ver_b):
         """
@@ -166,6 +237,7 @@ class DpkgVersion(object):
             return 0
 
 
+@memoized(group=VERSION_COMPARE_GROUP)
 def compare_versions(v1, op, v2):
     """
     Pure python impl of the dpkg version comparison code from: dpkg/lib/vercmp.c
@@ -204,3 +276,13 @@ def compare_versions(v1, op, v2):
     except Exception as e:
         raise
 
+
+def version_key(version_str):
+    """
+    Returns the byte-comparable sort key for the version string. See DpkgVersion.sort_key()
+
+    :param version_str:
+    :return: bytes
+    """
+    return DpkgVersion.from_string(version_str).sort_key()
+
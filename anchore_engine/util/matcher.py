@@ -1,4 +1,10 @@
 import re
+from collections import OrderedDict
+
+from anchore_engine.util.memoize import memoized
+
+# Max number of compiled wildcard patterns kept, mapping rules and whitelist items of all loaded bundles share them
+MAX_COMPILED_PATTERNS = 4096
 
 
 def regexify(pattern):
@@ -25,3 +31,128 @@ def is_match(sanitizer, pattern, input_str):
     """
     sanitized = sanitizer(pattern)
     return True if re.match(sanitized, input_str) else False
+
+
+def is_wildcard(pattern):
+    """
+    Returns True if the pattern has wildcards, so it cannot be matched by string equality
+
+    :param pattern:
+    :return:
+    """
+    return '*' in pattern
+
+
+@memoized(max_size=MAX_COMPILED_PATTERNS)
+def compiled_wildcard(pattern):
+    """
+    Returns the compiled regex for the wildcard pattern, compiling it once
+
+    :param pattern:
+    :return: compiled regex of regexify(pattern)
+    """
+    return re.compile(regexify(pattern))
+
+
+def wildcard_match(pattern, input_str):
+    """
+    Equivalent of is_match(regexify, pattern, input_str) using the cached compiled pattern
+
+    :param pattern:
+    :param input_str:
+    :return:
+    """
+    return True if compiled_wildcard(pattern).match(input_str) else False
+
+
+# Patterns that cannot be wrapped in a named group of a larger alternation without changing their meaning or the meaning of
+# the others: named groups and group references (renumbered or name clashes) and inline global flags (apply to the whole regex)
+_uncombinable_regex = re.compile(r'\(\?P[<=]|\\[1-9]|\(\?\(|\(\?[aiLmsux]+\)')
+
+
+class MultiRegexMatcher(object):
+    """
+    Matches strings against many regexes in one pass, with re.match() semantics for each regex.
+
+    The regexes are combined into a single alternation with a named group per regex, so a string that matches none of them,
+    the common case, costs a single match attempt. For a string that matches, the regexes after the matched alternative are
+    checked individually since only one alternative of the combined regex can match. Regexes that cannot be combined are
+    always checked individually, and regexes that do not compile are ignored.
+
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(OrderedDict.fromkeys(patterns))
+        self._compiled = {}
+        self._combined_patterns = []
+        self._separate_patterns = []
+
+        for pattern in self.patterns:
+            try:
+                self._compiled[pattern] = re.compile(pattern)
+            except (re.error, TypeError):
+                continue
+
+            if _uncombinable_regex.search(pattern):
+                self._separate_patterns.append(pattern)
+            else:
+                self._combined_patterns.append(pattern)
+
+        self._combined = None
+        if self._combined_patterns:
+            try:
+                self._combined = re.compile('|'.join('(?P<p{}>{})'.format(i, p) for i, p in enumerate(self._combined_patterns)))
+            except re.error:
+                self._separate_patterns = self.patterns_compiled()
+                self._combined_patterns = []
+
+    def patterns_compiled(self):
+        """
+        Returns the patterns that compiled, in order
+
+        :return: list of patterns
+        """
+        return [p for p in self.patterns if p in self._compiled]
+
+    def match(self, input_str):
+        """
+        Returns the patterns that match the input string
+
+        :param input_str:
+        :return: list of patterns
+        """
+        matched = []
+        if self._combined is not None:
+            found = self._combined.match(input_str)
+            if found:
+                first = int(found.lastgroup[1:])
+                matched.append(self._combined_patterns[first])
+                matched += [p for p in self._combined_patterns[first + 1:] if self._compiled[p].match(input_str)]
+
+        matched += [p for p in self._separate_patterns if self._compiled[p].match(input_str)]
+        return matched
+
+    def match_all(self, input_strs):
+        """
+        Returns the input strings matched by each pattern, in input order
+
+        :param input_strs: iterable of strings
+        :return: dict of pattern -> list of matched input strings, with an entry for each pattern that compiled
+        """
+        results = {p: [] for p in self.patterns_compiled()}
+        for input_str in input_strs:
+            for pattern in self.match(input_str):
+                results[pattern].append(input_str)
+
+        return results
+
+
+@memoized(max_size=256)
+def multi_regex_matcher(patterns):
+    """
+    Returns the MultiRegexMatcher of the patterns tuple, building it once
+
+    :param patterns: tuple of regex strings
+    :return: MultiRegexMatcher
+    """
+    return MultiRegexMatcher(patterns)
@@ -2,6 +2,7 @@
 Maven utilities for handling versions and such
 
 """
+from .memoize import memoized, VERSION_COMPARE_GROUP
 
 
 class IntegerVersionItem(object):
@@ -191,6 +192,7 @@ class MavenVersion(object):
         return IntegerVersionItem(version_ss) if is_digit else StringVersionItem(version_ss, False);
 
     @staticmethod
+    @memoized(group=VERSION_COMPARE_GROUP)
     def _parse_version_(version):
         ver = str(version).strip().lower()
 
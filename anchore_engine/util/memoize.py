@@ -0,0 +1,144 @@
+"""
+Size-bounded, thread-safe memoization for pure functions such as the package version comparators.
+
+Version comparisons are called with heavily repeated arguments during feed syncs and image rescans, and the comparators
+re-parse their inputs on every call. Wrapping them with memoized() keeps the most recently used results in a bounded LRU.
+
+All memoized functions are registered by name so their caches can be inspected with stats(), resized with resize_all(),
+or cleared with clear_all(). Functions can be registered in a named group, e.g. VERSION_COMPARE_GROUP, to resize only that
+group's caches.
+
+"""
+import functools
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 65536
+
+# Group of the package version comparators, sized by the policy engine's version_compare_cache_size config
+VERSION_COMPARE_GROUP = 'version_compare'
+
+_registry = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+class MemoizedFunction(object):
+    """
+    Callable wrapper that caches results of the wrapped function keyed by its arguments, evicting the least recently used
+    results when full. Calls with unhashable arguments and calls that raise are not cached.
+
+    """
+
+    def __init__(self, fn, max_size=DEFAULT_MAX_SIZE, name=None, group=None):
+        self.fn = fn
+        self.name = name if name else '{}.{}'.format(fn.__module__, fn.__qualname__)
+        self.group = group
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        functools.update_wrapper(self, fn)
+
+    def __call__(self, *args, **kwargs):
+        if self.max_size <= 0:
+            return self.fn(*args, **kwargs)
+
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        try:
+            with self._lock:
+                result = self._results[key]
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable arguments
+            return self.fn(*args, **kwargs)
+
+        result = self.fn(*args, **kwargs)
+
+        with self._lock:
+            self.misses += 1
+            self._results[key] = result
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+        return result
+
+    def __get__(self, obj, objtype=None):
+        # Support wrapping functions that are accessed as methods
+        if obj is None:
+            return self
+        return functools.partial(self, obj)
+
+    def resize(self, max_size):
+        with self._lock:
+            self.max_size = max_size
+            while len(self._results) > max(max_size, 0):
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :return: dict with hit, miss, and size counts
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._results), 'max_size': self.max_size}
+
+
+def memoized(max_size=DEFAULT_MAX_SIZE, name=None, group=None):
+    """
+    Decorator to memoize a pure function with a bounded LRU cache and register it for stats.
+
+    :param max_size: max number of results to keep, 0 to disable caching
+    :param name: name to register the function under, defaults to the module-qualified function name
+    :param group: optional group name to resize the function's cache with, see resize_all()
+    :return: decorator returning a MemoizedFunction
+    """
+
+    def decorator(fn):
+        wrapped = MemoizedFunction(fn, max_size=max_size, name=name, group=group)
+        with _registry_lock:
+            _registry[wrapped.name] = wrapped
+        return wrapped
+
+    return decorator
+
+
+def stats():
+    """
+    :return: dict mapping registered function name -> stats dict
+    """
+    with _registry_lock:
+        functions = list(_registry.values())
+
+    return {x.name: x.stats() for x in functions}
+
+
+def resize_all(max_size, group=None):
+    """
+    Set the max cache size of all registered functions, or of the functions in the group, evicting entries as needed.
+
+    :param max_size: max number of results to keep per function, 0 to disable caching
+    :param group: only resize the functions registered with this group, all functions if None
+    """
+    with _registry_lock:
+        functions = [x for x in _registry.values() if group is None or x.group == group]
+
+    for fn in functions:
+        fn.resize(max_size)
+
+
+def clear_all():
+    with _registry_lock:
+        functions = list(_registry.values())
+
+    for fn in functions:
+        fn.clear()
@@ -1,6 +1,12 @@
 from .apk import compare_versions as apk_compare_versions
-from .deb import compare_versions as deb_compare_versions
-from .rpm import split_rpm_filename, compare_labels
+from .deb import compare_versions as deb_compare_versions, version_key as deb_version_key
+from .rpm import split_rpm_filename, compare_labels, version_key as rpm_version_key
+
+# Feed record version formats that have a version key, mapped to the distro flavor whose comparison the key follows
+version_key_flavors = {
+    'rpm': 'RHEL',
+    'dpkg': 'DEB',
+}
 
 
 def compare_package_versions(distro_flavor, pkg_a, ver_a, pkg_b, ver_b):
@@ -48,3 +54,31 @@ def compare_package_versions(distro_flavor, pkg_a, ver_a, pkg_b, ver_b):
             return 1
     else:
         raise ValueError("unsupported distro, cannot compare package versions")
+
+
+def package_version_key(distro_flavor, pkg_name, version):
+    """
+    Returns a byte-comparable key for the package version such that for two versions of the same distro flavor,
+    key_a < key_b if compare_package_versions() returns -1 for them. The converse may not hold, see the flavor-specific
+    version_key() functions, so a key comparison is a filter for candidates that must be confirmed with a full comparison.
+
+    Keys are only comparable with keys of the same distro flavor.
+
+    :param distro_flavor: (str) the package type/distro type for the comparison ("RHEL", "DEB")
+    :param pkg_name: (str) the package name
+    :param version: (str) the package version
+    :return: bytes, or None if there is no key for the flavor or the version cannot be encoded
+    """
+    if not version or version == 'None':
+        return None
+
+    try:
+        if distro_flavor == "RHEL":
+            return rpm_version_key(pkg_name, version)
+        elif distro_flavor == "DEB":
+            return deb_version_key(version)
+        else:
+            # apk versions are compared token by token with suffix rules that do not map to a fixed-width encoding
+            return None
+    except ValueError:
+        return None
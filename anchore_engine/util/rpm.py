@@ -2,6 +2,8 @@
 RPM utilities with no binary dependencies on rpm or rpmUtil.
 
 """
+from . import is_ascii
+from .memoize import memoized, VERSION_COMPARE_GROUP
 
 
 def parse_version(rpm_version):
@@ -49,6 +51,7 @@ def split_rpm_filename(rpm_filename):
     return name, version, release, epoch, arch
 
 
+@memoized(group=VERSION_COMPARE_GROUP)
 def compare_versions(pkg_a, ver_a, pkg_b, ver_b):
     """
     Compare pkg and versions using rpm file name rules. Follows standard __cmp__ semantics of -1 iff a < b, 0 iff a == b, 1 iff a > b
@@ -95,6 +98,81 @@ def compare_labels(evr_1, evr_2):
     return rpm_ver_cmp(rel_1, rel_2)
 
 
+# Token type markers for version_key(), ordered so that byte comparison of keys follows rpm_ver_cmp()
+_KEY_END = 0x01
+_KEY_TRAILING_SEP = 0x02
+_KEY_ZERO = 0x03
+_KEY_ALPHA = 0x04
+_KEY_NUMERIC = 0x05
+
+
+def version_key(pkg_name, version):
+    """
+    Returns a byte string for the package version such that comparing the keys of two versions as bytes orders them the same
+    as compare_versions() does, so a "version a < version b" check can be done as a plain comparison or a db range predicate.
+
+    The one case the key orders differently is when one version has an alpha segment where the other has a numeric one. The key uses
+    the rpm rule (numeric is newer) while rpm_ver_cmp() treats the first argument as newer, so where a key comparison says a < b,
+    compare_versions() may not. Use the key to exclude versions that are not older, and confirm the rest with compare_versions().
+
+    :param pkg_name: package name, needed to parse the version the same way as compare_versions()
+    :param version: version string (version-release)
+    :return: bytes
+    """
+    n, v, r, e, a = split_rpm_filename(pkg_name + "-" + version + ".arch.rpm")
+    return _label_key(v) + _label_key(r)
+
+
+def _label_key(label):
+    """
+    Encode a single version or release label using the same segment splitting as rpm_ver_cmp()
+
+    :param label:
+    :return: bytes
+    """
+    label = label.strip()
+    if not is_ascii(label):
+        raise ValueError('Cannot build version key for non-ascii version label: {}'.format(label))
+
+    key = bytearray()
+    i = 0
+    while i < len(label):
+        # Skip separators
+        while i < len(label) and not label[i].isalnum():
+            i += 1
+
+        if i == len(label):
+            # Only separators left, which makes this version newer than one that ended at the previous segment
+            key.append(_KEY_TRAILING_SEP)
+            break
+
+        j = i
+        if label[i].isdigit():
+            while j < len(label) and label[j].isdigit():
+                j += 1
+
+            digits = label[i:j].lstrip('0')
+            if digits:
+                key.append(_KEY_NUMERIC)
+                key.append(len(digits))
+                key += digits.encode('ascii')
+            else:
+                key.append(_KEY_ZERO)
+        else:
+            # Same as greedy_find_block(), a non-digit segment runs until the next digit
+            while j < len(label) and not label[j].isdigit():
+                j += 1
+
+            key.append(_KEY_ALPHA)
+            key += label[i:j].encode('ascii')
+            key.append(0x00)
+
+        i = j
+
+    key.append(_KEY_END)
+    return bytes(key)
+
+
 def rpm_ver_cmp(a, b):
     """
     A translation of the RPM lib's C code for version compare rpmvercmp in lib/rpmvercmp.c into pure python with
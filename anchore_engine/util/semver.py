@@ -4,6 +4,7 @@ from distutils.version import LooseVersion, StrictVersion
 from pkg_resources import parse_version
 
 from anchore_engine.subsys import logger
+from anchore_engine.util.memoize import memoized, VERSION_COMPARE_GROUP
 
 zerolikes = ['0', '0.0', '0.0.0', '0.0.0.0']
 
@@ -210,6 +211,7 @@ def semver_is_all(rawsemver):
 
     return(False)
 
+@memoized(group=VERSION_COMPARE_GROUP)
 def compare_versions(rawsemver, rawpkgver, language='python'):
     ret = False
     versionmatch = False
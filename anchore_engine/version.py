@@ -1,2 +1,2 @@
 version="0.3.0-dev"
-db_version="0.0.8"
+db_version="0.0.12"
@@ -1,7 +1,7 @@
 import click
 import logging
 
-from . import db, archivestorage, service, analyzers
+from . import db, archivestorage, service, analyzers, feeds
 from anchore_manager import version
 from . import utils
 
@@ -30,4 +30,5 @@ def main_entry(ctx, debug, json, configdir):
 main_entry.add_command(db.db)
 main_entry.add_command(archivestorage.archivestorage)
 main_entry.add_command(service.service)
-main_entry.add_command(analyzers.analyzers)
\ No newline at end of file
+main_entry.add_command(analyzers.analyzers)
+main_entry.add_command(feeds.feeds)
\ No newline at end of file
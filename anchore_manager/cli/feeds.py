@@ -0,0 +1,88 @@
+import sys
+import click
+
+from anchore_engine.db import session_scope
+from anchore_engine.subsys import logger
+
+import anchore_manager.cli.utils
+
+config = {}
+
+
+@click.group(name='feeds', short_help='Feed data operations')
+@click.pass_obj
+@click.option("--db-connect", nargs=1, required=True, help="DB connection string override.")
+@click.option("--db-use-ssl", is_flag=True, help="Set if DB connection is using SSL.")
+@click.option("--db-retries", nargs=1, default=1, type=int, help="If set, the tool will retry to connect to the DB the specified number of times at 5 second intervals.")
+@click.option("--db-timeout", nargs=1, default=30, type=int, help="Number of seconds to wait for DB call to complete before timing out.")
+@click.option("--db-connect-timeout", nargs=1, default=120, type=int, help="Number of seconds to wait for initial DB connection before timing out.")
+def feeds(ctx_config, db_connect, db_use_ssl, db_retries, db_timeout, db_connect_timeout):
+    global config
+    config = ctx_config
+
+    try:
+        log_level = 'INFO'
+        if config['debug']:
+            log_level = 'DEBUG'
+        logger.set_log_level(log_level, log_to_stdout=True)
+
+        db_params = anchore_manager.cli.utils.make_db_params(db_connect=db_connect, db_use_ssl=db_use_ssl, db_timeout=db_timeout, db_connect_timeout=db_connect_timeout)
+        anchore_manager.cli.utils.connect_database(config, db_params, db_retries=db_retries)
+    except Exception as err:
+        logger.error(anchore_manager.cli.utils.format_error_output(config, 'feeds', {}, err))
+        sys.exit(2)
+
+
+@feeds.command(name='export-snapshot', short_help="Export the synced feed data to a snapshot file.")
+@click.argument("snapshot-file", type=click.Path(dir_okay=False, writable=True))
+@click.option("--chunk-rows", nargs=1, default=10000, type=int, help="Max number of rows per chunk in the snapshot (default=10000).")
+def export_snapshot(snapshot_file, chunk_rows):
+    """
+    Export the feed and group metadata and all synced feed data from the DB into a snapshot file that can be loaded into another DB with import-snapshot.
+
+    """
+    from anchore_engine.services.policy_engine.engine import feed_snapshot
+
+    ecode = 0
+
+    try:
+        with session_scope() as db:
+            manifest = feed_snapshot.export_snapshot(db, snapshot_file, chunk_rows=chunk_rows)
+
+        logger.info('Exported {} rows of {} feeds to {}'.format(sum([x['row_count'] for x in manifest['tables']]), len(manifest['feeds']), snapshot_file))
+    except Exception as err:
+        logger.error(anchore_manager.cli.utils.format_error_output(config, 'feeds', {}, err))
+        if not ecode:
+            ecode = 2
+
+    anchore_manager.cli.utils.doexit(ecode)
+
+
+@feeds.command(name='import-snapshot', short_help="Load feed data from a snapshot file into an unsynced DB.")
+@click.argument("snapshot-file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", nargs=1, default=None, type=int, help="Number of rows written per batch.")
+@click.option("--no-copy", is_flag=True, help="Write rows with INSERT statements instead of COPY.")
+def import_snapshot(snapshot_file, batch_size, no_copy):
+    """
+    Load a snapshot created with export-snapshot into the DB, which must be initialized and at the same DB version, with no synced data for the snapshot's feed groups.
+    The feed groups' last sync times are set from the snapshot so the next policy engine feed sync continues incrementally from there.
+
+    """
+    from anchore_engine.services.policy_engine.engine import feed_snapshot
+
+    ecode = 0
+
+    try:
+        manifest = feed_snapshot.read_manifest(snapshot_file)
+        logger.info('Importing snapshot created at {} with feeds: {}'.format(manifest['created_at'], ', '.join([x['name'] for x in manifest['feeds']])))
+
+        with session_scope() as db:
+            feed_snapshot.import_snapshot(db, snapshot_file, batch_size=batch_size, use_copy=not no_copy)
+
+        logger.info('Import complete')
+    except Exception as err:
+        logger.error(anchore_manager.cli.utils.format_error_output(config, 'feeds', {}, err))
+        if not ecode:
+            ecode = 2
+
+    anchore_manager.cli.utils.doexit(ecode)
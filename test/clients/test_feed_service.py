@@ -0,0 +1,109 @@
+import gzip
+import json
+import threading
+import unittest
+import urllib.parse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+from anchore_engine.clients.anchoreio import HTTPBasicAuthClient, retry_delay
+from anchore_engine.clients.feeds.feed_service import FeedClient
+
+
+class StubFeedServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, pages):
+        super(StubFeedServer, self).__init__(('127.0.0.1', 0), StubFeedHandler)
+        self.pages = pages
+        self.requests = []
+        self.failures = 0
+
+
+class StubFeedHandler(BaseHTTPRequestHandler):
+    """
+    Serves the pages of a single feed group, gzip encoded if accepted. Responds 503 while the server has failures left.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        self.server.requests.append((self.path, self.headers.get('Accept-Encoding'), self.client_address[1]))
+
+        if self.server.failures:
+            self.server.failures -= 1
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        index = int(params.get('next_token', ['0'])[0])
+        next_token = str(index + 1) if index + 1 < len(self.server.pages) else None
+        body = json.dumps({'data': self.server.pages[index], 'next_token': next_token}).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFeedClient(unittest.TestCase):
+    pages = [[{'Vulnerability': {'Name': 'CVE-{}-{}'.format(p, i), 'Description': 'x' * 200}} for i in range(20)] for p in range(3)]
+
+    def setUp(self):
+        self.server = StubFeedServer(self.pages)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        http_client = HTTPBasicAuthClient(username='anon', password='pass', retries=3)
+        http_client.auth_config['retry_backoff_sec'] = 0.01
+        self.client = FeedClient(endpoint='http://127.0.0.1:{}/v1/feeds'.format(self.server.server_address[1]), http_client=http_client)
+
+    def tearDown(self):
+        self.client.http_client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetch_all(self):
+        records = []
+        next_token = None
+        while True:
+            page = self.client.get_feed_group_data('vulnerabilities', 'centos:7', next_token=next_token)
+            records.extend(page.data)
+            next_token = page.next_token
+            if not next_token:
+                return records
+
+    def test_paged_compressed_keepalive(self):
+        records = self.fetch_all()
+        self.assertEqual([x for page in self.pages for x in page], records)
+
+        self.assertEqual(3, len(self.server.requests))
+        self.assertTrue(all('gzip' in x[1] for x in self.server.requests))
+        # All pages fetched over the same pooled connection
+        self.assertEqual(1, len({x[2] for x in self.server.requests}))
+
+    def test_retry_on_unavailable(self):
+        self.server.failures = 2
+        self.assertEqual(60, len(self.fetch_all()))
+        self.assertEqual(5, len(self.server.requests))
+
+    def test_retries_exhausted(self):
+        self.server.failures = 3
+        with self.assertRaises(Exception):
+            self.client.get_feed_group_data('vulnerabilities', 'centos:7')
+
+    def test_retry_delay(self):
+        for attempt in range(1, 10):
+            delay = retry_delay(attempt, backoff_sec=1.0, max_backoff_sec=10.0)
+            self.assertTrue(min(10.0, 2 ** (attempt - 1)) / 2 <= delay <= min(10.0, 2 ** (attempt - 1)))
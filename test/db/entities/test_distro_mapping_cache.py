@@ -0,0 +1,57 @@
+import unittest
+
+from anchore_engine.db.entities.policy_engine import DistroMappingCache, DistroMappingRecord, VersionPreservingDistroMapper
+
+
+class TestDistroMappingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = 0
+        self.records = [
+            DistroMappingRecord(from_distro='centos', to_distro='centos', flavor='RHEL'),
+            DistroMappingRecord(from_distro='rhel', to_distro='centos', flavor='RHEL'),
+            DistroMappingRecord(from_distro='debian', to_distro='debian', flavor='DEB'),
+        ]
+
+        def loader():
+            self.loads += 1
+            return list(self.records)
+
+        self.cache = DistroMappingCache(ttl_sec=3600, loader=loader)
+
+    def test_lookups(self):
+        self.assertEqual('centos', self.cache.get('rhel').to_distro)
+        self.assertIsNone(self.cache.get('alpine'))
+        self.assertEqual(['centos', 'rhel'], [x.from_distro for x in self.cache.mapped_to('centos')])
+        self.assertEqual([], self.cache.mapped_to('alpine'))
+        self.assertEqual(1, self.loads)
+
+    def test_distros_for(self):
+        mapping = self.cache.distros_for('rhel', '7.5', 'rhel,fedora', VersionPreservingDistroMapper)
+        self.assertEqual([('centos', '7.5', 'RHEL'), ('centos', '7.5', 'RHEL'), ('centos', '7', 'RHEL')], mapping)
+        self.assertEqual(mapping, self.cache.distros_for('rhel', '7.5', 'rhel,fedora', VersionPreservingDistroMapper))
+
+        self.assertEqual([('debian', '10', 'DEB')], self.cache.distros_for('debian', '10', None, VersionPreservingDistroMapper))
+        self.assertEqual(1, self.loads)
+
+    def test_invalidate_and_version(self):
+        self.cache.get('rhel')
+        version = self.cache.version
+
+        # Reload with unchanged content keeps the version
+        self.cache.invalidate()
+        self.cache.get('rhel')
+        self.assertEqual(2, self.loads)
+        self.assertEqual(version, self.cache.version)
+
+        self.records.append(DistroMappingRecord(from_distro='fedora', to_distro='centos', flavor='RHEL'))
+        self.assertIsNone(self.cache.get('fedora'))
+        self.cache.invalidate()
+        self.assertEqual('centos', self.cache.get('fedora').to_distro)
+        self.assertEqual(version + 1, self.cache.version)
+
+    def test_ttl(self):
+        self.cache.ttl_sec = 0
+        self.cache.get('rhel')
+        self.cache.get('rhel')
+        self.assertEqual(2, self.loads)
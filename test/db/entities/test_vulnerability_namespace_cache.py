@@ -0,0 +1,37 @@
+import datetime
+import unittest
+
+from anchore_engine.db.entities.policy_engine import VulnerabilityNamespaceCache
+
+
+class TestVulnerabilityNamespaceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = VulnerabilityNamespaceCache(ttl_sec=3600)
+        self.key = ('rhel', '7.5', 'rhel,fedora', 1)
+
+    def test_lookup_and_invalidate(self):
+        self.assertIsNone(self.cache.lookup(self.key))
+        self.cache.cache_it(self.key, 'centos:7')
+        self.assertEqual('centos:7', self.cache.lookup(self.key))
+
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.lookup(self.key))
+
+    def test_ttl(self):
+        self.cache.ttl_sec = 0
+        self.cache.cache_it(self.key, 'centos:7')
+        self.assertIsNone(self.cache.lookup(self.key))
+
+    def test_validate(self):
+        stamps = {'centos:7': datetime.datetime(2019, 1, 1)}
+        self.cache.validate(stamps)
+        self.cache.cache_it(self.key, 'centos:7')
+
+        # Unchanged group timestamps keep entries
+        self.cache.validate(dict(stamps))
+        self.assertEqual('centos:7', self.cache.lookup(self.key))
+
+        stamps['centos:7'] = datetime.datetime(2019, 1, 2)
+        self.cache.validate(stamps)
+        self.assertIsNone(self.cache.lookup(self.key))
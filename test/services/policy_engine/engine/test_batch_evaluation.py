@@ -0,0 +1,40 @@
+import threading
+import time
+import unittest
+
+from anchore_engine.services.policy_engine.engine.batch_evaluation import BatchEvaluator
+
+
+class TestBatchEvaluator(unittest.TestCase):
+    def test_results_in_order(self):
+        def evaluate(i):
+            # Later items finish first
+            time.sleep(0.001 * (20 - i))
+            return i * 10
+
+        self.assertEqual([i * 10 for i in range(20)], list(BatchEvaluator(workers=4).evaluate(list(range(20)), evaluate)))
+
+    def test_bounded_in_flight(self):
+        lock = threading.Lock()
+        started = []
+
+        def evaluate(i):
+            with lock:
+                started.append(i)
+            return i
+
+        results = BatchEvaluator(workers=2).evaluate(list(range(100)), evaluate)
+        self.assertEqual(0, next(results))
+        time.sleep(0.05)
+
+        # Only the first result was consumed, so at most workers * 2 + 1 evaluations were submitted
+        self.assertLessEqual(len(started), 5)
+        results.close()
+        time.sleep(0.05)
+        self.assertLessEqual(len(started), 5)
+
+    def test_empty(self):
+        self.assertEqual([], list(BatchEvaluator(workers=2).evaluate([], lambda x: x)))
+
+    def test_min_workers(self):
+        self.assertEqual(1, BatchEvaluator(workers=0).workers)
@@ -0,0 +1,140 @@
+import datetime
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import pg8000, psycopg2
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import Vulnerability, FixedArtifact, NvdMetadata, CpeVulnerability
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.bulk_load import BulkLoader, _copy_text
+
+
+class RecordingCursor(object):
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, statement, stream=None):
+        self.executed.append((statement, stream.read()))
+
+    def copy_expert(self, statement, stream):
+        self.executed.append((statement, stream.read()))
+
+    def close(self):
+        pass
+
+
+class Psycopg2Binary(object):
+    """
+    Stands in for psycopg2.Binary, the wrapper the psycopg2 dialect's bind processor returns for binary values
+
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+
+class PostgresSession(object):
+    """
+    Session bound to a PostgreSQL dialect, pg8000 by default, whose raw connection records the executed statements and COPY data
+
+    """
+
+    def __init__(self, dialect=None):
+        self.executed = []
+        self.dialect = dialect if dialect else pg8000.dialect()
+        self.connection_proxy = type('Connection', (object,), {'connection': self})()
+
+    def get_bind(self):
+        return self
+
+    def connection(self):
+        return self.connection_proxy
+
+    def cursor(self):
+        return RecordingCursor(self.executed)
+
+
+class TestBulkLoader(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        tables = [x.__table__ for x in [Vulnerability, FixedArtifact, NvdMetadata, CpeVulnerability]]
+        Base.metadata.create_all(engine, tables=tables)
+        self.db = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.db.close()
+
+    def vulnerability(self, vuln_id, fixes):
+        v = Vulnerability(id=vuln_id, namespace_name='centos:7', severity='High', metadata_json={'x': 1})
+        v.fixed_in = [FixedArtifact(name=name, version=version, version_format='rpm', epochless_version=version, version_key=b'\x05\x01') for name, version in fixes]
+        return v
+
+    def test_load_with_children(self):
+        loader = BulkLoader(self.db, batch_size=3)
+        self.assertFalse(loader.use_copy)
+
+        loader.add_all([self.vulnerability('CVE-1', [('openssl', '1.0-1'), ('bash', '4.0-1')]), self.vulnerability('CVE-2', [('zlib', '1.2-1')]), self.vulnerability('CVE-3', [])])
+
+        nvd = NvdMetadata(name='CVE-1', namespace_name='nvddb:2019', severity='Low', cvss={'base_metrics': {'score': 2.0}})
+        nvd.vulnerable_cpes = [CpeVulnerability(feed_name='nvdv2', cpetype='a', vendor='openssl', name='openssl', version='1.0', update='-', meta='-')]
+        loader.add(nvd)
+        loader.flush()
+        self.db.commit()
+
+        self.assertEqual({'feed_data_vulnerabilities': 3, 'feed_data_vulnerabilities_fixed_artifacts': 3, 'feed_data_nvd_vulnerabilities': 1, 'feed_data_cpe_vulnerabilities': 1}, loader.row_counts)
+        self.assertEqual(8, loader.total_rows())
+
+        v = self.db.query(Vulnerability).get(('CVE-1', 'centos:7'))
+        self.assertEqual({'x': 1}, v.metadata_json)
+        self.assertIsNotNone(v.created_at)
+        self.assertEqual(['bash', 'openssl'], sorted([x.name for x in v.fixed_in]))
+
+        fix = v.fixed_in[0]
+        self.assertEqual(('CVE-1', 'centos:7'), (fix.vulnerability_id, fix.namespace_name))
+        self.assertTrue(fix.include_later_versions)
+        self.assertFalse(fix.vendor_no_advisory)
+        self.assertEqual(b'\x05\x01', fix.version_key)
+
+        cpe = self.db.query(CpeVulnerability).one()
+        self.assertEqual(('CVE-1', 'nvddb:2019', 'Low'), (cpe.vulnerability_id, cpe.namespace_name, cpe.severity))
+
+    def test_copy_text(self):
+        self.assertEqual('\\N', _copy_text(None))
+        self.assertEqual('t', _copy_text(True))
+        self.assertEqual('1.5', _copy_text(1.5))
+        self.assertEqual('\\\\x0501', _copy_text(b'\x05\x01'))
+        self.assertEqual('2019-01-02T03:04:05', _copy_text(datetime.datetime(2019, 1, 2, 3, 4, 5)))
+        self.assertEqual('a\\tb\\nc\\\\d', _copy_text('a\tb\nc\\d'))
+
+    def test_pg8000_copy(self):
+        db = PostgresSession()
+        loader = BulkLoader(db, batch_size=10)
+        self.assertTrue(loader.use_copy)
+        self.assertFalse(BulkLoader(db, use_copy=False).use_copy)
+
+        loader.add(CpeVulnerability(feed_name='nvdv2', cpetype='a', vendor='openssl', name='openssl', version='1.0', update='-', meta='-', vulnerability_id='CVE-1', namespace_name='nvddb:2019', severity='Low\u00e9'))
+        loader.flush()
+
+        self.assertEqual(1, len(db.executed))
+        statement, data = db.executed[0]
+        self.assertTrue(statement.startswith('COPY feed_data_cpe_vulnerabilities ('))
+        self.assertTrue(statement.endswith(') FROM STDIN'))
+        self.assertTrue(data.endswith(b'\n'))
+        self.assertIn('Low\u00e9'.encode('utf-8'), data.split(b'\t'))
+
+    def test_copy_binary(self):
+        dbapi = type('psycopg2', (object,), {'Binary': Psycopg2Binary, 'paramstyle': 'pyformat', '__version__': '2.8.6'})
+        for dialect in [pg8000.dialect(), psycopg2.dialect(dbapi=dbapi)]:
+            db = PostgresSession(dialect)
+            loader = BulkLoader(db)
+            self.assertTrue(loader.use_copy)
+
+            loader.add(FixedArtifact(name='openssl', version='1.0-1', version_format='rpm', epochless_version='1.0-1', version_key=b'\x05\x01\\',
+                                     vulnerability_id='CVE-1', namespace_name='centos:7'))
+            loader.flush()
+
+            statement, data = db.executed[0]
+            self.assertTrue(statement.startswith('COPY feed_data_vulnerabilities_fixed_artifacts ('))
+            self.assertIn(b'\\\\x05015c', data.split(b'\t'), dialect.driver)
@@ -0,0 +1,107 @@
+import copy
+import threading
+import unittest
+
+from anchore_engine.services.policy_engine.engine.policy.bundles import CompiledBundleCache, build_cached_bundle, bundle_digest
+from anchore_engine.services.policy_engine.engine.policy.exceptions import BundleTargetTagMismatchError
+from anchore_engine.services.policy_engine.engine.policy.gate import ExecutionContext
+
+
+class FakeImage(object):
+    def __init__(self, image_id):
+        self.id = image_id
+        self.digest = 'sha256:' + image_id
+
+
+test_bundle = {
+    'id': 'bundle1',
+    'name': 'cache test bundle',
+    'version': '1_0',
+    'policies': [
+        {
+            'id': 'policy1',
+            'name': 'always stop',
+            'version': '1_0',
+            'rules': [
+                {'id': 'rule1', 'gate': 'always', 'trigger': 'always', 'params': [], 'action': 'STOP'}
+            ]
+        },
+        {
+            'id': 'policy2',
+            'name': 'always warn',
+            'version': '1_0',
+            'rules': [
+                {'id': 'rule2', 'gate': 'always', 'trigger': 'always', 'params': [], 'action': 'WARN'}
+            ]
+        }
+    ],
+    'whitelists': [],
+    'mappings': [
+        {'registry': 'docker.io', 'repository': 'library/centos', 'image': {'type': 'tag', 'value': '*'}, 'policy_id': 'policy1', 'whitelist_ids': []},
+        {'registry': '*', 'repository': '*', 'image': {'type': 'tag', 'value': '*'}, 'policy_id': 'policy2', 'whitelist_ids': []}
+    ]
+}
+
+
+def _actions(evaluation):
+    return [d.action.name for p in evaluation.bundle_decision.policy_decisions for d in p.decisions]
+
+
+class TestCompiledBundleCache(unittest.TestCase):
+    def test_digest(self):
+        reordered = dict(reversed(list(copy.deepcopy(test_bundle).items())))
+        self.assertEqual(bundle_digest(test_bundle), bundle_digest(reordered))
+
+        changed = copy.deepcopy(test_bundle)
+        changed['policies'][0]['rules'][0]['action'] = 'WARN'
+        self.assertNotEqual(bundle_digest(test_bundle), bundle_digest(changed))
+
+    def test_reuse_by_mapping_rule(self):
+        cache = CompiledBundleCache(max_entries=10)
+        centos = build_cached_bundle('admin', test_bundle, 'docker.io/library/centos:7', cache=cache)
+        self.assertIs(centos, build_cached_bundle('admin', copy.deepcopy(test_bundle), 'docker.io/library/centos:latest', cache=cache))
+
+        # Other users and tags selecting another mapping rule get their own entries
+        self.assertIsNot(centos, build_cached_bundle('user1', test_bundle, 'docker.io/library/centos:7', cache=cache))
+        other = build_cached_bundle('admin', test_bundle, 'docker.io/library/alpine:3.8', cache=cache)
+        self.assertIsNot(centos, other)
+        self.assertEqual({'hits': 1, 'misses': 3, 'size': 3, 'max_entries': 10}, cache.stats())
+
+        context = ExecutionContext(db_session=None, configuration={})
+        self.assertEqual(['stop'], _actions(centos.execute(FakeImage('img1'), 'docker.io/library/centos:latest', context)))
+        self.assertEqual(['warn'], _actions(other.execute(FakeImage('img1'), 'docker.io/library/debian:9', context)))
+        with self.assertRaises(BundleTargetTagMismatchError):
+            centos.execute(FakeImage('img1'), 'docker.io/library/debian:9', context)
+
+    def test_lru_eviction(self):
+        cache = CompiledBundleCache(max_entries=1)
+        first = build_cached_bundle('admin', test_bundle, 'docker.io/library/centos:7', cache=cache)
+        build_cached_bundle('admin', test_bundle, 'docker.io/library/alpine:3.8', cache=cache)
+        self.assertEqual(1, cache.size())
+        self.assertIsNot(first, build_cached_bundle('admin', test_bundle, 'docker.io/library/centos:7', cache=cache))
+
+    def test_disabled(self):
+        cache = CompiledBundleCache(max_entries=0)
+        first = build_cached_bundle('admin', test_bundle, 'docker.io/library/centos:7', cache=cache)
+        self.assertIsNot(first, build_cached_bundle('admin', test_bundle, 'docker.io/library/centos:7', cache=cache))
+        self.assertEqual(0, cache.size())
+
+    def test_concurrent_executions(self):
+        bundle = build_cached_bundle('admin', test_bundle, 'docker.io/library/centos:7', cache=CompiledBundleCache(max_entries=10))
+        results = []
+
+        def run():
+            for i in range(20):
+                evaluation = bundle.execute(FakeImage('img{}'.format(i)), 'docker.io/library/centos:7', ExecutionContext(db_session=None, configuration={}))
+                results.append((_actions(evaluation), evaluation.errors))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Each execution only sees the trigger matches it fired
+        self.assertEqual(80, len(results))
+        self.assertTrue(all(actions == ['stop'] and not errors for actions, errors in results))
+        self.assertEqual([], bundle.policies['policy1'].rules[0].configured_trigger.fired)
@@ -0,0 +1,74 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import Image, ImageCpe, NvdMetadata, CpeVulnerability, ImageCpeVulnerability
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.vulnerabilities import match_image_cpes, update_cpe_vulnerability_matches
+
+
+def image_cpe(user_id, image_id, name, version):
+    return ImageCpe(image_user_id=user_id, image_id=image_id, pkg_type='java', pkg_path='/app/{}-{}.jar'.format(name, version), cpetype='a',
+                    vendor='-', name=name, version=version, update='-', meta='-')
+
+
+def nvd_record(vulnerability_id, cpes):
+    record = NvdMetadata(name=vulnerability_id, namespace_name='nvddb:2019', severity='High')
+    record.vulnerable_cpes = [CpeVulnerability(feed_name='nvd', namespace_name='nvddb:2019', vulnerability_id=vulnerability_id, severity='High', cpetype='a',
+                                               vendor=vendor, name=name, version=version, update='-', meta='-', link='https://nvd/' + vulnerability_id)
+                              for vendor, name, version in cpes]
+    return record
+
+
+class TestImageCpeMatches(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine, tables=[Image.__table__, ImageCpe.__table__, NvdMetadata.__table__, CpeVulnerability.__table__, ImageCpeVulnerability.__table__])
+        self.db = sessionmaker(bind=engine)()
+
+        self.images = []
+        for user_id in ['admin', 'user1']:
+            image = Image(id='img1', user_id=user_id, state='analyzed')
+            self.db.add(image)
+            self.db.add_all([image_cpe(user_id, 'img1', 'commons', '1.0'), image_cpe(user_id, 'img1', 'spring', '2.0')])
+            self.images.append(image)
+
+        # Same cpe under two vendors, a single match for the image
+        self.db.add(nvd_record('CVE-1', [('apache', 'commons', '1.0'), ('commons_project', 'commons', '1.0')]))
+        self.db.add(nvd_record('CVE-2', [('pivotal', 'spring', '3.0')]))
+        self.db.flush()
+
+    def tearDown(self):
+        self.db.close()
+
+    def matches(self, user_id):
+        return sorted((x.vulnerability_id, x.name, x.get_cpestring(), x.link) for x in self.db.query(ImageCpeVulnerability).filter(ImageCpeVulnerability.image_user_id == user_id))
+
+    def test_match_image(self):
+        self.assertEqual(1, match_image_cpes(self.images[0], self.db))
+        self.assertEqual([('CVE-1', 'commons', 'cpe:a:-:commons:1.0:-:-', 'https://nvd/CVE-1')], self.matches('admin'))
+        self.assertEqual([], self.matches('user1'))
+
+        # Recomputing replaces the existing matches
+        self.assertEqual(1, match_image_cpes(self.images[0], self.db))
+        self.assertEqual(1, len(self.matches('admin')))
+
+    def test_update_vulnerabilities(self):
+        for image in self.images:
+            match_image_cpes(image, self.db)
+
+        self.db.merge(nvd_record('CVE-2', [('pivotal', 'spring', '2.0')]))
+        self.db.flush()
+        self.assertEqual({('admin', 'img1'), ('user1', 'img1')}, update_cpe_vulnerability_matches('nvddb:2019', ['CVE-2'], self.db))
+        self.assertEqual(['CVE-1', 'CVE-2'], [x[0] for x in self.matches('user1')])
+
+        self.db.merge(nvd_record('CVE-1', [('apache', 'commons', '1.1')]))
+        self.db.flush()
+        self.assertEqual({('admin', 'img1'), ('user1', 'img1')}, update_cpe_vulnerability_matches('nvddb:2019', ['CVE-1'], self.db))
+        self.assertEqual(['CVE-2'], [x[0] for x in self.matches('admin')])
+
+        # Other namespaces are untouched by a namespace-wide update
+        self.assertEqual(set(), update_cpe_vulnerability_matches('nvddb:2018', None, self.db))
+        self.assertEqual(['CVE-2'], [x[0] for x in self.matches('user1')])
@@ -0,0 +1,165 @@
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import FeedMetadata, FeedGroupMetadata, NpmMetadata
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.feeds import AnchoreServiceFeed, get_sync_chunk_size, DEFAULT_SYNC_CHUNK_SIZE, get_sync_workers, \
+    get_sync_prefetch_chunks, prefetch
+
+
+class Group(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Record(object):
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+class Mapper(object):
+    def map(self, record_json):
+        return Record(record_json['key'], record_json['value']) if record_json else None
+
+
+class PagedSource(object):
+    """
+    Feed source serving a fixed list of pages
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = 0
+
+    def get_paged_feed_group_data(self, feed, group, since=None, next_token=None):
+        index = int(next_token) if next_token else 0
+        self.requests += 1
+        return self.pages[index], str(index + 1) if index + 1 < len(self.pages) else None
+
+
+class PagedFeed(AnchoreServiceFeed):
+    __feed_name__ = 'test'
+    __group_data_mappers__ = Mapper
+
+    def _load_mapper(self, group_obj):
+        return Mapper()
+
+    def _dedup_data_key(self, item):
+        return item.key
+
+
+class NpmMapper(object):
+    def map(self, record_json):
+        return NpmMetadata(name=record_json['key'], latest=str(record_json['value']))
+
+
+class NpmPagedFeed(PagedFeed):
+    def _load_mapper(self, group_obj):
+        return NpmMapper()
+
+    def _dedup_data_key(self, item):
+        return item.name
+
+
+def page(*items):
+    return [{'key': k, 'value': v} for k, v in items]
+
+
+class TestDedupedChunks(unittest.TestCase):
+    pages = [page(('a', 1), ('b', 1), ('a', 2)), [None], page(('c', 1), ('d', 1), ('b', 2)), page(('e', 1))]
+
+    def chunks(self, chunk_size, dedup_all, replaced=None):
+        feed = PagedFeed(metadata=object(), src=PagedSource(self.pages))
+        return [[(x.key, x.value) for x in chunk] for chunk in feed._get_deduped_data(Group('grp'), chunk_size=chunk_size, dedup_all=dedup_all, replaced=replaced)]
+
+    def test_dedup_all_keeps_last(self):
+        replaced = {}
+        self.assertEqual([[('a', 1), ('b', 1)], [('c', 1), ('d', 1)], [('e', 1)]], self.chunks(2, True, replaced))
+        self.assertEqual({'a': 2, 'b': 2}, {k: v.value for k, v in replaced.items()})
+
+        # Repeats within the current chunk replace the earlier occurrence in place
+        replaced = {}
+        self.assertEqual([[('a', 2), ('b', 1), ('c', 1)], [('d', 1), ('e', 1)]], self.chunks(3, True, replaced))
+        self.assertEqual({'b': 2}, {k: v.value for k, v in replaced.items()})
+
+        with self.assertRaises(ValueError):
+            self.chunks(2, True)
+
+    def test_dedup_within_chunk_keeps_last(self):
+        self.assertEqual([[('a', 2), ('b', 1), ('c', 1)], [('d', 1), ('b', 2), ('e', 1)]], self.chunks(3, False))
+
+    def test_all_pages_fetched(self):
+        source = PagedSource(self.pages)
+        feed = PagedFeed(metadata=object(), src=source)
+        self.assertEqual(5, sum(len(x) for x in feed._get_deduped_data(Group('grp'), chunk_size=100, dedup_all=True, replaced={})))
+        self.assertEqual(4, source.requests)
+
+    def test_chunk_size_config(self):
+        self.assertEqual(DEFAULT_SYNC_CHUNK_SIZE, get_sync_chunk_size({}))
+        self.assertEqual(DEFAULT_SYNC_CHUNK_SIZE, get_sync_chunk_size({'feeds': {'sync_chunk_size': 0}}))
+        self.assertEqual(DEFAULT_SYNC_CHUNK_SIZE, get_sync_chunk_size({'feeds': {'sync_chunk_size': 'many'}}))
+        self.assertEqual(250, get_sync_chunk_size({'feeds': {'sync_chunk_size': '250'}}))
+
+
+class TestBulkSyncRepeats(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine, tables=[FeedMetadata.__table__, FeedGroupMetadata.__table__, NpmMetadata.__table__])
+        self.db = sessionmaker(bind=engine)()
+        self.db.add(FeedMetadata(name='test'))
+        self.db.add(FeedGroupMetadata(name='npm', feed_name='test'))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_latest_occurrence_stored(self):
+        pages = [page(('a', 1), ('b', 1)), page(('c', 1), ('a', 2)), page(('a', 3))]
+        feed = NpmPagedFeed(metadata=object(), src=PagedSource(pages))
+
+        with mock.patch('anchore_engine.services.policy_engine.engine.feeds.get_session', return_value=self.db), \
+                mock.patch('anchore_engine.services.policy_engine.engine.feeds.get_sync_chunk_size', return_value=2):
+            self.assertEqual(3, feed._bulk_sync_group(self.db.query(FeedGroupMetadata).one()))
+
+        self.assertEqual({'a': '3', 'b': '1', 'c': '1'}, {x.name: x.latest for x in self.db.query(NpmMetadata)})
+
+
+class TestPrefetch(unittest.TestCase):
+    def test_order_kept(self):
+        for depth in [0, 1, 3]:
+            self.assertEqual(list(range(10)), list(prefetch(iter(range(10)), depth=depth)))
+
+    def test_error_raised_to_consumer(self):
+        def failing():
+            yield 1
+            raise ValueError('fetch failed')
+
+        consumed = []
+        with self.assertRaises(ValueError):
+            for x in prefetch(failing(), depth=2):
+                consumed.append(x)
+        self.assertEqual([1], consumed)
+
+    def test_early_exit_stops_producer(self):
+        produced = []
+
+        def source():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        it = prefetch(source(), depth=1)
+        self.assertEqual(0, next(it))
+        it.close()
+        self.assertLess(len(produced), 100)
+
+    def test_worker_config(self):
+        self.assertEqual(1, get_sync_workers({}))
+        self.assertEqual(1, get_sync_workers({'feeds': {'sync_workers': 'all'}}))
+        self.assertEqual(4, get_sync_workers({'feeds': {'sync_workers': '4'}}))
+        self.assertEqual(1, get_sync_prefetch_chunks({}))
+        self.assertEqual(0, get_sync_prefetch_chunks({'feeds': {'sync_prefetch_chunks': -1}}))
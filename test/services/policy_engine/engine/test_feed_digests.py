@@ -0,0 +1,69 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import Vulnerability, FixedArtifact
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.feeds import VulnerabilityFeed, VulnerabilityFeedDataMapper
+
+
+def record(name, fix_version, description='A vuln'):
+    return {
+        'Vulnerability': {
+            'Name': name,
+            'NamespaceName': 'centos:7',
+            'Severity': 'High',
+            'Description': description,
+            'FixedIn': [{'Name': 'openssl', 'Version': fix_version, 'VersionFormat': 'rpm', 'NamespaceName': 'centos:7'}]
+        }
+    }
+
+
+class TestContentDigests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine, tables=[Vulnerability.__table__, FixedArtifact.__table__])
+        self.db = sessionmaker(bind=engine)()
+        self.mapper = VulnerabilityFeedDataMapper('vulnerabilities', 'centos:7', 'Name')
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_digest_normalized(self):
+        a = record('CVE-1', '1.0-1')
+        b = {'Vulnerability': dict(reversed(list(a['Vulnerability'].items())))}
+        self.assertEqual(self.mapper.map(a).content_digest, self.mapper.map(b).content_digest)
+        self.assertNotEqual(self.mapper.map(a).content_digest, self.mapper.map(record('CVE-1', '1.0-2')).content_digest)
+        self.assertNotEqual(self.mapper.map(a).content_digest, VulnerabilityFeedDataMapper('vulnerabilities', 'centos:8', 'Name').map(a).content_digest)
+
+    def test_skip_unchanged(self):
+        self.db.add(self.mapper.map(record('CVE-1', '1.0-1')))
+        self.db.add(self.mapper.map(record('CVE-2', '1.0-1')))
+        legacy = self.mapper.map(record('CVE-3', '1.0-1'))
+        legacy.content_digest = None
+        self.db.add(legacy)
+        self.db.commit()
+
+        chunk = [self.mapper.map(x) for x in [record('CVE-1', '1.0-1'), record('CVE-2', '1.0-1', description='Updated'), record('CVE-3', '1.0-1'), record('CVE-4', '1.0-1')]]
+        changed, existing_ids = VulnerabilityFeed._skip_unchanged(self.db, 'centos:7', chunk)
+        self.assertEqual(['CVE-2', 'CVE-3', 'CVE-4'], [x.id for x in changed])
+        self.assertEqual({'CVE-1', 'CVE-2', 'CVE-3'}, existing_ids)
+
+    def test_merge_stores_digest(self):
+        self.db.add(self.mapper.map(record('CVE-1', '1.0-1')))
+        self.db.commit()
+
+        feed = VulnerabilityFeed(metadata=object(), src=object())
+        updated = self.mapper.map(record('CVE-1', '1.0-2'))
+        merged, needs_update = feed._merge_vulnerability(self.db, updated, exists=True)
+        self.assertTrue(needs_update)
+
+        new, needs_update = feed._merge_vulnerability(self.db, self.mapper.map(record('CVE-2', '1.0-1')), exists=False)
+        self.assertTrue(needs_update)
+        self.db.commit()
+
+        self.assertEqual(updated.content_digest, self.db.query(Vulnerability).get(('CVE-1', 'centos:7')).content_digest)
+        self.assertEqual(['1.0-2'], [x.version for x in self.db.query(Vulnerability).get(('CVE-1', 'centos:7')).fixed_in])
+        self.assertIsNotNone(self.db.query(Vulnerability).get(('CVE-2', 'centos:7')).content_digest)
@@ -0,0 +1,78 @@
+import datetime
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import FeedMetadata, FeedGroupMetadata, Vulnerability, FixedArtifact
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine import feed_snapshot
+
+
+class TestFeedSnapshot(unittest.TestCase):
+    last_sync = datetime.datetime(2019, 3, 1, 12, 30, 15, 250)
+
+    def session(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine, tables=[FeedMetadata.__table__, FeedGroupMetadata.__table__] + feed_snapshot.feed_data_tables())
+        return sessionmaker(bind=engine)()
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'feeds.snapshot')
+
+        self.source = self.session()
+        feed = FeedMetadata(name='vulnerabilities', description='Vulns', access_tier=0, last_full_sync=self.last_sync)
+        feed.groups = [FeedGroupMetadata(name='centos:7', description='Centos 7', access_tier=0, last_sync=self.last_sync)]
+        self.source.add(feed)
+        for i in range(5):
+            v = Vulnerability(id='CVE-{}'.format(i), namespace_name='centos:7', severity='High', metadata_json={'i': i}, content_digest='sha256:{}'.format(i))
+            v.fixed_in = [FixedArtifact(name='openssl', version='1.0-{}'.format(i), version_format='rpm', epochless_version='1.0-{}'.format(i), version_key=b'\x00\x01\xff')]
+            self.source.add(v)
+        self.source.commit()
+
+    def tearDown(self):
+        self.source.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_round_trip(self):
+        manifest = feed_snapshot.export_snapshot(self.source, self.path, chunk_rows=2)
+        tables = {x['name']: x for x in manifest['tables']}
+        self.assertEqual(5, tables['feed_data_vulnerabilities']['row_count'])
+        self.assertEqual(3, len(tables['feed_data_vulnerabilities']['chunks']))
+        self.assertEqual(manifest, feed_snapshot.read_manifest(self.path))
+
+        target = self.session()
+        feed_snapshot.import_snapshot(target, self.path, batch_size=3)
+
+        group = target.query(FeedGroupMetadata).get(('centos:7', 'vulnerabilities'))
+        self.assertEqual(self.last_sync, group.last_sync)
+        self.assertEqual(self.last_sync, target.query(FeedMetadata).get('vulnerabilities').last_full_sync)
+
+        v = target.query(Vulnerability).get(('CVE-3', 'centos:7'))
+        self.assertEqual({'i': 3}, v.metadata_json)
+        self.assertEqual('sha256:3', v.content_digest)
+        self.assertEqual([('1.0-3', b'\x00\x01\xff')], [(x.version, x.version_key) for x in v.fixed_in])
+        self.assertEqual(5, target.query(FixedArtifact).count())
+
+        # Groups synced in the target can't be overwritten
+        with self.assertRaises(ValueError):
+            feed_snapshot.import_snapshot(target, self.path)
+        target.close()
+
+    def test_version_checked(self):
+        feed_snapshot.export_snapshot(self.source, self.path)
+        with tarfile.open(self.path, 'r') as archive:
+            manifest = json.loads(archive.extractfile(feed_snapshot.MANIFEST_NAME).read().decode('utf-8'))
+
+        manifest['db_version'] = '0.0.1'
+        with tarfile.open(self.path, 'a') as archive:
+            feed_snapshot._add_file(archive, feed_snapshot.MANIFEST_NAME, json.dumps(manifest).encode('utf-8'))
+
+        with self.assertRaises(ValueError):
+            feed_snapshot.read_manifest(self.path)
@@ -0,0 +1,41 @@
+import unittest
+
+from anchore_engine.services.policy_engine.engine.policy.gate import ExecutionContext
+from anchore_engine.services.policy_engine.engine.policy.gates.files import FileCheckGate, FilenameMatchTrigger
+
+
+class FakeImage(object):
+    def __init__(self, image_id, files):
+        self.user_id = 'admin'
+        self.id = image_id
+        self.fs = type('FakeFs', (object,), {'files': files})
+
+
+class TestFilenameMatchTrigger(unittest.TestCase):
+    files = {'/etc/passwd': {}, '/etc/ssl/server.pem': {}, '/root/.ssh/id_rsa': {}, '/usr/bin/ls': {}}
+
+    def _fired(self, trigger, image, context):
+        trigger.execute(image, context)
+        return sorted(m.msg for m in trigger.fired)
+
+    def test_batch_matches_individual(self):
+        image = FakeImage('img1', self.files)
+        triggers = [FilenameMatchTrigger(parent_gate_cls=FileCheckGate, regex=r) for r in ['/etc/.*', '.*\\.pem', '.*/id_(rsa|dsa)', '/nothing', '/etc/.*']]
+
+        individual = ExecutionContext(db_session=None, configuration={})
+        individual.data['filenames'] = list(self.files.keys())
+        expected = [self._fired(t, image, individual) for t in triggers]
+
+        batched = ExecutionContext(db_session=None, configuration={})
+        FilenameMatchTrigger.prepare_batch(triggers, image, batched)
+        self.assertEqual(expected, [self._fired(t, image, batched) for t in triggers])
+        self.assertEqual(['/etc/passwd', '/etc/ssl/server.pem'], batched.data['filename_regex_matches']['/etc/.*'])
+        self.assertEqual(2, len(expected[0]))
+        self.assertEqual([], expected[3])
+
+    def test_no_files(self):
+        image = FakeImage('img1', {})
+        trigger = FilenameMatchTrigger(parent_gate_cls=FileCheckGate, regex='.*')
+        context = ExecutionContext(db_session=None, configuration={})
+        FilenameMatchTrigger.prepare_batch([trigger], image, context)
+        self.assertEqual([], self._fired(trigger, image, context))
@@ -0,0 +1,71 @@
+import unittest
+
+from anchore_engine.services.policy_engine.engine.fix_index import FixRecord, NamespaceFixIndex, parse_version
+from anchore_engine.util.deb import compare_versions as dpkg_compare_versions
+from anchore_engine.util.rpm import compare_versions as rpm_compare_versions
+
+
+class DistroMeta(object):
+    def __init__(self, flavor):
+        self.flavor = flavor
+
+
+class Package(object):
+    def __init__(self, name, fullversion, flavor, pkg_type='rpm', normalized_src_pkg=None):
+        self.name = name
+        self.fullversion = fullversion
+        self.version = fullversion
+        self.pkg_type = pkg_type
+        self.normalized_src_pkg = normalized_src_pkg if normalized_src_pkg else name
+        self.src_pkg = self.normalized_src_pkg
+        self.distro_namespace_meta = DistroMeta(flavor)
+
+
+def fix(name, version, vuln_id='CVE-1', namespace='centos:7', version_format='rpm'):
+    return FixRecord(vuln_id, namespace, name, version, version_format, version, False)
+
+
+class TestFixIndex(unittest.TestCase):
+    rpm_versions = ['1.0-1.el7', '1.0-2.el7', '1.0.1-1.el7', '1.10-1.el7', '1.2-1.el7', '2.0~rc1-1', '2.0-1']
+    deb_versions = ['1.0-1', '1.0-1ubuntu1', '1.0~rc1-1', '1.0.1-1', '1.10', '1.2+dfsg-1', '1:0.9-1']
+
+    def test_rpm_matches_string_compare(self):
+        for pkg_version in self.rpm_versions:
+            for fix_version in self.rpm_versions:
+                p = Package('openssl', pkg_version, 'RHEL')
+                f = fix('openssl', fix_version)
+                expected = rpm_compare_versions(p.name, p.fullversion, f.name, f.epochless_version) < 0
+                self.assertEqual(expected, f.match_but_not_fixed(p), 'pkg {} fix {}'.format(pkg_version, fix_version))
+                self.assertEqual(expected, f.match_but_not_fixed(p, package_version=parse_version('RHEL', p.name, p.fullversion)))
+
+    def test_deb_matches_string_compare(self):
+        for pkg_version in self.deb_versions:
+            for fix_version in self.deb_versions:
+                p = Package('openssl', pkg_version, 'DEB', pkg_type='dpkg')
+                f = fix('openssl', fix_version, namespace='debian:9', version_format='dpkg')
+                expected = dpkg_compare_versions(p.fullversion, 'lt', f.epochless_version)
+                self.assertEqual(expected, f.match_but_not_fixed(p), 'pkg {} fix {}'.format(pkg_version, fix_version))
+
+    def test_none_version_and_name_mismatch(self):
+        p = Package('openssl', '1.0-1.el7', 'RHEL')
+        self.assertTrue(fix('openssl', 'None').match_but_not_fixed(p))
+        self.assertFalse(fix('bash', '9.0-1.el7').match_but_not_fixed(p))
+
+        p = Package('libssl', '1.0-1.el7', 'RHEL', normalized_src_pkg='openssl')
+        self.assertTrue(fix('openssl', '1.0-2.el7').match_but_not_fixed(p))
+
+    def test_namespace_index(self):
+        idx = NamespaceFixIndex('centos:7')
+        idx.add(fix('openssl', '1.0-2.el7', vuln_id='CVE-1'))
+        idx.add(fix('openssl', '1.0-3.el7', vuln_id='CVE-2'))
+        idx.add(fix('bash', '4.0-1.el7', vuln_id='CVE-2'))
+
+        self.assertEqual(3, idx.record_count())
+        self.assertEqual(2, len(idx.get('openssl')))
+        self.assertEqual([], idx.get('zlib'))
+        self.assertGreater(idx.memory_usage(), 0)
+
+        idx.remove_vulnerabilities({'CVE-2'})
+        self.assertEqual(1, idx.record_count())
+        self.assertEqual(['CVE-1'], [x.vulnerability_id for x in idx.get('openssl')])
+        self.assertEqual([], idx.get('bash'))
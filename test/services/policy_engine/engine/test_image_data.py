@@ -0,0 +1,54 @@
+import unittest
+
+from anchore_engine.services.policy_engine.engine.policy.gate import ExecutionContext, ImageDataProvider, image_dataset
+from anchore_engine.services.policy_engine.engine.policy import datasets
+
+
+class FakeImage(object):
+    def __init__(self, image_id, files=None):
+        self.user_id = 'admin'
+        self.id = image_id
+        self.fs = type('FakeFs', (object,), {'files': files}) if files is not None else None
+
+
+loads = []
+
+
+@image_dataset('test_counter')
+def load_counter(provider, image_obj, db):
+    loads.append(image_obj.id)
+    return len(loads)
+
+
+@image_dataset('test_dependent')
+def load_dependent(provider, image_obj, db):
+    return provider.get('test_counter', image_obj) * 10
+
+
+class TestImageDataProvider(unittest.TestCase):
+    def setUp(self):
+        del loads[:]
+
+    def test_memoized_per_image(self):
+        provider = ImageDataProvider(db_session=None)
+        img1 = FakeImage('img1')
+        self.assertEqual(1, provider.get('test_counter', img1))
+        self.assertEqual(1, provider.get('test_counter', img1))
+        self.assertEqual(10, provider.get('test_dependent', img1))
+        self.assertEqual(2, provider.get('test_counter', FakeImage('img2')))
+        self.assertEqual(['img1', 'img2'], loads)
+
+    def test_per_context(self):
+        img1 = FakeImage('img1')
+        ExecutionContext(db_session=None, configuration={}).image_data.get('test_counter', img1)
+        ExecutionContext(db_session=None, configuration={}).image_data.get('test_counter', img1)
+        self.assertEqual(['img1', 'img1'], loads)
+
+    def test_unknown(self):
+        with self.assertRaises(KeyError):
+            ImageDataProvider(db_session=None).get('not_a_dataset', FakeImage('img1'))
+
+    def test_filenames(self):
+        provider = ImageDataProvider(db_session=None)
+        self.assertEqual(['/etc/passwd'], provider.get(datasets.FILENAMES, FakeImage('img1', files={'/etc/passwd': {}})))
+        self.assertIsNone(provider.get(datasets.FILENAMES, FakeImage('img2')))
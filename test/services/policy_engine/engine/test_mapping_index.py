@@ -0,0 +1,93 @@
+import itertools
+import random
+import unittest
+
+from anchore_engine.services.policy_engine.engine.policy.bundles import ExecutableMapping, PolicyMappingRule
+from anchore_engine.util.matcher import is_match, regexify
+
+
+class FakeImage(object):
+    def __init__(self, image_id, digest):
+        self.id = image_id
+        self.digest = digest
+
+
+def _rule(registry, repository, match_type='tag', value='*'):
+    return {'registry': registry, 'repository': repository, 'image': {'type': match_type, 'value': value}, 'policy_id': 'p1', 'whitelist_ids': []}
+
+
+def _linear_rule_index(rules_json, image_obj, tag):
+    """
+    Reference first-match evaluation, without the index or compiled patterns
+    """
+    tag = tag.replace('dockerhub/', 'docker.io/') if tag.startswith('dockerhub/') else tag
+    registry, rest = tag.split('/', 1) if '/' in tag else ('docker.io', tag)
+    repository, tag_value = rest.rsplit(':', 1) if ':' in rest else (rest, 'latest')
+
+    for index, rule in enumerate(rules_json):
+        if not (is_match(regexify, rule['registry'], registry) and is_match(regexify, rule['repository'], repository)):
+            continue
+
+        image = rule['image']
+        if image['type'] == 'digest':
+            matched = image_obj is not None and image['value'] == image_obj.digest
+        elif image['type'] == 'id':
+            matched = image_obj is not None and image['value'] == image_obj.id
+        else:
+            # Tag rules never carry an image id or digest, so only the tag pattern applies
+            matched = is_match(regexify, image['value'], tag_value)
+
+        if matched:
+            return index
+
+    return None
+
+
+class TestExecutableMappingIndex(unittest.TestCase):
+    registries = ['docker.io', 'gcr.io', 'quay.io', '*', '*.io', 'docker.*']
+    repositories = ['library/nginx', 'library/centos', 'myorg/app', '*', 'library/*', '*/app']
+    tags = ['latest', '7', '*', '1.*']
+
+    def test_first_match_ordering(self):
+        rules = [
+            _rule('docker.io', 'library/nginx', value='1.*'),
+            _rule('*', '*', value='latest'),
+            _rule('docker.io', 'library/nginx'),
+            _rule('*', 'library/*')
+        ]
+        mapping = ExecutableMapping(rules, rule_cls=PolicyMappingRule)
+        self.assertEqual(0, mapping.rule_index(None, 'docker.io/library/nginx:1.13'))
+        self.assertEqual(1, mapping.rule_index(None, 'docker.io/library/nginx:latest'))
+        self.assertEqual(2, mapping.rule_index(None, 'docker.io/library/nginx:2.0'))
+        self.assertEqual(3, mapping.rule_index(None, 'gcr.io/library/centos:7'))
+        self.assertIsNone(mapping.rule_index(None, 'gcr.io/myorg/app:7'))
+        self.assertIs(mapping.mapping_rules[2], mapping.execute(None, 'dockerhub/library/nginx:2.0'))
+
+    def test_matches_linear_scan(self):
+        rnd = random.Random(42)
+        rules = []
+        for i in range(300):
+            match_type = rnd.choice(['tag', 'tag', 'tag', 'id', 'digest'])
+            value = rnd.choice(self.tags) if match_type == 'tag' else rnd.choice(['img1', 'sha256:abc'])
+            rules.append(_rule(rnd.choice(self.registries), rnd.choice(self.repositories), match_type, value))
+
+        images = [FakeImage('img1', 'sha256:abc'), FakeImage('img2', 'sha256:def')]
+        tag_inputs = ['{}/{}:{}'.format(reg, repo, tag) for reg, repo, tag in itertools.product(['docker.io', 'gcr.io', 'quay.io', 'registry.example.com'], ['library/nginx', 'library/centos', 'myorg/app', 'other/thing'], ['latest', '7', '1.13'])]
+
+        mapping = ExecutableMapping(rules, rule_cls=PolicyMappingRule)
+        for image_obj, tag in itertools.product(images, tag_inputs):
+            self.assertEqual(_linear_rule_index(rules, image_obj, tag), mapping.rule_index(image_obj, tag), tag)
+
+        # Without an image only tag rules can be evaluated
+        tag_rules = [r for r in rules if r['image']['type'] == 'tag']
+        mapping = ExecutableMapping(tag_rules, rule_cls=PolicyMappingRule)
+        for tag in tag_inputs:
+            self.assertEqual(_linear_rule_index(tag_rules, None, tag), mapping.rule_index(None, tag), tag)
+
+    def test_restricted_rules(self):
+        mapping = ExecutableMapping([_rule('docker.io', 'library/nginx'), _rule('*', '*')], rule_cls=PolicyMappingRule)
+        mapping.mapping_rules = mapping.mapping_rules[1:]
+        self.assertEqual(0, mapping.rule_index(None, 'docker.io/library/nginx:latest'))
+
+    def test_empty(self):
+        self.assertIsNone(ExecutableMapping([], rule_cls=PolicyMappingRule).rule_index(None, 'docker.io/library/nginx:latest'))
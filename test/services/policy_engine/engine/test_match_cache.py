@@ -0,0 +1,75 @@
+import datetime
+import unittest
+
+from anchore_engine.services.policy_engine.engine.match_cache import PackageMatchCache, MatchKey, MatchedFix
+
+
+def _key(namespace_name, name, version='1.0', pattern=None):
+    return MatchKey(namespace_name=namespace_name, name=name, normalized_src_pkg=name, version=version, fullversion=version,
+                    pkg_type='rpm', flavor='RHEL', semver_key=None, semver_namespace_pattern=pattern)
+
+
+def _fix(vuln_id, namespace_name, name):
+    return MatchedFix(vulnerability_id=vuln_id, namespace_name=namespace_name, name=name, version='2.0')
+
+
+class TestPackageMatchCache(unittest.TestCase):
+    def test_hit_miss(self):
+        c = PackageMatchCache(max_entries=10)
+        k = _key('centos:7', 'openssl')
+        self.assertIsNone(c.lookup(k))
+        c.cache_it(k, [_fix('CVE-1', 'centos:7', 'openssl')])
+        self.assertEqual(c.lookup(k), (_fix('CVE-1', 'centos:7', 'openssl'),))
+
+        # Empty results are cached too
+        k2 = _key('centos:7', 'bash')
+        c.cache_it(k2, [])
+        self.assertEqual(c.lookup(k2), ())
+        self.assertEqual(c.stats()['hits'], 2)
+        self.assertEqual(c.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        c = PackageMatchCache(max_entries=2)
+        k1 = _key('centos:7', 'a')
+        k2 = _key('centos:7', 'b')
+        k3 = _key('centos:7', 'c')
+        c.cache_it(k1, [])
+        c.cache_it(k2, [])
+        c.lookup(k1)
+        c.cache_it(k3, [])
+        self.assertEqual(c.size(), 2)
+        self.assertIsNotNone(c.lookup(k1))
+        self.assertIsNone(c.lookup(k2))
+
+    def test_invalidate_namespace(self):
+        c = PackageMatchCache(max_entries=10)
+        c.cache_it(_key('centos:7', 'a'), [])
+        c.cache_it(_key('debian:9', 'a'), [])
+        c.cache_it(_key('npm:N/A', 'lodash', pattern='%js%'), [])
+        self.assertEqual(c.invalidate_namespace('centos:7'), 1)
+        self.assertIsNone(c.lookup(_key('centos:7', 'a')))
+        self.assertIsNotNone(c.lookup(_key('debian:9', 'a')))
+
+        # Semver matched entries depend on any group matching their pattern
+        self.assertEqual(c.invalidate_namespace('snyk:js'), 1)
+        self.assertIsNone(c.lookup(_key('npm:N/A', 'lodash', pattern='%js%')))
+
+    def test_validate_stamps(self):
+        c = PackageMatchCache(max_entries=10)
+        t1 = datetime.datetime(2018, 1, 1)
+        t2 = datetime.datetime(2018, 1, 2)
+        c.validate({'centos:7': t1, 'debian:9': t1})
+        c.cache_it(_key('centos:7', 'a'), [])
+        c.cache_it(_key('debian:9', 'a'), [])
+
+        c.validate({'centos:7': t1, 'debian:9': t1})
+        self.assertEqual(c.size(), 2)
+
+        c.validate({'centos:7': t2, 'debian:9': t1})
+        self.assertIsNone(c.lookup(_key('centos:7', 'a')))
+        self.assertIsNotNone(c.lookup(_key('debian:9', 'a')))
+
+    def test_disabled(self):
+        c = PackageMatchCache(max_entries=0)
+        c.cache_it(_key('centos:7', 'a'), [])
+        self.assertIsNone(c.lookup(_key('centos:7', 'a')))
@@ -0,0 +1,85 @@
+import datetime
+import unittest
+
+from anchore_engine.services.policy_engine.engine.report_cache import VulnerabilityReportCache, ReportKey, report_etag, etag_matches, _is_relevant_group
+
+t0 = datetime.datetime(2019, 1, 1)
+t1 = datetime.datetime(2019, 1, 2)
+
+
+def _version(image_modified=t0, last_sync=t0):
+    return image_modified, (('nvd', 'nvddb:2019', last_sync), ('vulnerabilities', 'centos:7', last_sync))
+
+
+class TestVulnerabilityReportCache(unittest.TestCase):
+    def test_versioned_lookup(self):
+        c = VulnerabilityReportCache(max_entries=10)
+        k = ReportKey(user_id='admin', image_id='img1', vendor_only=True)
+        self.assertIsNone(c.lookup(k, _version()))
+
+        c.cache_it(k, _version(), '"etag"', {'image_id': 'img1'})
+        self.assertEqual({'image_id': 'img1'}, c.lookup(k, _version()).report)
+        self.assertIsNone(c.lookup(ReportKey(user_id='admin', image_id='img1', vendor_only=False), _version()))
+
+        # A rescan or a feed group sync changes the version, and the stale entry is dropped
+        self.assertIsNone(c.lookup(k, _version(image_modified=t1)))
+        self.assertEqual(0, c.size())
+
+        c.cache_it(k, _version(), '"etag"', {'image_id': 'img1'})
+        self.assertIsNone(c.lookup(k, _version(last_sync=t1)))
+        self.assertEqual({'hits': 1, 'misses': 4, 'size': 0, 'max_entries': 10}, c.stats())
+
+    def test_lru_eviction(self):
+        c = VulnerabilityReportCache(max_entries=2)
+        keys = [ReportKey(user_id='admin', image_id=x, vendor_only=True) for x in ['a', 'b', 'c']]
+        c.cache_it(keys[0], _version(), '"a"', {})
+        c.cache_it(keys[1], _version(), '"b"', {})
+        c.lookup(keys[0], _version())
+        c.cache_it(keys[2], _version(), '"c"', {})
+        self.assertEqual(2, c.size())
+        self.assertIsNotNone(c.lookup(keys[0], _version()))
+        self.assertIsNone(c.lookup(keys[1], _version()))
+
+    def test_invalidate_image(self):
+        c = VulnerabilityReportCache(max_entries=10)
+        for vendor_only in [True, False]:
+            c.cache_it(ReportKey(user_id='admin', image_id='img1', vendor_only=vendor_only), _version(), '"a"', {})
+        c.cache_it(ReportKey(user_id='admin', image_id='img2', vendor_only=True), _version(), '"b"', {})
+
+        self.assertEqual(2, c.invalidate_image('admin', 'img1'))
+        self.assertEqual(1, c.size())
+
+    def test_disabled(self):
+        c = VulnerabilityReportCache(max_entries=0)
+        k = ReportKey(user_id='admin', image_id='img1', vendor_only=True)
+        c.cache_it(k, _version(), '"a"', {})
+        self.assertIsNone(c.lookup(k, _version()))
+
+
+class TestReportEtag(unittest.TestCase):
+    def test_etag(self):
+        k = ReportKey(user_id='admin', image_id='img1', vendor_only=True)
+        etag = report_etag(k, _version())
+        self.assertEqual(etag, report_etag(ReportKey(user_id='admin', image_id='img1', vendor_only=True), _version()))
+        self.assertNotEqual(etag, report_etag(k, _version(last_sync=t1)))
+        self.assertNotEqual(etag, report_etag(k, _version(image_modified=t1)))
+        self.assertNotEqual(etag, report_etag(ReportKey(user_id='admin', image_id='img1', vendor_only=False), _version()))
+        self.assertNotEqual(etag, report_etag(k, (t0, (('vulnerabilities', 'centos:7', None),))))
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"abc"', '"abc"'))
+        self.assertTrue(etag_matches('"xyz", "abc"', '"abc"'))
+        self.assertTrue(etag_matches('W/"abc"', '"abc"'))
+        self.assertTrue(etag_matches('*', '"abc"'))
+        self.assertFalse(etag_matches('"xyz"', '"abc"'))
+        self.assertFalse(etag_matches(None, '"abc"'))
+
+    def test_relevant_groups(self):
+        namespaces = {'centos:7', 'rhel:7'}
+        self.assertTrue(_is_relevant_group('vulnerabilities', 'centos:7', namespaces))
+        self.assertTrue(_is_relevant_group('vulnerabilities', 'rhel:7', namespaces))
+        self.assertTrue(_is_relevant_group('nvd', 'nvddb:2019', namespaces))
+        self.assertTrue(_is_relevant_group('snyk', 'snyk:java', namespaces))
+        self.assertTrue(_is_relevant_group('vulnerabilities', 'github:python', namespaces))
+        self.assertFalse(_is_relevant_group('vulnerabilities', 'debian:9', namespaces))
+        self.assertFalse(_is_relevant_group('packages', 'gem', namespaces))
@@ -0,0 +1,49 @@
+import threading
+import unittest
+
+from anchore_engine.services.policy_engine.engine.rescan import ImageRescanner
+
+
+class FakeRescanner(ImageRescanner):
+    """
+    Rescanner with the db access replaced by in-memory image ids and per-image statuses
+    """
+
+    def __init__(self, images, statuses, **kwargs):
+        super(FakeRescanner, self).__init__(**kwargs)
+        self.images = images
+        self.statuses = statuses
+        self.rescanned = []
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def _image_id_chunks(self, from_time, to_time):
+        for i in range(0, len(self.images), self.chunk_size):
+            yield self.images[i:i + self.chunk_size]
+
+    def _rescan_one(self, img):
+        with self._lock:
+            self.rescanned.append(img)
+            self.threads.add(threading.current_thread().name)
+        return self.statuses.get(img, 'success')
+
+
+class TestImageRescanner(unittest.TestCase):
+
+    def test_rescan_all(self):
+        images = [('img{}'.format(i), 'admin') for i in range(53)]
+        statuses = {images[3]: 'fail', images[10]: 'missing'}
+        rescanner = FakeRescanner(images, statuses, workers=4, chunk_size=5)
+
+        self.assertEqual(51, rescanner.rescan_images_created_between(None, None))
+        self.assertEqual(sorted(images), sorted(rescanner.rescanned))
+
+    def test_no_images(self):
+        rescanner = FakeRescanner([], {}, workers=2, chunk_size=5)
+        self.assertEqual(0, rescanner.rescan_images_created_between(None, None))
+
+    def test_bounds(self):
+        rescanner = ImageRescanner(workers=0, chunk_size=0, max_retries=0)
+        self.assertEqual(1, rescanner.workers)
+        self.assertEqual(1, rescanner.chunk_size)
+        self.assertEqual(1, rescanner.max_retries)
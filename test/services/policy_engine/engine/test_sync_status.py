@@ -0,0 +1,53 @@
+import unittest
+
+from anchore_engine.services.policy_engine.engine.sync_status import FeedSyncStatus
+
+
+class TestFeedSyncStatus(unittest.TestCase):
+
+    def setUp(self):
+        self.status = FeedSyncStatus()
+
+    def sync_group(self, feed, group, pages=2, records=10):
+        self.status.group_started(feed, group)
+        for i in range(pages):
+            self.status.page_fetched(feed, group, records)
+        self.status.records_merged(feed, group, pages * records, 0.5)
+        self.status.match_updated(group, 0.25, 3)
+        self.status.group_finished(feed, group)
+
+    def test_progress(self):
+        self.status.sync_started('incremental')
+        self.status.groups_queued('vulnerabilities', ['alpine:3.8', 'centos:7'])
+        self.sync_group('vulnerabilities', 'alpine:3.8')
+        self.status.group_started('vulnerabilities', 'centos:7')
+
+        status = self.status.status()
+        self.assertTrue(status['in_progress'])
+        self.assertEqual(2, status['groups_total'])
+        self.assertEqual(1, status['groups_completed'])
+        self.assertEqual(['vulnerabilities/centos:7'], status['groups_syncing'])
+
+        alpine = status['groups'][0]
+        self.assertEqual(('complete', 2, 20, 20, 3), (alpine['state'], alpine['pages_fetched'], alpine['records_fetched'], alpine['records_merged'], alpine['images_updated']))
+        self.assertEqual(0.25, alpine['match_update_seconds'])
+
+        # Estimated from the only known duration
+        self.assertIsNotNone(status['estimated_remaining_seconds'])
+        self.assertIsNotNone(status['estimated_completion'])
+
+        self.status.group_finished('vulnerabilities', 'centos:7', success=False)
+        self.status.sync_finished()
+        status = self.status.status()
+        self.assertFalse(status['in_progress'])
+        self.assertEqual('failed', status['groups'][1]['state'])
+        self.assertEqual(0.0, status['estimated_remaining_seconds'])
+
+    def test_no_history(self):
+        self.status.sync_started('bulk')
+        self.status.groups_queued('nvd', ['nvddb:2019'])
+        self.assertIsNone(self.status.status()['estimated_remaining_seconds'])
+
+        # Match updates for groups not being synced are ignored
+        self.status.match_updated('nvddb:2019', 1.0, 5)
+        self.assertEqual(0, self.status.status()['groups'][0]['images_updated'])
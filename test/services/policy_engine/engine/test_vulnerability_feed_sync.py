@@ -0,0 +1,123 @@
+import time
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import FeedMetadata, FeedGroupMetadata, FixedArtifact, Vulnerability, VulnerableArtifact, DistroMapping, Image, ImagePackage, \
+    ImageVulnerabilitySummary
+from anchore_engine.db.entities.common import Base
+from anchore_engine.db.entities.policy_engine import DistroMappingCache, DistroMappingRecord
+from anchore_engine.services.policy_engine.engine import feeds, tasks, vulnerabilities
+from anchore_engine.services.policy_engine.engine.feeds import VulnerabilityFeed
+from anchore_engine.services.policy_engine.engine.sync_status import FeedSyncStatus
+from anchore_engine.services.policy_engine.engine.tasks import FeedsUpdateTask
+from anchore_engine.services.policy_engine.engine.vulnerability_summary import STALE_SUMMARIES_KEY
+from test.services.policy_engine.engine.test_vulnerability_report import report_tables
+
+
+def vulnerability(vuln_id, severity='High', fixes=None):
+    v = Vulnerability(id=vuln_id, namespace_name='centos:7', severity=severity, link='https://vulns/{}'.format(vuln_id))
+    v.fixed_in = [FixedArtifact(name=name, version=version, version_format='rpm', epochless_version=version) for name, version in (fixes or [])]
+    return v
+
+
+class TestVulnerabilityGroupSync(unittest.TestCase):
+    """
+    Drives VulnerabilityFeed._sync_group() with mapped records, as they come from the feed source, on an in-memory db
+
+    """
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine, tables=report_tables() + [VulnerableArtifact.__table__, FeedMetadata.__table__, FeedGroupMetadata.__table__,
+                                                           ImageVulnerabilitySummary.__table__])
+        self.db = sessionmaker(bind=self.engine)()
+        self.db.add(FeedMetadata(name='vulnerabilities'))
+        self.db.add(FeedGroupMetadata(name='centos:7', feed_name='vulnerabilities'))
+        self.db.commit()
+        self.status = FeedSyncStatus()
+
+    def tearDown(self):
+        self.db.close()
+
+    def sync(self, chunks, **kwargs):
+        feed = VulnerabilityFeed(metadata=object(), src=object())
+        with mock.patch.object(feeds, 'get_session', return_value=self.db), \
+                mock.patch.object(feeds, 'get_sync_status', return_value=self.status), \
+                mock.patch.object(tasks, 'get_sync_status', return_value=self.status), \
+                mock.patch.object(vulnerabilities, 'get_thread_scoped_session', return_value=self.db), \
+                mock.patch.object(DistroMapping, 'cache', DistroMappingCache(loader=lambda: [DistroMappingRecord('centos', 'centos', 'RHEL')])), \
+                mock.patch.object(feed, '_get_prefetched_data', return_value=iter(chunks)):
+            self.status.group_started('vulnerabilities', 'centos:7')
+            return feed._sync_group(self.db.query(FeedGroupMetadata).one(), **kwargs)
+
+    def test_merge_time_excludes_match_updates(self):
+        def slow_match_update(db, vuln):
+            time.sleep(0.1)
+            return [('admin', vuln.id)]
+
+        updated = self.sync([[vulnerability('CVE-1'), vulnerability('CVE-2')], [vulnerability('CVE-3')]], vulnerability_processing_fn=slow_match_update)
+        self.assertEqual({('admin', 'CVE-1'), ('admin', 'CVE-2'), ('admin', 'CVE-3')}, updated)
+        self.assertEqual(3, self.db.query(Vulnerability).count())
+
+        group = self.status.status()['groups'][0]
+        self.assertEqual(3, group['records_merged'])
+        self.assertLess(group['merge_seconds'], 0.15)
+
+    def add_image(self, image_id, package_versions):
+        self.db.add(Image(id=image_id, user_id='admin', state='analyzed'))
+        for name, version in package_versions:
+            self.db.add(ImagePackage(image_id=image_id, image_user_id='admin', name=name, version=version, fullversion=version, release='1', pkg_type='rpm',
+                                     arch='x86_64', pkg_path='pkgdb', normalized_src_pkg=name, distro_name='centos', distro_version='7'))
+        self.db.commit()
+
+    def summary(self, image_id):
+        self.db.expire_all()
+        return self.db.query(ImageVulnerabilitySummary).get(('admin', image_id))
+
+    def check_summaries_follow_updates(self, **kwargs):
+        self.add_image('img1', [('pkg1', '1.0'), ('pkg2', '1.0')])
+        self.add_image('img2', [('pkg1', '3.0')])
+
+        updated = self.sync([[vulnerability('CVE-1', fixes=[('pkg1', '2.0')])], [vulnerability('CVE-2', severity='Low', fixes=[('pkg2', '2.0')])]], **kwargs)
+        self.assertEqual({('admin', 'img1')}, updated)
+        summary = self.summary('img1')
+        self.assertEqual((2, 1, 1, 2), (summary.total_count, summary.high_count, summary.low_count, summary.fixable_count))
+        self.assertIsNone(self.summary('img2'))
+
+        # A severity change keeps the matches but changes the counts, the fix version change removes the other match
+        self.sync([[vulnerability('CVE-1', severity='Critical', fixes=[('pkg1', '2.0')]), vulnerability('CVE-2', fixes=[('pkg2', '0.5')])]], **kwargs)
+        summary = self.summary('img1')
+        self.assertEqual((1, 1, 0, 0), (summary.total_count, summary.critical_count, summary.high_count, summary.low_count))
+        self.assertEqual(1, self.db.query(ImageVulnerabilitySummary).count())
+        self.assertNotIn(STALE_SUMMARIES_KEY, self.db.info)
+
+    def test_item_updates_summaries(self):
+        self.check_summaries_follow_updates(vulnerability_processing_fn=FeedsUpdateTask.process_updated_vulnerability)
+
+    def test_page_updates_summaries(self):
+        self.check_summaries_follow_updates(page_processing_fn=FeedsUpdateTask.process_updated_vulnerabilities)
+
+    def test_summaries_recomputed_once_per_group(self):
+        self.add_image('img1', [('pkg1', '1.0'), ('pkg2', '1.0')])
+
+        with mock.patch('anchore_engine.services.policy_engine.engine.vulnerability_summary.update_vulnerability_summaries', return_value=1) as update:
+            self.sync([[vulnerability('CVE-1', fixes=[('pkg1', '2.0')]), vulnerability('CVE-2', fixes=[('pkg2', '2.0')])], [vulnerability('CVE-3', fixes=[('pkg1', '2.0')])]],
+                      vulnerability_processing_fn=FeedsUpdateTask.process_updated_vulnerability)
+
+        update.assert_called_once_with(self.db, {('admin', 'img1')})
+
+    def test_failed_sync_discards_stale_images(self):
+        self.add_image('img1', [('pkg1', '1.0')])
+
+        def failing_match_update(db, vuln):
+            FeedsUpdateTask.process_updated_vulnerability(db, vuln)
+            raise ValueError('match update failed')
+
+        with self.assertRaises(ValueError):
+            self.sync([[vulnerability('CVE-1', fixes=[('pkg1', '2.0')])]], vulnerability_processing_fn=failing_match_update)
+
+        self.assertNotIn(STALE_SUMMARIES_KEY, self.db.info)
+        self.assertIsNone(self.summary('img1'))
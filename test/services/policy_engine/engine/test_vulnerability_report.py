@@ -0,0 +1,94 @@
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import Image, ImagePackage, ImagePackageVulnerability, Vulnerability, FixedArtifact
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.vulnerability_report import load_image_vulnerabilities, legacy_report_rows, legacy_report
+
+
+def populate_image(db, user_id, image_id, finding_count):
+    """
+    Add an image with finding_count package vulnerability matches, each vulnerability having several fix records of which one applies
+    to the matched package. Every fourth fix won't be addressed by the vendor and every fifth is a semver range.
+
+    """
+    db.add(Image(id=image_id, user_id=user_id, state='analyzed'))
+    for i in range(finding_count):
+        name = 'pkg{}'.format(i)
+        db.add(ImagePackage(image_id=image_id, image_user_id=user_id, name=name, version='1.0', fullversion='1.0-{}'.format(i), pkg_type='rpm',
+                            arch='x86_64', pkg_path='pkgdb', normalized_src_pkg='src{}'.format(i)))
+
+        vulnerability = Vulnerability(id='CVE-{}-{}'.format(image_id, i), namespace_name='centos:7', severity='High', link='https://vulns/{}'.format(i),
+                                      metadata_json={'cves': ['CVE-2019-{}'.format(i)]} if i % 2 else None)
+        vulnerability.fixed_in = [FixedArtifact(name=fix_name, version='2.0-{}'.format(i), version_format='semver' if i % 5 == 0 else 'rpm',
+                                                epochless_version='2.0-{}'.format(i), vendor_no_advisory=(i % 4 == 0) and fix_name == name)
+                                  for fix_name in [name, 'other{}'.format(i), 'another{}'.format(i)]]
+        db.add(vulnerability)
+
+        db.add(ImagePackageVulnerability(pkg_user_id=user_id, pkg_image_id=image_id, pkg_name=name, pkg_version='1.0', pkg_type='rpm', pkg_arch='x86_64',
+                                         pkg_path='pkgdb', vulnerability_id=vulnerability.id, vulnerability_namespace_name='centos:7'))
+    db.commit()
+
+
+def lazy_report_rows(db, user_id, image_id, vendor_only=False):
+    """
+    The report as built before, from matches loaded without their relationships
+    """
+    vulns = db.query(ImagePackageVulnerability).filter(ImagePackageVulnerability.pkg_user_id == user_id, ImagePackageVulnerability.pkg_image_id == image_id).all()
+    return legacy_report_rows(vulns, vendor_only=vendor_only)
+
+
+def report_tables():
+    return [Image.__table__, ImagePackage.__table__, ImagePackageVulnerability.__table__, Vulnerability.__table__, FixedArtifact.__table__]
+
+
+class TestVulnerabilityReport(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine, tables=report_tables())
+        self.db = sessionmaker(bind=self.engine)()
+        populate_image(self.db, 'admin', 'img1', 20)
+        populate_image(self.db, 'user1', 'img2', 5)
+        self.db.expunge_all()
+
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.count_statement)
+        self.db.close()
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def test_same_output(self):
+        for vendor_only in [False, True]:
+            expected = lazy_report_rows(self.db, 'admin', 'img1', vendor_only=vendor_only)
+            self.db.expunge_all()
+
+            rows = legacy_report_rows(load_image_vulnerabilities(self.db, 'admin', 'img1'), vendor_only=vendor_only)
+            self.db.expunge_all()
+            self.assertEqual(sorted(expected), sorted(rows))
+
+        self.assertEqual(20, len(legacy_report_rows(load_image_vulnerabilities(self.db, 'admin', 'img1'))))
+        self.assertEqual(15, len(legacy_report_rows(load_image_vulnerabilities(self.db, 'admin', 'img1'), vendor_only=True)))
+
+    def test_eager_load(self):
+        rows = legacy_report_rows(load_image_vulnerabilities(self.db, 'admin', 'img1'), vendor_only=True)
+        # The matches with packages and vulnerabilities, then the fixed artifacts of all the vulnerabilities
+        self.assertEqual(2, len(self.statements))
+        self.assertEqual(15, len(rows))
+
+        fixes = {x[0]: x[4] for x in rows}
+        self.assertEqual('2.0-1', fixes['CVE-img1-1'])
+        self.assertEqual('! 2.0-5', fixes['CVE-img1-5'])
+
+    def test_report(self):
+        report = legacy_report(legacy_report_rows(load_image_vulnerabilities(self.db, 'user1', 'img2')), warns=['a warning'])
+        self.assertEqual(5, report['multi']['result']['rowcount'])
+        self.assertEqual(14, report['multi']['result']['colcount'])
+        self.assertEqual(['a warning'], report['multi']['warns'])
+        self.assertEqual({'img2'}, {x[5] for x in report['multi']['result']['rows']})
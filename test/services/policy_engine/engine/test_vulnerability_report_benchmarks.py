@@ -0,0 +1,55 @@
+"""
+Benchmarks for the legacy vulnerability report, run with pytest-benchmark:
+
+    pytest test/services/policy_engine/engine/test_vulnerability_report_benchmarks.py --benchmark-only
+
+The report of an image with 800 findings is built from lazily loaded matches and from eagerly loaded ones. The p99 latency of each
+is recorded in the benchmark's extra_info, next to the statistics pytest-benchmark reports itself.
+
+"""
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.vulnerability_report import load_image_vulnerabilities, legacy_report_rows
+from test.services.policy_engine.engine.test_vulnerability_report import populate_image, lazy_report_rows, report_tables
+
+finding_count = 800
+
+
+@pytest.fixture(scope='module')
+def db_session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=report_tables())
+    db = sessionmaker(bind=engine)()
+    populate_image(db, 'admin', 'img1', finding_count)
+    db.expunge_all()
+    yield db
+    db.close()
+
+
+def _p99(benchmark):
+    data = sorted(benchmark.stats.stats.data)
+    return data[min(len(data) - 1, int(len(data) * 0.99))]
+
+
+def _run(db, fn):
+    # Start from an empty identity map each round, as a new request would
+    db.expunge_all()
+    rows = fn()
+    assert len(rows) == finding_count
+    return rows
+
+
+def test_report_lazy(benchmark, db_session):
+    benchmark(_run, db_session, lambda: lazy_report_rows(db_session, 'admin', 'img1'))
+    benchmark.extra_info['p99'] = _p99(benchmark)
+
+
+def test_report_eager(benchmark, db_session):
+    benchmark(_run, db_session, lambda: legacy_report_rows(load_image_vulnerabilities(db_session, 'admin', 'img1')))
+    benchmark.extra_info['p99'] = _p99(benchmark)
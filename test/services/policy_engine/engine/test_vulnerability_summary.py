@@ -0,0 +1,62 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anchore_engine.db import ImagePackageVulnerability, ImageVulnerabilitySummary, Vulnerability
+from anchore_engine.db.entities.common import Base
+from anchore_engine.services.policy_engine.engine.vulnerability_summary import update_vulnerability_summaries, images_with_matches
+from test.services.policy_engine.engine.test_vulnerability_report import populate_image, report_tables
+
+
+class TestVulnerabilitySummary(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine, tables=report_tables() + [ImageVulnerabilitySummary.__table__])
+        self.db = sessionmaker(bind=self.engine)()
+        populate_image(self.db, 'admin', 'img1', 20)
+        populate_image(self.db, 'user1', 'img2', 5)
+
+    def tearDown(self):
+        self.db.close()
+
+    def summary(self, user_id, image_id):
+        return self.db.query(ImageVulnerabilitySummary).get((user_id, image_id))
+
+    def test_update(self):
+        self.assertEqual(2, update_vulnerability_summaries(self.db, [('admin', 'img1'), ('user1', 'img2'), ('admin', 'missing')]))
+        self.db.commit()
+
+        summary = self.summary('admin', 'img1')
+        self.assertEqual(20, summary.total_count)
+        self.assertEqual(20, summary.high_count)
+        self.assertEqual(0, summary.critical_count)
+        self.assertEqual(20, summary.fixable_count)
+        self.assertEqual(5, summary.vendor_no_advisory_count)
+        self.assertIsNotNone(summary.last_updated)
+        self.assertEqual(5, self.summary('user1', 'img2').total_count)
+        self.assertIsNone(self.summary('admin', 'missing'))
+
+    def test_update_after_changes(self):
+        update_vulnerability_summaries(self.db, [('admin', 'img1')])
+        self.db.commit()
+
+        vulnerability = self.db.query(Vulnerability).get(('CVE-img1-1', 'centos:7'))
+        vulnerability.severity = 'Critical'
+        self.db.query(ImagePackageVulnerability).filter(ImagePackageVulnerability.vulnerability_id == 'CVE-img1-2').delete(synchronize_session=False)
+        self.db.flush()
+
+        update_vulnerability_summaries(self.db, [('admin', 'img1')])
+        self.db.commit()
+
+        summary = self.summary('admin', 'img1')
+        self.assertEqual(19, summary.total_count)
+        self.assertEqual(1, summary.critical_count)
+        self.assertEqual(18, summary.high_count)
+        self.assertEqual(1, self.db.query(ImageVulnerabilitySummary).count())
+
+    def test_images_with_matches(self):
+        self.assertEqual({('admin', 'img1'), ('user1', 'img2')}, images_with_matches(self.db, 'centos:7'))
+        self.assertEqual({('user1', 'img2')}, images_with_matches(self.db, 'centos:7', ['CVE-img2-3']))
+        self.assertEqual(set(), images_with_matches(self.db, 'debian:9'))
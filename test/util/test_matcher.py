@@ -0,0 +1,65 @@
+import itertools
+import re
+import unittest
+
+from anchore_engine.util.matcher import MultiRegexMatcher
+
+
+class TestMultiRegexMatcher(unittest.TestCase):
+    patterns = [
+        '.*\\.pem',
+        '/etc/.*',
+        '/etc/passwd',
+        '.*/id_(rsa|dsa)',
+        '(?i).*\\.KEY$',
+        '(.*)/\\1',
+        '(?P<name>.*)\\.conf',
+        '.*/a$|.*/b',
+        '',
+        '/usr/lib/[',
+        'x*'
+    ]
+
+    inputs = [
+        '/etc/passwd',
+        '/etc/ssl/server.pem',
+        '/root/.ssh/id_rsa',
+        '/root/.ssh/id_ecdsa',
+        '/opt/server.key',
+        '/opt/opt',
+        '/etc/nginx/nginx.conf',
+        '/tmp/a',
+        '/tmp/a\n',
+        '/tmp/b/c',
+        '/usr/lib/libc.so'
+    ]
+
+    def _expected(self, patterns, input_str):
+        matched = []
+        for p in patterns:
+            try:
+                if re.match(p, input_str):
+                    matched.append(p)
+            except re.error:
+                pass
+        return matched
+
+    def test_matches_each_regex(self):
+        matcher = MultiRegexMatcher(self.patterns)
+        for input_str in self.inputs:
+            self.assertEqual(sorted(self._expected(self.patterns, input_str)), sorted(matcher.match(input_str)), input_str)
+
+    def test_pattern_order(self):
+        for patterns in itertools.permutations(['.*\\.pem', '/etc/.*', '.*', '(a)\\1']):
+            matcher = MultiRegexMatcher(patterns)
+            for input_str in ['/etc/ssl/server.pem', '/usr/bin/ls', 'aa']:
+                self.assertEqual(sorted(self._expected(patterns, input_str)), sorted(matcher.match(input_str)), patterns)
+
+    def test_match_all(self):
+        matcher = MultiRegexMatcher(['/etc/.*', '.*\\.pem', '/etc/.*', '/usr/lib/['])
+        results = matcher.match_all(['/etc/passwd', '/etc/ssl/server.pem', '/usr/bin/ls'])
+        self.assertEqual({'/etc/.*': ['/etc/passwd', '/etc/ssl/server.pem'], '.*\\.pem': ['/etc/ssl/server.pem']}, results)
+
+    def test_empty(self):
+        self.assertEqual([], MultiRegexMatcher([]).match('/etc/passwd'))
+        self.assertEqual({}, MultiRegexMatcher([]).match_all(['/etc/passwd']))
@@ -0,0 +1,78 @@
+import unittest
+
+from anchore_engine.util import memoize
+
+
+class TestMemoize(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        def add(a, b, scale=1):
+            self.calls.append((a, b, scale))
+            return (a + b) * scale
+
+        self.fn = memoize.memoized(max_size=2, name='test_memoize.add')(add)
+
+    def tearDown(self):
+        memoize._registry.pop('test_memoize.add', None)
+
+    def test_hit_miss(self):
+        self.assertEqual(3, self.fn(1, 2))
+        self.assertEqual(3, self.fn(1, 2))
+        self.assertEqual(6, self.fn(1, 2, scale=2))
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual({'hits': 1, 'misses': 2, 'size': 2, 'max_size': 2}, self.fn.stats())
+        self.assertEqual(self.fn.stats(), memoize.stats()['test_memoize.add'])
+
+    def test_lru_eviction(self):
+        self.fn(1, 1)
+        self.fn(2, 2)
+        self.fn(1, 1)
+        self.fn(3, 3)  # Evicts (2, 2)
+        self.fn(1, 1)
+        self.fn(2, 2)
+        self.assertEqual([(1, 1, 1), (2, 2, 1), (3, 3, 1), (2, 2, 1)], self.calls)
+
+    def test_unhashable_and_errors(self):
+        self.assertEqual([1, 2], self.fn([1], [2]))
+        self.assertEqual([1, 2], self.fn([1], [2]))
+        self.assertEqual(2, len(self.calls))
+
+        self.assertRaises(TypeError, self.fn, 1, 'a')
+        self.assertRaises(TypeError, self.fn, 1, 'a')
+        self.assertEqual(4, len(self.calls))
+        self.assertEqual(0, self.fn.stats()['size'])
+
+    def test_resize_and_clear(self):
+        self.fn(1, 1)
+        self.fn(2, 2)
+        self.fn.resize(1)
+        self.assertEqual(1, self.fn.stats()['size'])
+
+        self.fn.resize(0)
+        self.fn(5, 5)
+        self.fn(5, 5)
+        self.assertEqual(4, len(self.calls))
+
+        self.fn.resize(2)
+        self.fn(1, 1)
+        self.fn.clear()
+        self.assertEqual({'hits': 0, 'misses': 0, 'size': 0, 'max_size': 2}, self.fn.stats())
+
+    def test_resize_group(self):
+        grouped = memoize.memoized(max_size=2, name='test_memoize.grouped', group='test_group')(lambda x: x)
+        try:
+            memoize.resize_all(5, group='test_group')
+            self.assertEqual(5, grouped.stats()['max_size'])
+            self.assertEqual(2, self.fn.stats()['max_size'])
+        finally:
+            memoize._registry.pop('test_memoize.grouped', None)
+
+    def test_version_comparators_grouped(self):
+        from anchore_engine.util import apk, deb, maven, rpm, semver
+        from anchore_engine.util.matcher import compiled_wildcard
+
+        for fn in [apk.compare_versions, deb.compare_versions, rpm.compare_versions, semver.compare_versions, maven.MavenVersion._parse_version_]:
+            self.assertEqual(memoize.VERSION_COMPARE_GROUP, fn.group)
+        self.assertIsNone(compiled_wildcard.group)
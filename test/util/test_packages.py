@@ -0,0 +1,57 @@
+import itertools
+import unittest
+
+from anchore_engine.util import is_ascii
+from anchore_engine.util.packages import compare_package_versions, package_version_key
+from anchore_engine.util.deb import compare_versions as deb_compare_versions
+
+
+class TestPackageVersionKeys(unittest.TestCase):
+    """
+    Tests that version keys order versions consistently with the version comparison code
+
+    """
+
+    rpm_versions = ['1.0-1.el7', '1.0-2.el7', '1.0.1-1.el7', '1.10-1.el7', '1.2-1.el7', '1.0-1.el7_4', '1.0-1.el7_4.1',
+                    '2.0-0.rc1.el7', '2.0-1', '1.0-01.el7', '3.el7-1', '3.1.el7-1', '1.0.0-1', '1.0-1.', '0.9a-1']
+    deb_versions = ['1.0-1', '1.0-1ubuntu1', '1.0~rc1-1', '1.0.1-1', '1.10', '1.2+dfsg-1', '0', '00', '0~', '0abc',
+                    '1.0-1+deb8u3', '1.0-1~bpo8', '1.0', '1.0-', '2.4.7-1ubuntu1.1', '2.4.7-1ubuntu1.10', '1:1.0-1', '1:0.9-1']
+
+    def test_rpm_keys(self):
+        for a, b in itertools.product(self.rpm_versions, self.rpm_versions):
+            older = compare_package_versions('RHEL', 'pkg', a, 'pkg', b) < 0
+            key_older = package_version_key('RHEL', 'pkg', a) < package_version_key('RHEL', 'pkg', b)
+            if older:
+                self.assertTrue(key_older, 'Key comparison must include {} < {}'.format(a, b))
+
+        # Equivalent versions have the same key
+        self.assertEqual(package_version_key('RHEL', 'pkg', '1.0-1.el7'), package_version_key('RHEL', 'pkg', '1.0-01.el7'))
+
+    def test_deb_keys(self):
+        for a, b in itertools.product(self.deb_versions, self.deb_versions):
+            key_a = package_version_key('DEB', 'pkg', a)
+            key_b = package_version_key('DEB', 'pkg', b)
+            if ':' in a or ':' in b:
+                # Keys order by epoch, the comparison code does not for a lower epoch
+                if deb_compare_versions(a, 'lt', b):
+                    self.assertLess(key_a, key_b)
+                continue
+
+            self.assertEqual(deb_compare_versions(a, 'lt', b), key_a < key_b, 'Mismatch for {} < {}'.format(a, b))
+            self.assertEqual(deb_compare_versions(a, 'eq', b), key_a == key_b, 'Mismatch for {} == {}'.format(a, b))
+
+    def test_no_key(self):
+        self.assertIsNone(package_version_key('ALPINE', 'pkg', '1.0-r0'))
+        self.assertIsNone(package_version_key('RHEL', 'pkg', 'None'))
+        self.assertIsNone(package_version_key('DEB', 'pkg', None))
+        self.assertIsNone(package_version_key('DEB', 'pkg', 'a:1.0'))
+
+    def test_non_ascii(self):
+        self.assertIsNone(package_version_key('RHEL', 'pkg', '1.0-1.el7\u00e9'))
+        self.assertIsNone(package_version_key('DEB', 'pkg', '1.0-1\u00e9'))
+
+    def test_is_ascii(self):
+        for value in ['', '1.0-1ubuntu1', '1:2.4~rc1+dfsg-1', '\x7f']:
+            self.assertTrue(is_ascii(value), value)
+        for value in ['1.0-1\u00e9', '\x80', '\u4e00']:
+            self.assertFalse(is_ascii(value), value)
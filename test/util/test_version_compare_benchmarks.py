@@ -0,0 +1,125 @@
+"""
+Benchmarks for the package version comparators, run with pytest-benchmark:
+
+    pytest test/util/test_version_compare_benchmarks.py --benchmark-only
+
+Each comparator is run over a corpus of version pairs typical of fix records compared with installed packages, both
+uncached and through the memoization layer with a warm cache, so regressions in either show up in the numbers.
+
+"""
+import itertools
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from anchore_engine.util import memoize
+from anchore_engine.util.apk import compare_versions as apk_compare_versions
+from anchore_engine.util.deb import compare_versions as deb_compare_versions
+from anchore_engine.util.maven import MavenVersion
+from anchore_engine.util.rpm import compare_versions as rpm_compare_versions
+from anchore_engine.util.semver import compare_versions as semver_compare_versions
+
+rpm_versions = ['1.0.2k-8.el7', '1.0.2k-12.el7', '1.0.2k-16.el7_6.1', '2.17-222.el7', '2.17-260.el7_6.3', '7.29.0-46.el7',
+                '7.29.0-51.el7_6.3', '1.1.1c-2.el8', '4.2.46-31.el7', '4.2.46-33.el7', '3.2.1-3.el8_0', '0.9.8e-40.el5_11']
+deb_versions = ['1.0.1t-1+deb8u8', '1.0.1t-1+deb8u11', '1.1.0j-1~deb9u1', '2.24-11+deb9u4', '7.52.1-5+deb9u9',
+                '1:2.0.6-4', '2.7.4-0ubuntu1.6', '1.1.1-1ubuntu2.1~18.04.4', '4.4-5', '4.4-5+b1', '5.0~rc1-1', '2.28-10']
+apk_versions = ['1.0.2o-r0', '1.0.2q-r0', '1.1.1b-r1', '1.1.1d-r0', '1.28.4-r3', '1.29.3-r10', '7.61.1-r2', '7.64.0-r3',
+                '2.9.8-r1', '2.9.9-r1', '1.2.11-r1', '3.0_rc1-r0']
+maven_versions = ['2.9.8', '2.9.10.1', '4.3.18.RELEASE', '5.0.0.M1', '1.2.17', '2.12.1', '1.0-SNAPSHOT', '3.2.1',
+                  '2.0.0-beta9', '2.0-rc1', '28.1-jre', '1.10']
+semver_pairs = [('<2.9.10', '2.9.8'), ('>=2.0.0 <2.9.9', '2.9.10'), ('<4.17.12', '4.17.11'), ('<1.2.0 || >=2.0.0 <2.0.5', '2.0.3'),
+                ('<3.0.0', '3.1.0'), ('<1.24.2', '1.24.1'), ('>=5.0.0 <5.7.1', '5.6.0'), ('<0.19.0', '0.18.1')]
+
+
+def _pairs(versions):
+    return list(itertools.product(versions, versions))
+
+
+def _run_rpm(pairs, fn):
+    for a, b in pairs:
+        fn('openssl', a, 'openssl', b)
+
+
+def _run_deb(pairs, fn):
+    for a, b in pairs:
+        fn(a, 'lt', b)
+
+
+def _run_apk(pairs, fn):
+    for a, b in pairs:
+        fn(a, 'lt', b)
+
+
+def _run_semver(pairs, fn, language):
+    for range_str, version in pairs:
+        fn(range_str, version, language=language)
+
+
+def _run_maven(pairs):
+    for a, b in pairs:
+        MavenVersion(a) < MavenVersion(b)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    memoize.clear_all()
+    yield
+    memoize.clear_all()
+
+
+def test_rpm_uncached(benchmark):
+    benchmark(_run_rpm, _pairs(rpm_versions), rpm_compare_versions.fn)
+
+
+def test_rpm_cached(benchmark):
+    pairs = _pairs(rpm_versions)
+    _run_rpm(pairs, rpm_compare_versions)
+    benchmark(_run_rpm, pairs, rpm_compare_versions)
+
+
+def test_deb_uncached(benchmark):
+    benchmark(_run_deb, _pairs(deb_versions), deb_compare_versions.fn)
+
+
+def test_deb_cached(benchmark):
+    pairs = _pairs(deb_versions)
+    _run_deb(pairs, deb_compare_versions)
+    benchmark(_run_deb, pairs, deb_compare_versions)
+
+
+def test_apk_uncached(benchmark):
+    benchmark(_run_apk, _pairs(apk_versions), apk_compare_versions.fn)
+
+
+def test_apk_cached(benchmark):
+    pairs = _pairs(apk_versions)
+    _run_apk(pairs, apk_compare_versions)
+    benchmark(_run_apk, pairs, apk_compare_versions)
+
+
+@pytest.mark.parametrize('language', ['java', 'npm', 'python'])
+def test_semver_uncached(benchmark, language):
+    benchmark(_run_semver, semver_pairs, semver_compare_versions.fn, language)
+
+
+@pytest.mark.parametrize('language', ['java', 'npm', 'python'])
+def test_semver_cached(benchmark, language):
+    _run_semver(semver_pairs, semver_compare_versions, language)
+    benchmark(_run_semver, semver_pairs, semver_compare_versions, language)
+
+
+def test_maven_uncached(benchmark):
+    pairs = _pairs(maven_versions)
+
+    def run():
+        memoize.clear_all()
+        _run_maven(pairs)
+
+    benchmark(run)
+
+
+def test_maven_cached(benchmark):
+    pairs = _pairs(maven_versions)
+    _run_maven(pairs)
+    benchmark(_run_maven, pairs)